@@ -0,0 +1,109 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare encoding speed (tiles/sec) and size (bytes/tile) of the
+image formats and encoding presets.
+
+Usage::
+
+    python benchmarks/encoding.py [-n ROUNDS] [tile.png tile.jpeg ...]
+
+Without tile files, a set of generated 256x256 test tiles is used.
+"""
+
+from __future__ import print_function
+
+import optparse
+import sys
+import time
+
+from mapproxy.compat.image import Image, has_libimagequant_support
+from mapproxy.image import img_to_buf
+from mapproxy.image.encoders import check_encoder_support
+from mapproxy.image.opts import ImageOptions
+
+
+def sample_tiles(filenames):
+    if filenames:
+        tiles = []
+        for fname in filenames:
+            img = Image.open(fname)
+            img.load()
+            tiles.append(img.convert('RGBA'))
+        return tiles
+
+    from mapproxy.test.image import create_debug_img
+    return [
+        create_debug_img((256, 256), transparent=True),
+        create_debug_img((256, 256), transparent=False).convert('RGBA'),
+        Image.new('RGBA', (256, 256), (100, 150, 200, 255)),
+    ]
+
+
+def benchmark_configs():
+    configs = []
+    for preset in ('speed', 'default', 'size'):
+        configs.append(('png8 %s' % preset, ImageOptions(format='image/png', colors=256,
+            transparent=True, encoding_options={'preset': preset})))
+    for preset in ('speed', 'default', 'size'):
+        configs.append(('png24 %s' % preset, ImageOptions(format='image/png', colors=0,
+            transparent=True, encoding_options={'preset': preset})))
+    configs.append(('png8 mediancut', ImageOptions(format='image/png', colors=256,
+        transparent=True, encoding_options={'quantizer': 'mediancut'})))
+    if has_libimagequant_support():
+        configs.append(('png8 libimagequant', ImageOptions(format='image/png', colors=256,
+            transparent=True, encoding_options={'quantizer': 'libimagequant'})))
+    for preset in ('speed', 'default', 'size'):
+        configs.append(('jpeg %s' % preset, ImageOptions(format='image/jpeg',
+            encoding_options={'preset': preset})))
+    if check_encoder_support({'format': 'webp'}) is None:
+        for preset in ('speed', 'default', 'size'):
+            configs.append(('webp %s' % preset, ImageOptions(format='image/webp',
+                transparent=True, encoding_options={'preset': preset})))
+        configs.append(('webp lossless', ImageOptions(format='image/webp',
+            transparent=True, encoding_options={'webp_lossless': True})))
+    if check_encoder_support({'jpeg_encoder': 'turbojpeg'}) is None:
+        configs.append(('jpeg turbojpeg', ImageOptions(format='image/jpeg',
+            encoding_options={'jpeg_encoder': 'turbojpeg'})))
+    return configs
+
+
+def run(tiles, image_opts, rounds):
+    size = 0
+    start = time.time()
+    for _ in range(rounds):
+        for tile in tiles:
+            size += len(img_to_buf(tile, image_opts).getvalue())
+    duration = time.time() - start
+    num = rounds * len(tiles)
+    return num / duration, size / num
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage='%prog [options] [tile ...]')
+    parser.add_option('-n', '--rounds', default=20, type='int',
+        help='number of times each tile is encoded')
+    options, args = parser.parse_args(argv)
+
+    tiles = sample_tiles(args)
+    print('%-20s %12s %12s' % ('encoder', 'tiles/sec', 'bytes/tile'))
+    for name, image_opts in benchmark_configs():
+        tiles_per_sec, bytes_per_tile = run(tiles, image_opts, options.rounds)
+        print('%-20s %12.1f %12d' % (name, tiles_per_sec, bytes_per_tile))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure requests/sec of cached tile requests (TMS, tiles, WMTS REST
+and KML) for a single process. Requests are passed to the WSGI
+application directly, without any HTTP server.
+
+Usage::
+
+    python benchmarks/tile_requests.py [-n REQUESTS] [--profile]
+
+Use ``--profile`` to print the functions with the highest
+cumulative time.
+"""
+
+from __future__ import print_function
+
+import optparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from mapproxy.wsgiapp import make_wsgi_app
+
+
+CONFIG = """
+services:
+  tms:
+  kml:
+  wmts:
+    restful: true
+
+layers:
+  - name: osm
+    title: OSM
+    sources: [osm_cache]
+
+caches:
+  osm_cache:
+    grids: [GLOBAL_WEBMERCATOR]
+    sources: [debug]
+
+sources:
+  debug:
+    type: debug
+
+globals:
+  cache:
+    base_dir: %(base_dir)s
+"""
+
+# z/x/y of the requested tiles, the tiles are created and cached
+# by the first requests
+TILES = [(z, x, y) for z in range(1, 4) for x in range(2) for y in range(2)]
+
+REQUESTS = [
+    ('tms', '/tms/1.0.0/osm/EPSG3857/%(z)d/%(x)d/%(y)d.png'),
+    ('tiles', '/tiles/osm_EPSG3857/%(z)d/%(x)d/%(y)d.png'),
+    ('wmts', '/wmts/osm/GLOBAL_WEBMERCATOR/%(z)02d/%(x)d/%(y)d.png'),
+    ('kml', '/kml/osm_EPSG3857/%(z)d/%(x)d/%(y)d.png'),
+]
+
+
+def create_app(base_dir):
+    conf_file = os.path.join(base_dir, 'mapproxy.yaml')
+    with open(conf_file, 'w') as f:
+        f.write(CONFIG % {'base_dir': base_dir})
+    return make_wsgi_app(conf_file)
+
+
+def environ(path):
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'HTTP_HOST': 'localhost',
+        'wsgi.url_scheme': 'http',
+        'wsgi.errors': sys.stderr,
+    }
+
+
+def request_paths(template):
+    paths = []
+    for z, x, y in TILES:
+        paths.append(template % {'z': z, 'x': x, 'y': y})
+    return paths
+
+
+def run(app, paths, num):
+    def start_response(status, headers, exc_info=None):
+        if not status.startswith('200'):
+            raise AssertionError('unexpected status %s' % status)
+
+    start = time.time()
+    for i in range(num):
+        resp = app(environ(paths[i % len(paths)]), start_response)
+        for _ in resp:
+            pass
+        if hasattr(resp, 'close'):
+            resp.close()
+    return num / (time.time() - start)
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('-n', '--requests', default=5000, type='int',
+        help='number of requests for each service')
+    parser.add_option('--profile', default=False, action='store_true',
+        help='profile the requests')
+    options, args = parser.parse_args(argv)
+
+    base_dir = tempfile.mkdtemp()
+    try:
+        app = create_app(base_dir)
+        if options.profile:
+            import cProfile
+            import pstats
+            for _, template in REQUESTS:
+                paths = request_paths(template)
+                run(app, paths, len(paths))
+            profile = cProfile.Profile()
+            profile.enable()
+            for _, template in REQUESTS:
+                run(app, request_paths(template), options.requests)
+            profile.disable()
+            pstats.Stats(profile).sort_stats('cumulative').print_stats(40)
+            return
+
+        print('%-10s %12s' % ('service', 'requests/sec'))
+        for name, template in REQUESTS:
+            paths = request_paths(template)
+            # warm up, creates the tiles
+            run(app, paths, len(paths))
+            print('%-10s %12.1f' % (name, run(app, paths, options.requests)))
+    finally:
+        shutil.rmtree(base_dir)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
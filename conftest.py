@@ -0,0 +1,10 @@
+import sys
+
+collect_ignore = []
+
+if sys.version_info < (3, 5):
+    # async/await syntax, ASGI requires Python 3.5 or newer
+    collect_ignore.extend([
+        'mapproxy/asgiapp.py',
+        'mapproxy/test/unit/test_asgiapp.py',
+    ])
@@ -0,0 +1,240 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+The ASGI application (requires Python 3.5 or newer).
+
+Connections are handled by the event loop of the ASGI server. The
+MapProxy application itself runs in a limited pool of threads, which
+are only occupied while a response is created. Sending the response
+to the client does not block any thread, so that one process can keep
+thousands of (slow) connections open with a few threads.
+"""
+
+import asyncio
+import io
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+
+from mapproxy.wsgiapp import make_wsgi_app
+
+try:
+    get_running_loop = asyncio.get_running_loop
+except AttributeError:
+    # Python < 3.7, returns the running loop when called from a coroutine
+    get_running_loop = asyncio.get_event_loop
+
+
+def make_asgi_app(services_conf=None, threads=None, debug=False,
+    ignore_config_warnings=True, reloader=False):
+    """
+    Create an ASGI application for the given services conf.
+
+    :param services_conf: the file name of the mapproxy.yaml configuration
+    :param threads: number of threads that handle the requests
+        (default depends on the number of CPUs)
+    """
+    app = make_wsgi_app(services_conf=services_conf, debug=debug,
+        ignore_config_warnings=ignore_config_warnings, reloader=reloader)
+    return ASGIApp(app, threads=threads)
+
+
+class ASGIApp(object):
+    """
+    Runs a WSGI application as an ASGI application.
+
+    WSGI applications return a list or an iterator (e.g. cached tiles or
+    streamed WMS responses). Iterators are consumed in the thread pool.
+    """
+
+    def __init__(self, wsgi_app, threads=None, executor=None):
+        self.wsgi_app = wsgi_app
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=threads)
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self.handle_http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self.handle_lifespan(scope, receive, send)
+        else:
+            raise ValueError('unsupported ASGI scope type %r' % scope['type'])
+
+    async def handle_lifespan(self, scope, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def handle_http(self, scope, receive, send):
+        body = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+
+        environ = wsgi_environ(scope, b''.join(body))
+        loop = get_running_loop()
+        response = WSGIResponse(self.wsgi_app, environ)
+        chunk = await loop.run_in_executor(self.executor, response.start)
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': response.status,
+                'headers': response.headers,
+            })
+            while chunk is not None:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                if response.in_memory:
+                    chunk = response.next_chunk()
+                else:
+                    chunk = await loop.run_in_executor(self.executor, response.next_chunk)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if response.needs_close:
+                await loop.run_in_executor(self.executor, response.close)
+
+
+class WSGIResponse(object):
+    """
+    Calls a WSGI application and collects the status, headers and body.
+    """
+    prefetch_size = 256 * 1024
+
+    def __init__(self, app, environ):
+        self.app = app
+        self.environ = environ
+        self.status = None
+        self.headers = None
+        self.result = None
+        self.in_memory = False
+        self.needs_close = False
+        self._iter = None
+        self._written = []
+
+    def start_response(self, status, headers, exc_info=None):
+        if exc_info:
+            try:
+                if self.status is not None:
+                    # headers already sent
+                    raise exc_info[1].with_traceback(exc_info[2])
+            finally:
+                exc_info = None
+        self.status = int(status.split(' ', 1)[0])
+        self.headers = [
+            (name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in headers
+        ]
+        return self._written.append
+
+    def start(self):
+        """
+        Call the application and return the first chunk of the body.
+        Should be called in a thread.
+
+        Bodies up to `prefetch_size` (e.g. tiles) are read completely,
+        so that the remaining chunks can be sent without switching
+        to a thread again.
+        """
+        self.result = self.app(self.environ, self.start_response)
+        self.needs_close = hasattr(self.result, 'close')
+        self._iter = iter(self.result)
+        if isinstance(self.result, (list, tuple)):
+            self.in_memory = True
+            chunk = self.next_chunk()
+        else:
+            # start_response can be called with the first chunk
+            chunks = []
+            size = 0
+            while size < self.prefetch_size:
+                chunk = self.next_chunk()
+                if chunk is None:
+                    self.in_memory = True
+                    break
+                chunks.append(chunk)
+                size += len(chunk)
+            chunk = b''.join(chunks)
+        if self.status is None:
+            raise RuntimeError('WSGI application did not call start_response')
+        return chunk
+
+    def next_chunk(self):
+        """
+        Return the next chunk of the body, or ``None`` at the end.
+        """
+        if self._written:
+            chunk = b''.join(self._written)
+            del self._written[:]
+            return chunk
+        return next(self._iter, None)
+
+    def close(self):
+        self.result.close()
+
+
+def wsgi_environ(scope, body):
+    """
+    Return the WSGI environ for an ASGI HTTP `scope`.
+    """
+    # WSGI strings are latin-1 decoded bytes
+    path = scope['path'].encode('utf-8').decode('latin-1')
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path,
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_PROTOCOL': 'HTTP/%s' % scope.get('http_version', '1.1'),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    server = scope.get('server')
+    if server:
+        environ['SERVER_NAME'] = server[0]
+        environ['SERVER_PORT'] = str(server[1])
+    else:
+        environ['SERVER_NAME'] = 'localhost'
+        environ['SERVER_PORT'] = '80'
+    client = scope.get('client')
+    if client:
+        environ['REMOTE_ADDR'] = client[0]
+
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'CONTENT_LENGTH':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = 'HTTP_' + name
+            if key in environ:
+                value = environ[key] + ',' + value
+            environ[key] = value
+    return environ
@@ -0,0 +1,293 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Admission control for the creation of uncached tiles.
+
+Requests for uncached tiles block a thread until all sources responded.
+The number of concurrent tile creations is limited per cache and for the
+whole process, so that slow sources can not occupy all threads. Requests
+above the limit are rejected (shed) immediately. Requests for cached
+tiles are never limited.
+
+Tiles can also be created in a separate pool of threads for each cache.
+Request threads only wait for a limited time for the new tiles.
+"""
+
+import os
+import sys
+import threading
+import time
+
+try:
+    import Queue
+except ImportError:
+    import queue as Queue
+
+from mapproxy.config import base_config, local_base_config
+from mapproxy.util.py import reraise
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class TileCreationOverload(Exception):
+    """
+    Raised when a tile can not be created because too many tiles are
+    created at the moment.
+    """
+    def __init__(self, msg, retry_after=None):
+        Exception.__init__(self, msg)
+        self.retry_after = retry_after
+
+
+_limits = {}
+_limits_lock = threading.Lock()
+
+
+def admission_stats():
+    """
+    Return the current statistics of all limits and pools as a dict, e.g.
+    ``{'osm_cache': {'in_flight': 3, 'max_concurrent': 10, ...},
+    'osm_cache.pool': {'queued': 0, ...}}``.
+    """
+    with _limits_lock:
+        limits = list(_limits.items())
+    return dict((name, limit.stats()) for name, limit in limits)
+
+
+class CreationLimit(object):
+    """
+    Counts the number of in-flight tile creations.
+
+    :param name: name of the limit for statistics and log messages
+    :param max_concurrent: maximum number of in-flight creations
+    :param log_interval: log shed statistics at most every
+        `log_interval` seconds
+    """
+    def __init__(self, name, max_concurrent, log_interval=10):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.log_interval = log_interval
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.admitted = 0
+        self.shed = 0
+        self._shed_since_log = 0
+        self._last_log = 0
+        self._lock = threading.Lock()
+        with _limits_lock:
+            _limits[name] = self
+
+    def acquire(self):
+        """
+        Return ``True`` and count the creation as in-flight if the limit
+        is not reached, otherwise return ``False``. Does not block.
+        """
+        with self._lock:
+            if self.in_flight >= self.max_concurrent:
+                self.shed += 1
+                self._shed_since_log += 1
+                now = time.time()
+                if now - self._last_log < self.log_interval:
+                    return False
+                shed, self._shed_since_log = self._shed_since_log, 0
+                self._last_log = now
+            else:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                self.admitted += 1
+                return True
+        log.warning('%s: limit of %d concurrent tile creations reached, shed %d requests (%d in total)',
+            self.name, self.max_concurrent, shed, self.shed)
+        return False
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'max_concurrent': self.max_concurrent,
+                'admitted': self.admitted,
+                'shed': self.shed,
+            }
+
+
+class CreationTask(object):
+    """
+    A function call in a `CreationPool`.
+    """
+    def __init__(self, func, args, done=None):
+        self.func = func
+        self.args = args
+        self.done = done
+        self.base_config = base_config()
+        self._state = 'queued'
+        self._result = None
+        self._exc_info = None
+        self._finished = threading.Event()
+        self._lock = threading.Lock()
+
+    def run(self):
+        with self._lock:
+            if self._state == 'cancelled':
+                return
+            self._state = 'running'
+        try:
+            with local_base_config(self.base_config):
+                self._result = self.func(*self.args)
+        except Exception:
+            self._exc_info = sys.exc_info()
+        finally:
+            if self.done:
+                self.done()
+            self._finished.set()
+
+    def wait(self, timeout=None):
+        """
+        Wait till the task is finished. Return ``False`` if the task did
+        not finish within `timeout` seconds. The task is cancelled if it
+        did not start yet, otherwise it continues in the background.
+        """
+        if self._finished.wait(timeout):
+            return True
+        with self._lock:
+            cancelled = self._state == 'queued'
+            if cancelled:
+                self._state = 'cancelled'
+        if cancelled and self.done:
+            self.done()
+        return False
+
+    def result(self):
+        """
+        Return the result of the function or raise its exception.
+        """
+        if self._exc_info:
+            reraise(self._exc_info)
+        return self._result
+
+
+class CreationPool(object):
+    """
+    Fixed number of threads that run `CreationTask`. The threads are
+    started on the first use (i.e. after forking).
+
+    :param name: name for statistics
+    :param size: number of threads
+    """
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.running = 0
+        self.timeouts = 0
+        self._queue = Queue.Queue()
+        self._pid = None
+        self._lock = threading.Lock()
+        with _limits_lock:
+            _limits[name] = self
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            for _ in range(self.size):
+                t = threading.Thread(target=self._worker)
+                t.daemon = True
+                t.start()
+
+    def _worker(self):
+        while True:
+            task = self._queue.get()
+            with self._lock:
+                self.running += 1
+            try:
+                task.run()
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+    def submit(self, func, args, done=None):
+        """
+        Call `func` with `args` in the pool and return the `CreationTask`.
+        `done` is called when the task is finished or cancelled.
+        """
+        if self._pid != os.getpid():
+            self._start()
+        task = CreationTask(func, args, done=done)
+        self._queue.put(task)
+        return task
+
+    def wait(self, task, timeout):
+        if task.wait(timeout):
+            return True
+        with self._lock:
+            self.timeouts += 1
+        return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'queued': self._queue.qsize(),
+                'running': self.running,
+                'timeouts': self.timeouts,
+            }
+
+
+class TileCreationAdmission(object):
+    """
+    Admission control for a TileManager.
+
+    :param limits: list of `CreationLimit`, e.g. one for the cache and
+        a global one shared by all caches
+    :param on_overload: ``'error'`` to raise `TileCreationOverload`, or
+        ``'blank'`` to return blank (uncached) tiles
+    :param serve_stale: return expired tiles from the cache instead
+    :param retry_after: seconds for the Retry-After header
+    :param pool: `CreationPool` for the creation of all tiles, or ``None``
+        to create tiles in the request thread
+    :param timeout: seconds to wait for tiles from the `pool`
+    """
+    def __init__(self, limits, on_overload='error', serve_stale=True, retry_after=10,
+        pool=None, timeout=None):
+        self.limits = limits
+        self.on_overload = on_overload
+        self.serve_stale = serve_stale
+        self.retry_after = retry_after
+        self.pool = pool
+        self.timeout = timeout
+
+    def acquire(self):
+        """
+        Return ``True`` if all limits were acquired.
+        """
+        acquired = []
+        for limit in self.limits:
+            if not limit.acquire():
+                for l in acquired:
+                    l.release()
+                return False
+            acquired.append(limit)
+        return True
+
+    def release(self):
+        for limit in self.limits:
+            limit.release()
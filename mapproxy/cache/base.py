@@ -82,6 +82,64 @@ class TileCacheBase(object):
         """
         raise NotImplementedError()
 
+    def are_cached(self, tiles, with_metadata=False):
+        """
+        Return a list with ``True`` for each cached tile of `tiles`.
+        Fills the metadata attributes of all cached tiles if
+        `with_metadata` is ``True``.
+
+        Calls `is_cached` for each tile by default. Caches should check
+        all tiles with as few requests as possible.
+        """
+        cached = []
+        for tile in tiles:
+            is_cached = self.is_cached(tile)
+            if is_cached and with_metadata:
+                self.load_tile_metadata(tile)
+            cached.append(bool(is_cached))
+        return cached
+
+
+def are_cached_by_group(tiles, key, are_cached):
+    """
+    Helper for `TileCacheBase.are_cached` of caches with multiple files
+    or prefixes. Calls ``are_cached(group, group_tiles)`` once for all
+    missing tiles with the same ``key(tile)``.
+    """
+    cached = [True] * len(tiles)
+    groups = {}
+    for i, tile in enumerate(tiles):
+        if tile.coord is None or not tile.is_missing():
+            continue
+        groups.setdefault(key(tile), []).append(i)
+    for group, idxs in groups.items():
+        group_cached = are_cached(group, [tiles[i] for i in idxs])
+        for i, is_cached in zip(idxs, group_cached):
+            cached[i] = is_cached
+    return cached
+
+
+def tile_coord_ranges(tiles):
+    """
+    Return the range ``(minx, miny, maxx, maxy)`` of the tile coordinates
+    of all missing `tiles` for each level.
+
+    >>> from mapproxy.cache.tile import Tile
+    >>> sorted(tile_coord_ranges([Tile((1, 4, 2)), Tile((3, 2, 2)), Tile(None), Tile((0, 0, 1))]).items())
+    [(1, (0, 0, 0, 0)), (2, (1, 2, 3, 4))]
+    """
+    ranges = {}
+    for tile in tiles:
+        if tile.coord is None or not tile.is_missing():
+            continue
+        x, y, z = tile.coord
+        if z in ranges:
+            minx, miny, maxx, maxy = ranges[z]
+            ranges[z] = min(minx, x), min(miny, y), max(maxx, x), max(maxy, y)
+        else:
+            ranges[z] = x, y, x, y
+    return ranges
+
 # whether we immediately remove lock files or not
 REMOVE_ON_UNLOCK = True
 if sys.platform == 'win32':
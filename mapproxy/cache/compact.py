@@ -21,7 +21,7 @@ import shutil
 import struct
 
 from mapproxy.image import ImageSource
-from mapproxy.cache.base import TileCacheBase, tile_buffer
+from mapproxy.cache.base import TileCacheBase, tile_buffer, are_cached_by_group
 from mapproxy.util.fs import ensure_directory, write_atomic
 from mapproxy.util.lock import FileLock
 from mapproxy.compat import BytesIO
@@ -61,6 +61,16 @@ class CompactCacheBase(TileCacheBase):
 
         return self._get_bundle(tile.coord).is_cached(tile)
 
+    def are_cached(self, tiles, with_metadata=False):
+        # read the index of each bundle only once
+        cached = are_cached_by_group(tiles, lambda t: self._get_bundle_fname_and_offset(t.coord),
+            lambda bundle, tiles: self.bundle_class(*bundle).are_cached(tiles))
+        if with_metadata:
+            for tile, is_cached in zip(tiles, cached):
+                if is_cached and tile.is_missing():
+                    tile.timestamp = -1
+        return cached
+
     def store_tile(self, tile):
         if tile.stored:
             return True
@@ -168,6 +178,17 @@ class BundleV1(object):
             size = bundle.read_size(offset)
         return size != 0
 
+    def are_cached(self, tiles):
+        with self.index().readonly() as idx:
+            if not idx:
+                return [False] * len(tiles)
+            offsets = [idx.tile_offset(*self._rel_tile_coord(t.coord)) for t in tiles]
+
+        if not any(offsets):
+            return [False] * len(tiles)
+        with self.data().readonly() as bundle:
+            return [bool(offset and bundle.read_size(offset)) for offset in offsets]
+
     def store_tile(self, tile):
         if tile.stored:
             return True
@@ -548,6 +569,18 @@ class BundleV2(object):
                 return False
             return True
 
+    def are_cached(self, tiles):
+        with self._readonly() as fh:
+            if not fh:
+                return [False] * len(tiles)
+
+            cached = []
+            for t in tiles:
+                x, y = self._rel_tile_coord(t.coord)
+                _, size = self._tile_offset_size(fh, x, y)
+                cached.append(bool(size))
+            return cached
+
     def _update_tile_offset(self, fh, x, y, offset, size):
         idx_offset = self._tile_idx_offset(x, y)
         val = offset + (size << 40)
@@ -17,6 +17,12 @@ import os
 import errno
 import hashlib
 
+try:
+    from os import scandir
+except ImportError:
+    # Python 2
+    scandir = None
+
 from mapproxy.util.fs import ensure_directory, write_atomic
 from mapproxy.image import ImageSource, is_single_color_image
 from mapproxy.cache import path
@@ -29,6 +35,8 @@ class FileCache(TileCacheBase):
     """
     This class is responsible to store and load the actual tile data.
     """
+    list_dir_min_tiles = 8
+
     def __init__(self, cache_dir, file_ext, directory_layout='tc',
                  link_single_color_images=False):
         """
@@ -98,6 +106,79 @@ class FileCache(TileCacheBase):
         else:
             return True
 
+    def are_cached(self, tiles, with_metadata=False):
+        """
+        Returns ``True`` for each tile of `tiles` that is present. Lists
+        each tile directory once, instead of checking each tile file.
+        """
+        dirs = {}
+        locations = []
+        for tile in tiles:
+            if not tile.is_missing():
+                locations.append(None)
+                continue
+            dirname, basename = os.path.split(self.tile_location(tile))
+            locations.append((dirname, basename))
+            dirs.setdefault(dirname, set()).add(basename)
+
+        found = {}
+        for dirname, basenames in dirs.items():
+            for basename, stat in self._list_tiles(dirname, basenames, with_metadata):
+                found[dirname, basename] = stat
+
+        cached = []
+        for tile, location in zip(tiles, locations):
+            if location is None:
+                cached.append(True)
+                continue
+            stat = found.get(location)
+            if stat is None:
+                cached.append(False)
+                continue
+            if with_metadata:
+                tile.timestamp = stat.st_mtime
+                tile.size = stat.st_size
+            cached.append(True)
+        return cached
+
+    def _list_tiles(self, dirname, basenames, with_metadata=False):
+        """
+        Return a list with the basename and the ``lstat`` result (or ``True``
+        without `with_metadata`) of all `basenames` that are in `dirname`.
+        The directory is only listed for at least `list_dir_min_tiles`
+        basenames, since directories can contain many other tiles.
+        """
+        found = []
+        if len(basenames) < self.list_dir_min_tiles:
+            for name in basenames:
+                location = os.path.join(dirname, name)
+                if os.path.exists(location):
+                    found.append((name, os.lstat(location) if with_metadata else True))
+            return found
+
+        try:
+            if scandir is not None:
+                entries = [(e.name, e) for e in scandir(dirname) if e.name in basenames]
+            else:
+                entries = [(n, None) for n in os.listdir(dirname) if n in basenames]
+        except OSError as ex:
+            if ex.errno not in (errno.ENOENT, errno.ENOTDIR): raise
+            return found
+
+        for name, entry in entries:
+            location = os.path.join(dirname, name)
+            if (entry.is_symlink() if entry is not None else os.path.islink(location)):
+                # check target of single color tiles
+                if not os.path.exists(location):
+                    continue
+            if not with_metadata:
+                found.append((name, True))
+            elif entry is not None:
+                found.append((name, entry.stat(follow_symlinks=False)))
+            else:
+                found.append((name, os.lstat(location)))
+        return found
+
     def load_tile(self, tile, with_metadata=False):
         """
         Fills the `Tile.source` of the `tile` if it is cached.
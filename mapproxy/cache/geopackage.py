@@ -21,7 +21,8 @@ import re
 import sqlite3
 import threading
 
-from mapproxy.cache.base import TileCacheBase, tile_buffer, REMOVE_ON_UNLOCK
+from mapproxy.cache.base import (TileCacheBase, tile_buffer, tile_coord_ranges,
+    are_cached_by_group, REMOVE_ON_UNLOCK)
 from mapproxy.compat import BytesIO, PY2, itertools
 from mapproxy.image import ImageSource
 from mapproxy.srs import get_epsg_num
@@ -363,6 +364,31 @@ AUTHORITY["EPSG","9122"]],AUTHORITY["EPSG","4326"]]\
 
         return self.load_tile(tile)
 
+    def are_cached(self, tiles, with_metadata=False):
+        # one indexed query for the range of all tiles in each level
+        found = set()
+        for level, (minx, miny, maxx, maxy) in tile_coord_ranges(tiles).items():
+            cur = self.db.cursor()
+            cur.execute("""SELECT tile_column, tile_row FROM [{0}]
+                WHERE zoom_level = ? AND
+                      tile_column BETWEEN ? AND ? AND
+                      tile_row BETWEEN ? AND ?""".format(self.table_name),
+                (level, minx, maxx, miny, maxy))
+            for row in cur:
+                found.add((row[0], row[1], level))
+            cur.close()
+
+        cached = []
+        for tile in tiles:
+            if tile.coord is None or tile.source:
+                cached.append(True)
+            elif tile.coord in found:
+                if with_metadata and not self.supports_timestamp:
+                    tile.timestamp = -1
+                cached.append(True)
+            else:
+                cached.append(False)
+        return cached
 
     def store_tile(self, tile):
         if tile.stored:
@@ -535,6 +561,10 @@ class GeopackageLevelCache(TileCacheBase):
 
         return self._get_level(tile.coord[2]).is_cached(tile)
 
+    def are_cached(self, tiles, with_metadata=False):
+        return are_cached_by_group(tiles, lambda t: t.coord[2],
+            lambda level, tiles: self._get_level(level).are_cached(tiles, with_metadata))
+
     def store_tile(self, tile):
         if tile.stored:
             return True
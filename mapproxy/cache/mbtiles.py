@@ -21,7 +21,8 @@ import threading
 import time
 
 from mapproxy.image import ImageSource
-from mapproxy.cache.base import TileCacheBase, tile_buffer, REMOVE_ON_UNLOCK
+from mapproxy.cache.base import (TileCacheBase, tile_buffer, tile_coord_ranges,
+    are_cached_by_group, REMOVE_ON_UNLOCK)
 from mapproxy.util.fs import ensure_directory
 from mapproxy.util.lock import FileLock
 from mapproxy.compat import BytesIO, PY2, itertools
@@ -142,6 +143,45 @@ class MBTilesCache(TileCacheBase):
 
         return self.load_tile(tile)
 
+    def are_cached(self, tiles, with_metadata=False):
+        # one indexed query for the range of all tiles in each level
+        found = {}
+        for level, (minx, miny, maxx, maxy) in tile_coord_ranges(tiles).items():
+            cur = self.db.cursor()
+            if with_metadata and self.supports_timestamp:
+                cur.execute('''SELECT tile_column, tile_row, last_modified, length(tile_data)
+                    FROM tiles
+                    WHERE zoom_level = ? AND
+                          tile_column BETWEEN ? AND ? AND
+                          tile_row BETWEEN ? AND ?''', (level, minx, maxx, miny, maxy))
+            else:
+                cur.execute('''SELECT tile_column, tile_row
+                    FROM tiles
+                    WHERE zoom_level = ? AND
+                          tile_column BETWEEN ? AND ? AND
+                          tile_row BETWEEN ? AND ?''', (level, minx, maxx, miny, maxy))
+            for row in cur:
+                found[(row[0], row[1], level)] = row[2:]
+            cur.close()
+
+        cached = []
+        for tile in tiles:
+            if tile.coord is None or tile.source:
+                cached.append(True)
+                continue
+            row = found.get(tile.coord)
+            if row is None:
+                cached.append(False)
+                continue
+            if with_metadata:
+                if self.supports_timestamp:
+                    tile.timestamp = sqlite_datetime_to_timestamp(row[0])
+                    tile.size = row[1]
+                else:
+                    tile.timestamp = -1
+            cached.append(True)
+        return cached
+
     def store_tile(self, tile):
         if tile.stored:
             return True
@@ -292,8 +332,22 @@ class MBTilesCache(TileCacheBase):
             # MBTiles specification does not include timestamps.
             # This sets the timestamp of the tile to epoch (1970s)
             tile.timestamp = -1
-        else:
-            self.load_tile(tile)
+            return
+
+        if tile.source or tile.coord is None:
+            return
+        # query without the tile_data, to check if a tile was modified
+        # without loading the tile
+        cur = self.db.cursor()
+        cur.execute('''SELECT last_modified, length(tile_data)
+            FROM tiles
+            WHERE tile_column = ? AND
+                  tile_row = ? AND
+                  zoom_level = ?''', tile.coord)
+        row = cur.fetchone()
+        if row:
+            tile.timestamp = sqlite_datetime_to_timestamp(row[0])
+            tile.size = row[1]
 
 class MBTilesLevelCache(TileCacheBase):
     supports_timestamp = True
@@ -338,6 +392,10 @@ class MBTilesLevelCache(TileCacheBase):
 
         return self._get_level(tile.coord[2]).is_cached(tile)
 
+    def are_cached(self, tiles, with_metadata=False):
+        return are_cached_by_group(tiles, lambda t: t.coord[2],
+            lambda level, tiles: self._get_level(level).are_cached(tiles, with_metadata))
+
     def store_tile(self, tile):
         if tile.stored:
             return True
@@ -378,7 +436,9 @@ class MBTilesLevelCache(TileCacheBase):
         return self._get_level(tile.coord[2]).remove_tile(tile)
 
     def load_tile_metadata(self, tile):
-        self.load_tile(tile)
+        if tile.source or tile.coord is None:
+            return
+        self._get_level(tile.coord[2]).load_tile_metadata(tile)
 
     def remove_level_tiles_before(self, level, timestamp):
         level_cache = self._get_level(level)
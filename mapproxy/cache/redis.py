@@ -54,6 +54,22 @@ class RedisCache(TileCacheBase):
 
         return self.r.exists(self._key(tile))
 
+    def are_cached(self, tiles, with_metadata=False):
+        # check all tiles with a single pipeline
+        check = [t for t in tiles if not (t.coord is None or t.source)]
+        pipe = self.r.pipeline(transaction=False)
+        for tile in check:
+            pipe.exists(self._key(tile))
+        exists = dict(zip((id(t) for t in check), pipe.execute() if check else []))
+
+        cached = []
+        for tile in tiles:
+            is_cached = bool(exists.get(id(tile), True))
+            if is_cached and with_metadata and id(tile) in exists:
+                self.load_tile_metadata(tile)
+            cached.append(is_cached)
+        return cached
+
     def store_tile(self, tile):
         if tile.stored:
             return True
@@ -79,6 +95,19 @@ class RedisCache(TileCacheBase):
             return True
         return False
 
+    def load_tiles(self, tiles, with_metadata=False):
+        tiles = [t for t in tiles if not (t.source or t.coord is None)]
+        if not tiles:
+            return True
+        # load all tiles with a single MGET
+        all_succeed = True
+        for tile, tile_data in zip(tiles, self.r.mget([self._key(t) for t in tiles])):
+            if tile_data:
+                tile.source = ImageSource(BytesIO(tile_data))
+            else:
+                all_succeed = False
+        return all_succeed
+
     def remove_tile(self, tile):
         if tile.coord is None:
             return True
@@ -37,8 +37,9 @@ def has_renderd_support():
     return True
 
 class RenderdTileCreator(TileCreator):
-    def __init__(self, renderd_address, tile_mgr, dimensions=None, priority=100, tile_locker=None):
-        TileCreator.__init__(self, tile_mgr, dimensions)
+    def __init__(self, renderd_address, tile_mgr, dimensions=None, priority=100, tile_locker=None,
+        deadline=None):
+        TileCreator.__init__(self, tile_mgr, dimensions, deadline=deadline)
         self.tile_locker = tile_locker.lock or self.tile_mgr.lock
         self.renderd_address = renderd_address
         self.priority = priority
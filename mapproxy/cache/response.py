@@ -0,0 +1,184 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Caches for complete (WMS) responses.
+"""
+
+import errno
+import hashlib
+import os
+import threading
+import time
+
+from collections import OrderedDict
+
+from mapproxy.util.fs import ensure_directory, write_atomic
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def response_cache_key(parts):
+    """
+    Return a hash for a list of ``(name, value)`` tuples.
+
+    >>> response_cache_key([('a', 'b')]) == response_cache_key([('a', 'b')])
+    True
+    >>> response_cache_key([('a', 'b')]) == response_cache_key([('a', 'c')])
+    False
+    """
+    md5 = hashlib.md5()
+    for name, value in parts:
+        md5.update(('%s=%s\n' % (name, value)).encode('utf-8'))
+    return md5.hexdigest()
+
+
+class CachedResponse(object):
+    def __init__(self, data, content_type, timestamp=None):
+        self.data = data
+        self.content_type = content_type
+        self.timestamp = timestamp or time.time()
+
+
+class MemoryResponseCache(object):
+    """
+    In-memory LRU cache for responses.
+
+    :param max_size: maximum size of all cached responses in bytes
+    :param ttl: maximum age of cached responses in seconds
+    """
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.size = 0
+        self._responses = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            resp = self._responses.pop(key, None)
+            if resp is None:
+                return None
+            if self.ttl and resp.timestamp + self.ttl < time.time():
+                self.size -= len(resp.data)
+                return None
+            # move to end, most recently used
+            self._responses[key] = resp
+            return resp
+
+    def put(self, key, data, content_type):
+        if len(data) > self.max_size:
+            return
+        with self._lock:
+            old = self._responses.pop(key, None)
+            if old is not None:
+                self.size -= len(old.data)
+            self._responses[key] = CachedResponse(data, content_type)
+            self.size += len(data)
+            while self.size > self.max_size:
+                _, resp = self._responses.popitem(last=False)
+                self.size -= len(resp.data)
+
+
+class FileResponseCache(object):
+    """
+    Cache for responses on disk. Each response is stored in a file with
+    the content type in the first line.
+
+    Files older than `ttl` are ignored. The oldest files are removed when
+    the size of all files exceeds `max_size`. The size is checked after
+    ``max_size / 10`` bytes were written by this process.
+
+    :param namespace: subdirectory for the responses, should change
+        with each configuration
+    """
+    def __init__(self, cache_dir, max_size, ttl, namespace=''):
+        self.cache_dir = os.path.join(cache_dir, namespace) if namespace else cache_dir
+        self.base_dir = cache_dir
+        self.max_size = max_size
+        self.ttl = ttl
+        self._written = 0
+        self._lock = threading.Lock()
+
+    def _location(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key):
+        location = self._location(key)
+        try:
+            if self.ttl and os.path.getmtime(location) + self.ttl < time.time():
+                return None
+            with open(location, 'rb') as f:
+                content_type = f.readline().rstrip(b'\n').decode('ascii')
+                data = f.read()
+        except (IOError, OSError) as ex:
+            if ex.errno != errno.ENOENT:
+                log.warning('unable to read cached response %s: %s', location, ex)
+            return None
+        return CachedResponse(data, content_type)
+
+    def put(self, key, data, content_type):
+        if len(data) > self.max_size:
+            return
+        location = self._location(key)
+        try:
+            ensure_directory(location)
+            write_atomic(location, content_type.encode('ascii') + b'\n' + data)
+        except (IOError, OSError) as ex:
+            log.warning('unable to store response %s: %s', location, ex)
+            return
+
+        with self._lock:
+            self._written += len(data)
+            if self._written < self.max_size / 10:
+                return
+            self._written = 0
+        self.cleanup()
+
+    def cleanup(self):
+        """
+        Remove expired responses and the oldest responses that exceed
+        `max_size`. Includes responses of other namespaces (i.e. older
+        configurations).
+        """
+        now = time.time()
+        files = []
+        for dirpath, _, filenames in os.walk(self.base_dir):
+            for filename in filenames:
+                location = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(location)
+                except OSError:
+                    continue
+                if self.ttl and stat.st_mtime + self.ttl < now:
+                    self._remove(location)
+                else:
+                    files.append((stat.st_mtime, stat.st_size, location))
+
+        size = sum(f[1] for f in files)
+        files.sort()
+        for _, file_size, location in files:
+            if size <= self.max_size:
+                break
+            self._remove(location)
+            size -= file_size
+
+    def _remove(self, location):
+        try:
+            os.remove(location)
+        except OSError as ex:
+            if ex.errno != errno.ENOENT:
+                raise
@@ -21,7 +21,7 @@ import threading
 
 from mapproxy.image import ImageSource
 from mapproxy.cache import path
-from mapproxy.cache.base import tile_buffer, TileCacheBase
+from mapproxy.cache.base import tile_buffer, TileCacheBase, are_cached_by_group
 from mapproxy.util import async_
 from mapproxy.util.py import reraise_exception
 
@@ -48,6 +48,9 @@ class S3ConnectionError(Exception):
     pass
 
 class S3Cache(TileCacheBase):
+    # are_cached lists at most that many keys for each tile,
+    # before it checks each remaining tile with HEAD
+    max_listed_keys_per_tile = 10
 
     def __init__(self, base_path, file_ext, directory_layout='tms',
                  bucket_name='mapproxy', profile_name=None, region_name=None, endpoint_url=None,
@@ -115,6 +118,57 @@ class S3Cache(TileCacheBase):
 
         return True
 
+    def are_cached(self, tiles, with_metadata=False):
+        # list the keys of each prefix instead of a HEAD request for each tile
+        return are_cached_by_group(tiles, lambda t: self.tile_key(t).rpartition('/')[0],
+            self._are_cached_prefix)
+
+    def _are_cached_prefix(self, prefix, tiles):
+        keys = [self.tile_key(t) for t in tiles]
+        if len(set(keys)) == 1:
+            return [self.is_cached(t) for t in tiles]
+
+        # keys are listed in lexicographical order, start before the
+        # first and stop after the last key
+        wanted = set(keys)
+        last_key = max(keys)
+        listed_key = None
+        max_listed = self.max_listed_keys_per_tile * len(wanted)
+        found = {}
+        listed = 0
+        paginator = self.conn().get_paginator('list_objects_v2')
+        pages = paginator.paginate(Bucket=self.bucket_name,
+            Prefix=prefix + '/' if prefix else '', StartAfter=min(keys)[:-1])
+        for page in pages:
+            contents = page.get('Contents', [])
+            for obj in contents:
+                if obj['Key'] in wanted:
+                    found[obj['Key']] = obj
+            if not contents or contents[-1]['Key'] >= last_key:
+                listed_key = last_key
+                break
+            listed_key = contents[-1]['Key']
+            listed += len(contents)
+            if listed > max_listed:
+                # too many other tiles (e.g. other levels of quadkey layouts)
+                break
+        else:
+            # all keys of the prefix listed
+            listed_key = last_key
+
+        cached = []
+        for tile, key in zip(tiles, keys):
+            if listed_key is None or key > listed_key:
+                cached.append(self.is_cached(tile))
+                continue
+            obj = found.get(key)
+            if obj is not None:
+                self._set_metadata(obj, tile)
+                if 'Size' in obj:
+                    tile.size = obj['Size']
+            cached.append(obj is not None)
+        return cached
+
     def load_tiles(self, tiles, with_metadata=True):
         p = async_.Pool(min(4, len(tiles)))
         return all(p.map(self.load_tile, tiles))
@@ -155,7 +209,7 @@ class S3Cache(TileCacheBase):
         log.debug('S3: store_tile, key: %s' % key)
 
         extra_args = {}
-        if self.file_ext in ('jpeg', 'png'):
+        if self.file_ext in ('jpeg', 'png', 'webp'):
             extra_args['ContentType'] = 'image/' + self.file_ext
         if self.access_control_list:
             extra_args['ACL'] = self.access_control_list
@@ -35,15 +35,18 @@ Tile caching (creation, caching and retrieval of tiles).
 
 """
 
+import time
 
 from functools import partial
 from contextlib import contextmanager
+from mapproxy.cache.admission import TileCreationOverload
 from mapproxy.grid import MetaGrid
 from mapproxy.image import BlankImageSource
 from mapproxy.image.opts import ImageOptions
 from mapproxy.image.merge import merge_images
 from mapproxy.image.tile import TileSplitter, TiledImage
 from mapproxy.layer import MapQuery, BlankImage
+from mapproxy.source import check_deadline
 from mapproxy.util import async_
 from mapproxy.util.py import reraise
 
@@ -57,6 +60,8 @@ class TileManager(object):
     :param pre_store_filter: a list with filter. each filter will be called
         with a tile before it will be stored to disc. the filter should
         return this or a new tile object.
+    :param admission: `TileCreationAdmission` that limits the concurrent
+        creation of uncached tiles, optionally in a separate thread pool
     """
     def __init__(self, grid, cache, sources, format, locker, image_opts=None, request_format=None,
             meta_buffer=None, meta_size=None, minimize_meta_requests=False, identifier=None,
@@ -64,6 +69,7 @@ class TileManager(object):
             bulk_meta_tiles=False,
             rescale_tiles=0,
             cache_rescaled_tiles=False,
+            admission=None,
         ):
         self.grid = grid
         self.cache = cache
@@ -79,6 +85,7 @@ class TileManager(object):
         self.pre_store_filter = pre_store_filter or []
         self.concurrent_tile_creators = concurrent_tile_creators
         self.tile_creator_class = tile_creator_class or TileCreator
+        self.admission = admission
 
         self.rescale_tiles = rescale_tiles
         self.cache_rescaled_tiles = cache_rescaled_tiles
@@ -111,13 +118,20 @@ class TileManager(object):
         if hasattr(self.cache, 'cleanup'):
             self.cache.cleanup()
 
-    def load_tile_coord(self, tile_coord, dimensions=None, with_metadata=False):
+    def load_tile_coord(self, tile_coord, dimensions=None, with_metadata=False, deadline=None):
         return self.load_tile_coords(
             [tile_coord], dimensions=dimensions, with_metadata=with_metadata,
+            deadline=deadline,
         )[0]
 
 
-    def load_tile_coords(self, tile_coords, dimensions=None, with_metadata=False):
+    def load_tile_coords(self, tile_coords, dimensions=None, with_metadata=False, deadline=None):
+        """
+        Load tiles from the cache and create all uncached tiles.
+
+        :param deadline: time (``time.time()``) when all tiles should be
+            created, passed to all source queries
+        """
         tiles = TileCollection(tile_coords)
         rescale_till_zoom = 0
         if self.rescale_tiles:
@@ -139,6 +153,7 @@ class TileManager(object):
         tiles = self._load_tile_coords(
             tiles, dimensions=dimensions, with_metadata=with_metadata,
             rescale_till_zoom=rescale_till_zoom, rescaled_tiles={},
+            deadline=deadline,
         )
 
         for t in tiles.tiles:
@@ -149,7 +164,7 @@ class TileManager(object):
         return tiles
 
     def _load_tile_coords(self, tiles, dimensions=None, with_metadata=False,
-                          rescale_till_zoom=None, rescaled_tiles=None,
+                          rescale_till_zoom=None, rescaled_tiles=None, deadline=None,
         ):
         uncached_tiles = []
 
@@ -167,10 +182,16 @@ class TileManager(object):
                 uncached_tiles.append(tile)
 
         if uncached_tiles:
-            creator = self.creator(dimensions=dimensions)
-            created_tiles = creator.create_tiles(uncached_tiles)
+            if self.admission is not None and self.sources:
+                created_tiles = self._create_admitted_tiles(uncached_tiles, dimensions, deadline)
+                if created_tiles is None:
+                    return self._overloaded_tiles(tiles, uncached_tiles)
+            else:
+                creator = self.creator(dimensions=dimensions, deadline=deadline)
+                created_tiles = creator.create_tiles(uncached_tiles)
             if not created_tiles and self.rescale_tiles:
-                created_tiles = [self._scaled_tile(t, rescale_till_zoom, rescaled_tiles) for t in uncached_tiles]
+                created_tiles = [self._scaled_tile(t, rescale_till_zoom, rescaled_tiles, deadline)
+                    for t in uncached_tiles]
 
             for created_tile in created_tiles:
                 if created_tile.coord in tiles:
@@ -178,12 +199,62 @@ class TileManager(object):
 
         return tiles
 
+    def _create_admitted_tiles(self, uncached_tiles, dimensions=None, deadline=None):
+        """
+        Create `uncached_tiles` if the `admission` limits allow it.
+        Returns ``None`` if the tiles were not admitted or if the tiles
+        were not created in the pool within the timeout.
+        """
+        admission = self.admission
+        if not admission.acquire():
+            return None
+        creator = self.creator(dimensions=dimensions, deadline=deadline)
+        if admission.pool is None:
+            try:
+                return creator.create_tiles(uncached_tiles)
+            finally:
+                admission.release()
+
+        # new tiles, as the creation can continue after the timeout
+        new_tiles = [Tile(t.coord) for t in uncached_tiles]
+        task = admission.pool.submit(creator.create_tiles, (new_tiles, ),
+            done=admission.release)
+        timeout = admission.timeout
+        if deadline is not None:
+            remaining = max(0, deadline - time.time())
+            if timeout is None or remaining < timeout:
+                timeout = remaining
+        if not admission.pool.wait(task, timeout):
+            return None
+        return task.result()
+
+    def _overloaded_tiles(self, tiles, uncached_tiles):
+        """
+        Return `tiles` without creating `uncached_tiles`. Expired tiles
+        are returned as they are (if `serve_stale` is enabled), missing
+        tiles are blank or a `TileCreationOverload` is raised.
+        """
+        if self.admission.serve_stale:
+            missing_tiles = [t for t in uncached_tiles if t.source is None]
+        else:
+            missing_tiles = uncached_tiles
+        if missing_tiles and self.admission.on_overload != 'blank':
+            raise TileCreationOverload(
+                'too many concurrent or slow tile creations for %s' % self.identifier,
+                retry_after=self.admission.retry_after,
+            )
+        for tile in missing_tiles:
+            tile.source = BlankImageSource(size=self.grid.tile_size,
+                image_opts=self.image_opts, cacheable=False)
+            tile.cacheable = False
+        return tiles
+
     def remove_tile_coords(self, tile_coords, dimensions=None):
         tiles = TileCollection(tile_coords)
         self.cache.remove_tiles(tiles)
 
-    def creator(self, dimensions=None):
-        return self.tile_creator_class(self, dimensions=dimensions)
+    def creator(self, dimensions=None, deadline=None):
+        return self.tile_creator_class(self, dimensions=dimensions, deadline=deadline)
 
     def lock(self, tile):
         if self.meta_grid:
@@ -221,6 +292,42 @@ class TileManager(object):
             return False
         return False
 
+    def are_cached(self, tiles, dimensions=None):
+        """
+        Return a list with ``True`` for each tile of `tiles` that is
+        cached and not expired. Same as `is_cached`, but the cache checks
+        all tiles at once.
+        """
+        return self._check_cached(tiles)[0]
+
+    def are_stale(self, tiles, dimensions=None):
+        """
+        Return a list with ``True`` for each tile of `tiles` that exists
+        _and_ is expired. Same as `is_stale`, but the cache checks all
+        tiles at once.
+        """
+        return self._check_cached(tiles)[1]
+
+    def _check_cached(self, tiles):
+        tiles = [t if isinstance(t, Tile) else Tile(t) for t in tiles]
+        check = [t for t in tiles if t.coord is not None]
+        max_mtimes = [self.expire_timestamp(t) for t in check]
+        with_metadata = any(m is not None for m in max_mtimes)
+        present = iter(zip(self.cache.are_cached(check, with_metadata=with_metadata), max_mtimes))
+
+        cached = []
+        stale = []
+        for tile in tiles:
+            if tile.coord is None:
+                cached.append(True)
+                stale.append(False)
+                continue
+            is_present, max_mtime = next(present)
+            is_stale = bool(is_present and max_mtime is not None and tile.timestamp < max_mtime)
+            cached.append(is_present and not is_stale)
+            stale.append(is_stale)
+        return cached, stale
+
     def expire_timestamp(self, tile=None):
         """
         Return the timestamp until which a tile should be accepted as up-to-date,
@@ -242,7 +349,7 @@ class TileManager(object):
             tile = img_filter(tile)
         return tile
 
-    def _scaled_tile(self, tile, stop_zoom, rescaled_tiles):
+    def _scaled_tile(self, tile, stop_zoom, rescaled_tiles, deadline=None):
         """
         Try to load tile by loading, scaling and clipping tiles from zoom levels above or
         below. stop_zoom determines if tiles from above should be scaled up, or if tiles
@@ -279,6 +386,7 @@ class TileManager(object):
             affected_tiles,
             rescale_till_zoom=stop_zoom,
             rescaled_tiles=rescaled_tiles,
+            deadline=deadline,
         )
 
         if tile_collection.blank:
@@ -302,7 +410,8 @@ class TileManager(object):
 RESCALE_TILE_MISSING = BlankImageSource((256, 256), ImageOptions())
 
 class TileCreator(object):
-    def __init__(self, tile_mgr, dimensions=None, image_merger=None, bulk_meta_tiles=False):
+    def __init__(self, tile_mgr, dimensions=None, image_merger=None, bulk_meta_tiles=False,
+        deadline=None):
         self.cache = tile_mgr.cache
         self.sources = tile_mgr.sources
         self.grid = tile_mgr.grid
@@ -311,6 +420,7 @@ class TileCreator(object):
         self.tile_mgr = tile_mgr
         self.dimensions = dimensions
         self.image_merger = image_merger
+        self.deadline = deadline
 
     def is_cached(self, tile):
         """
@@ -359,7 +469,8 @@ class TileCreator(object):
     def _create_single_tile(self, tile):
         tile_bbox = self.grid.tile_bbox(tile.coord)
         query = MapQuery(tile_bbox, self.grid.tile_size, self.grid.srs,
-                         self.tile_mgr.request_format, dimensions=self.dimensions)
+                         self.tile_mgr.request_format, dimensions=self.dimensions,
+                         deadline=self.deadline)
         with self.tile_mgr.lock(tile):
             if not self.is_cached(tile):
                 source = self._query_sources(query)
@@ -382,6 +493,7 @@ class TileCreator(object):
         Query all sources and return the results as a single ImageSource.
         Multiple sources will be merged into a single image.
         """
+        check_deadline(query.deadline)
 
         # directly return get_map without merge if ...
         if (len(self.sources) == 1 and
@@ -433,7 +545,7 @@ class TileCreator(object):
         """
         tile_size = self.grid.tile_size
         query = MapQuery(meta_tile.bbox, meta_tile.size, self.grid.srs, self.tile_mgr.request_format,
-            dimensions=self.dimensions)
+            dimensions=self.dimensions, deadline=self.deadline)
         main_tile = Tile(meta_tile.main_tile_coord)
         with self.tile_mgr.lock(main_tile):
             if not all(self.is_cached(t) for t in meta_tile.tiles if t is not None):
@@ -463,7 +575,7 @@ class TileCreator(object):
                 def query_tile(coord):
                     try:
                         query = MapQuery(self.grid.tile_bbox(coord), tile_size, self.grid.srs, self.tile_mgr.request_format,
-                            dimensions=self.dimensions)
+                            dimensions=self.dimensions, deadline=self.deadline)
                         tile_image = self._query_sources(query)
                         if tile_image is None:
                             return None
@@ -25,7 +25,7 @@ class ArcGISClient(object):
 
     def retrieve(self, query, format):
         url  = self._query_url(query, format)
-        resp = self.http_client.open(url)
+        resp = self.http_client.open(url, deadline=query.deadline)
         return resp
 
     def _query_url(self, query, format):
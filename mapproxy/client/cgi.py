@@ -28,7 +28,7 @@ from mapproxy.image import ImageSource
 from mapproxy.client.http import HTTPClientError
 from mapproxy.client.log import log_request
 from mapproxy.compat.modules import urlparse
-from mapproxy.compat import BytesIO
+from mapproxy.compat import BytesIO, PY2
 
 
 def split_cgi_response(data):
@@ -77,9 +77,15 @@ class CGIClient(object):
         self.working_directory = working_directory
         self.no_headers = no_headers
 
-    def open(self, url, data=None):
+    def open(self, url, data=None, deadline=None):
         assert data is None, 'POST requests not supported by CGIClient'
 
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                raise HTTPClientError('Request deadline exceeded before CGI call')
+
         parsed_url = urlparse.urlparse(url)
         environ = os.environ.copy()
         environ.update({
@@ -106,7 +112,15 @@ class CGIClient(object):
             else:
                 raise
 
-        stdout = p.communicate()[0]
+        if timeout is None or PY2:
+            stdout = p.communicate()[0]
+        else:
+            try:
+                stdout = p.communicate(timeout=timeout)[0]
+            except subprocess.TimeoutExpired:
+                p.kill()
+                p.communicate()
+                raise HTTPClientError('Request deadline exceeded during CGI call')
         ret = p.wait()
         if ret != 0:
             raise HTTPClientError('Error during CGI call (exit code: %d)'
@@ -130,8 +144,8 @@ class CGIClient(object):
             status_code, size=size, method='CGI', duration=time.time()-start_time)
         return content
 
-    def open_image(self, url, data=None):
-        resp = self.open(url, data=data)
+    def open_image(self, url, data=None, deadline=None):
+        resp = self.open(url, data=data, deadline=deadline)
         if 'Content-type' in resp.headers:
             if not resp.headers['Content-type'].lower().startswith('image'):
                 raise HTTPClientError('response is not an image: (%s)' % (resp.read()))
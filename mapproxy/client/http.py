@@ -26,6 +26,7 @@ from mapproxy.util.py import reraise_exception
 from mapproxy.client.log import log_request
 from mapproxy.compat import PY2
 from mapproxy.compat.modules import urlparse
+from mapproxy.source import DeadlineExceeded
 
 if PY2:
     import urllib2
@@ -161,7 +162,8 @@ create_url_opener = _URLOpenerCache()
 
 class HTTPClient(object):
     def __init__(self, url=None, username=None, password=None, insecure=False,
-                 ssl_ca_certs=None, timeout=None, headers=None, hide_error_details=False):
+                 ssl_ca_certs=None, timeout=None, headers=None, hide_error_details=False,
+                 rate_limit=None):
         self._timeout = timeout
         if url and url.startswith('https'):
             if insecure:
@@ -173,10 +175,30 @@ class HTTPClient(object):
         self.opener = create_url_opener(ssl_ca_certs, url, username, password, insecure=insecure)
         self.header_list = headers.items() if headers else []
         self.hide_error_details = hide_error_details
+        self.rate_limit = rate_limit
 
-    def open(self, url, data=None):
+    def open(self, url, data=None, deadline=None):
+        """
+        Open `url` and return the response.
+
+        :param deadline: time (``time.time()``) when the response must
+            be received. Reduces the timeout of the request.
+        """
         code = None
         result = None
+        if self.rate_limit is not None:
+            max_wait = None
+            if deadline is not None:
+                max_wait = deadline - time.time()
+            if not self.rate_limit.acquire(max_wait=max_wait):
+                raise DeadlineExceeded('request deadline exceeded while waiting for rate limit')
+        timeout = self._timeout
+        if deadline is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise self.handle_url_exception(url, 'Request deadline exceeded', 'no time left')
+            if timeout is None or remaining < timeout:
+                timeout = remaining
         try:
             req = urllib2.Request(url, data=data)
         except ValueError as e:
@@ -186,8 +208,8 @@ class HTTPClient(object):
             req.add_header(key, value)
         try:
             start_time = time.time()
-            if self._timeout is not None:
-                result = self.opener.open(req, timeout=self._timeout)
+            if timeout is not None:
+                result = self.opener.open(req, timeout=timeout)
             else:
                 result = self.opener.open(req)
         except HTTPError as e:
@@ -218,8 +240,8 @@ class HTTPClient(object):
         finally:
             log_request(url, code, result, duration=time.time()-start_time, method=req.get_method())
 
-    def open_image(self, url, data=None):
-        resp = self.open(url, data=data)
+    def open_image(self, url, data=None, deadline=None):
+        resp = self.open(url, data=data, deadline=deadline)
         if 'content-type' in resp.headers:
             if not resp.headers['content-type'].lower().startswith('image'):
                 raise HTTPClientError('response is not an image: (%s)' % (resp.read()))
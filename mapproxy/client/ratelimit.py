@@ -0,0 +1,154 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Rate limiting of requests to sources.
+
+Each `RateLimit` is a token bucket. The state of the bucket is stored in a
+small file next to the lock files, so that all processes and threads (e.g.
+all seed workers, or all processes of a WSGI server) share the same limit.
+Each request takes one token. Requests wait if no token is left, the token
+is reserved before waiting, so waiting requests are served in order.
+"""
+
+from __future__ import division
+
+import errno
+import os
+import struct
+import threading
+import time
+
+from mapproxy.util.lock import FileLock
+
+import logging
+log = logging.getLogger(__name__)
+
+
+_limits = {}
+_limits_lock = threading.Lock()
+
+
+def rate_limit_stats():
+    """
+    Return the statistics of all rate limits of this process as a dict,
+    e.g. ``{'example.org (seed)': {'requests': 120, 'delayed': 20, ...}}``.
+    The statistics include the requests of all processes.
+    """
+    with _limits_lock:
+        limits = list(_limits.items())
+    return dict((name, limit.stats()) for name, limit in limits)
+
+
+class RateLimit(object):
+    """
+    Token bucket with a state file that is shared by all processes.
+
+    :param name: name for statistics and log messages
+    :param state_file: location of the state of the bucket
+    :param rate: tokens (requests) per second
+    :param burst: maximum number of tokens, i.e. the number of requests
+        that are not delayed after a pause
+    :param lock_timeout: seconds to wait for the lock of the state file
+    """
+    # tokens, timestamp, waited seconds, requests, delayed requests
+    _state_format = '<dddQQ'
+
+    def __init__(self, name, state_file, rate, burst=1, lock_timeout=60.0):
+        self.name = name
+        self.state_file = state_file
+        self.lock_file = state_file + '.lck'
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.lock_timeout = lock_timeout
+        with _limits_lock:
+            _limits[name] = self
+
+    def acquire(self, max_wait=None):
+        """
+        Take one token, wait till the token is available.
+
+        :param max_wait: do not wait longer than `max_wait` seconds
+        :returns: ``False`` if the token is not available within
+            `max_wait`, no token is taken in this case
+        """
+        wait = self._reserve(max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            log.debug('%s: waiting %.3fs for rate limit', self.name, wait)
+            time.sleep(wait)
+        return True
+
+    def _reserve(self, max_wait):
+        """
+        Take one token from the bucket and return the seconds till it is
+        available, or ``None`` if that is longer than `max_wait`.
+        """
+        with FileLock(self.lock_file, timeout=self.lock_timeout):
+            now = time.time()
+            state = self._read()
+            if state is None:
+                tokens, timestamp, waited, requests, delayed = self.burst, now, 0.0, 0, 0
+            else:
+                tokens, timestamp, waited, requests, delayed = state
+            # timestamp can be in the future if the clocks of processes differ
+            tokens = min(self.burst, tokens + max(0.0, now - timestamp) * self.rate)
+            wait = max(0.0, (1 - tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            tokens -= 1
+            requests += 1
+            if wait > 0:
+                waited += wait
+                delayed += 1
+            self._write((tokens, max(now, timestamp), waited, requests, delayed))
+        return wait
+
+    def _read(self):
+        try:
+            with open(self.state_file, 'rb') as f:
+                data = f.read()
+        except (IOError, OSError) as ex:
+            if ex.errno != errno.ENOENT:
+                log.warning('unable to read rate limit state %s: %s', self.state_file, ex)
+            return None
+        if len(data) != struct.calcsize(self._state_format):
+            return None
+        return struct.unpack(self._state_format, data)
+
+    def _write(self, state):
+        with open(self.state_file, 'wb') as f:
+            f.write(struct.pack(self._state_format, *state))
+
+    def stats(self):
+        """
+        Return the number of requests, the number of delayed requests and
+        the total seconds the requests waited, for all processes.
+        """
+        if os.path.exists(self.state_file):
+            with FileLock(self.lock_file, timeout=self.lock_timeout):
+                state = self._read()
+        else:
+            state = None
+        if state is None:
+            state = self.burst, 0.0, 0.0, 0, 0
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'waited': state[2],
+            'requests': state[3],
+            'delayed': state[4],
+        }
@@ -21,10 +21,10 @@ class TileClient(object):
         self.http_client = http_client
         self.grid = grid
 
-    def get_tile(self, tile_coord, format=None):
+    def get_tile(self, tile_coord, format=None, deadline=None):
         url = self.url_template.substitute(tile_coord, format, self.grid)
         if self.http_client:
-            return self.http_client.open_image(url)
+            return self.http_client.open_image(url, deadline=deadline)
         else:
             return retrieve_image(url)
 
@@ -61,9 +61,9 @@ class WMSClient(object):
 
         if self.lock:
             with self.lock():
-                resp = self.http_client.open(url, data=data)
+                resp = self.http_client.open(url, data=data, deadline=query.deadline)
         else:
-            resp = self.http_client.open(url, data=data)
+            resp = self.http_client.open(url, data=data, deadline=query.deadline)
         self._check_resp(resp, url)
         return resp
 
@@ -48,6 +48,22 @@ except ImportError:
 def has_alpha_composite_support():
     return hasattr(Image, 'alpha_composite')
 
+def has_libimagequant_support():
+    if not hasattr(Image, 'LIBIMAGEQUANT'):
+        return False
+    try:
+        from PIL import features
+        return features.check_feature('libimagequant')
+    except (ImportError, AttributeError, ValueError):
+        return False
+
+def has_webp_support():
+    try:
+        from PIL import features
+        return features.check('webp')
+    except (ImportError, AttributeError, ValueError):
+        return False
+
 def transform_uses_center():
     # transformation behavior changed with Pillow 3.4 to use pixel centers
     # https://github.com/python-pillow/Pillow/commit/5232361718bae0f0ccda76bfd5b390ebf9179b18
@@ -66,6 +66,12 @@ cache = dict(
     sqlite_timeout = 30,
 )
 
+tile_creation = dict(
+    on_overload = 'error',
+    serve_stale = True,
+    retry_after = 10,
+)
+
 grid = dict(
     tile_size = (256, 256),
 )
@@ -84,6 +84,7 @@ class ProxyConfiguration(object):
     def load_sources(self):
         self.sources = SourcesCollection()
         for source_name, source_conf in iteritems((self.configuration.get('sources') or {})):
+            source_conf['name'] = source_name
             self.sources[source_name] = SourceConfiguration.load(conf=source_conf, context=self)
 
     def load_tile_layers(self):
@@ -224,6 +225,18 @@ class ProxyConfiguration(object):
     def base_config(self):
         return self.globals.base_config
 
+    @memoize
+    def tile_creation_limit(self):
+        """
+        Return the `CreationLimit` for all caches, or ``None`` if
+        ``globals.tile_creation.max_concurrent`` is not set.
+        """
+        max_concurrent = self.globals.get_value('tile_creation.max_concurrent')
+        if not max_concurrent:
+            return None
+        from mapproxy.cache.admission import CreationLimit
+        return CreationLimit('global', max_concurrent)
+
     def config_files(self):
         """
         Returns a dictionary with all configuration filenames and there timestamps.
@@ -406,6 +419,7 @@ class ImageOptionsConfiguration(ConfigurationBase):
             self.formats[format] = conf
 
     def _check_encoding_options(self, options):
+        from mapproxy.image import encoders
         if not options:
             return
         options = options.copy()
@@ -417,10 +431,60 @@ class ImageOptionsConfiguration(ConfigurationBase):
         if tiff_compression and tiff_compression not in ('raw', 'tiff_lzw', 'jpeg'):
             raise ConfigurationError('unknown tiff_compression')
 
+        tiff_cog = options.pop('tiff_cog', None)
+        if tiff_cog is not None and not isinstance(tiff_cog, bool):
+            raise ConfigurationError('tiff_cog is not a boolean')
+        if tiff_cog and tiff_compression not in (None, 'raw'):
+            raise ConfigurationError('tiff_cog only supports raw tiff_compression')
+
+        tiff_tile_size = options.pop('tiff_tile_size', None)
+        if tiff_tile_size is not None and (
+            not isinstance(tiff_tile_size, int) or tiff_tile_size <= 0 or tiff_tile_size % 16):
+            raise ConfigurationError('tiff_tile_size is not a multiple of 16')
+
         quantizer = options.pop('quantizer', None)
-        if quantizer and quantizer not in ('fastoctree', 'mediancut'):
+        if quantizer and quantizer not in encoders.quantizers:
             raise ConfigurationError('unknown quantizer')
 
+        preset = options.pop('preset', None)
+        if preset and preset not in encoders.encoding_presets:
+            raise ConfigurationError('unknown encoding preset: %s' % preset)
+
+        png_compress_level = options.pop('png_compress_level', None)
+        if png_compress_level is not None and (
+            not isinstance(png_compress_level, int) or not 0 <= png_compress_level <= 9):
+            raise ConfigurationError('png_compress_level is not an integer between 0 and 9')
+
+        png_compress_strategy = options.pop('png_compress_strategy', None)
+        if png_compress_strategy and png_compress_strategy not in encoders.png_compress_strategies:
+            raise ConfigurationError('unknown png_compress_strategy')
+
+        jpeg_optimize = options.pop('jpeg_optimize', None)
+        if jpeg_optimize is not None and not isinstance(jpeg_optimize, bool):
+            raise ConfigurationError('jpeg_optimize is not a boolean')
+
+        jpeg_encoder = options.pop('jpeg_encoder', None)
+        if jpeg_encoder and jpeg_encoder not in encoders.jpeg_encoders:
+            raise ConfigurationError('unknown jpeg_encoder')
+
+        webp_quality = options.pop('webp_quality', None)
+        if webp_quality is not None and (
+            not isinstance(webp_quality, int) or not 0 <= webp_quality <= 100):
+            raise ConfigurationError('webp_quality is not an integer between 0 and 100')
+
+        webp_method = options.pop('webp_method', None)
+        if webp_method is not None and (
+            not isinstance(webp_method, int) or not 0 <= webp_method <= 6):
+            raise ConfigurationError('webp_method is not an integer between 0 and 6')
+
+        webp_lossless = options.pop('webp_lossless', None)
+        if webp_lossless is not None and not isinstance(webp_lossless, bool):
+            raise ConfigurationError('webp_lossless is not a boolean')
+
+        err = encoders.check_encoder_support(dict(quantizer=quantizer, jpeg_encoder=jpeg_encoder))
+        if err:
+            raise ConfigurationError(err)
+
         if options:
             raise ConfigurationError('unknown encoding_options: %r' % options)
 
@@ -468,6 +532,11 @@ class ImageOptionsConfiguration(ConfigurationBase):
             conf['colors'] = 256
 
         opts = ImageOptions(**conf)
+        if opts.format and opts.format.ext == 'webp':
+            from mapproxy.image import encoders
+            err = encoders.check_encoder_support(dict(format='webp'))
+            if err:
+                raise ConfigurationError(err)
         return opts
 
 
@@ -595,9 +664,45 @@ class SourceConfiguration(ConfigurationBase):
 
         http_client = HTTPClient(url, username, password, insecure=insecure,
                                  ssl_ca_certs=ssl_ca_certs, timeout=timeout,
-                                 headers=headers, hide_error_details=hide_error_details)
+                                 headers=headers, hide_error_details=hide_error_details,
+                                 rate_limit=self.rate_limit(url))
         return http_client, url
 
+    @memoize
+    def rate_limit(self, url):
+        """
+        Return the `RateLimit` for requests to `url`, or ``None``. Seeding
+        and serving use separate limits.
+        """
+        rate_limit_conf = self.context.globals.get_value('http.rate_limit', self.conf)
+        if not rate_limit_conf:
+            return None
+
+        rate = rate_limit_conf.get('requests_per_second')
+        burst = rate_limit_conf.get('burst', 1)
+        mode = 'serve'
+        if self.context.seed:
+            rate = rate_limit_conf.get('seed_requests_per_second', rate)
+            burst = rate_limit_conf.get('seed_burst', burst)
+            mode = 'seed'
+        if not rate:
+            return None
+        if rate <= 0 or burst < 1:
+            raise ConfigurationError('rate_limit requires positive requests_per_second and burst')
+
+        if rate_limit_conf.get('per_host', False):
+            name = urlparse.urlparse(url).netloc
+        else:
+            name = self.conf['name']
+        name = '%s (%s)' % (name, mode)
+
+        from mapproxy.client.ratelimit import RateLimit
+        lock_dir = self.context.globals.get_path('cache.lock_dir', self.conf)
+        lock_timeout = self.context.globals.get_value('http.client_timeout', self.conf)
+        md5 = hashlib.md5(name.encode('utf-8'))
+        state_file = os.path.join(lock_dir, 'ratelimit-' + md5.hexdigest())
+        return RateLimit(name, state_file, rate, burst=burst, lock_timeout=lock_timeout)
+
     @memoize
     def on_error_handler(self):
         if not 'on_error' in self.conf: return None
@@ -1296,6 +1401,48 @@ class CacheConfiguration(ConfigurationBase):
         cache_type = self.conf.get('cache', {}).get('type', 'file')
         return getattr(self, '_%s_cache' % cache_type)(grid_conf, file_ext)
 
+    @memoize
+    def _tile_creation_admission(self):
+        """
+        Return the `TileCreationAdmission` for all grids of this cache,
+        or ``None`` if no limits or pool are configured. Seeding and
+        renderd are never limited.
+        """
+        if self.context.seed or self.context.renderd:
+            return None
+        from mapproxy.cache.admission import CreationLimit, TileCreationAdmission
+
+        limits = []
+        max_concurrent = self.context.globals.get_value('tile_creation.max_concurrent', self.conf,
+            global_key='tile_creation.max_concurrent_per_cache')
+        if max_concurrent:
+            limits.append(CreationLimit(self.conf['name'], max_concurrent))
+        global_limit = self.context.tile_creation_limit()
+        if global_limit:
+            limits.append(global_limit)
+
+        pool = timeout = None
+        pool_size = self.context.globals.get_value('tile_creation.pool_size', self.conf)
+        if pool_size:
+            from mapproxy.cache.admission import CreationPool
+            pool = CreationPool(self.conf['name'] + '.pool', pool_size)
+            timeout = self.context.globals.get_value('tile_creation.timeout', self.conf,
+                default_key='http.client_timeout')
+
+        if not limits and not pool:
+            return None
+
+        on_overload = self.context.globals.get_value('tile_creation.on_overload', self.conf)
+        if on_overload not in ('error', 'blank'):
+            raise ConfigurationError('unknown tile_creation.on_overload: %s' % on_overload)
+        return TileCreationAdmission(limits,
+            on_overload=on_overload,
+            serve_stale=self.context.globals.get_value('tile_creation.serve_stale', self.conf),
+            retry_after=self.context.globals.get_value('tile_creation.retry_after', self.conf),
+            pool=pool,
+            timeout=timeout,
+        )
+
     def _tile_filter(self):
         filters = []
         if 'watermark' in self.conf:
@@ -1571,6 +1718,7 @@ class CacheConfiguration(ConfigurationBase):
                 bulk_meta_tiles=bulk_meta_tiles,
                 cache_rescaled_tiles=cache_rescaled_tiles,
                 rescale_tiles=rescale_tiles,
+                admission=self._tile_creation_admission(),
             )
             extent = merge_layer_extents(sources)
             if extent.is_default:
@@ -1594,13 +1742,16 @@ class CacheConfiguration(ConfigurationBase):
         image_opts = self.image_opts()
         max_tile_limit = self.context.globals.get_value('max_tile_limit', self.conf,
             global_key='cache.max_tile_limit')
+        max_tile_limit_res_factor = self.context.globals.get_value('max_tile_limit_res_factor', self.conf,
+            global_key='cache.max_tile_limit_res_factor')
         caches = []
         main_grid = None
         for grid, extent, tile_manager in self.caches():
             if main_grid is None:
                 main_grid = grid
             caches.append((CacheMapLayer(tile_manager, extent=extent, image_opts=image_opts,
-                                         max_tile_limit=max_tile_limit),
+                                         max_tile_limit=max_tile_limit,
+                                         max_tile_limit_res_factor=max_tile_limit_res_factor),
                           grid.srs))
 
         if len(caches) == 1:
@@ -1879,6 +2030,48 @@ class ServiceConfiguration(ConfigurationBase):
                     layers[tile_layer.md['name_internal']] = tile_layer
         return layers
 
+    def sendfile_offload(self):
+        from mapproxy.response import SendfileOffload
+
+        conf = self.context.globals.get_value('tiles.sendfile')
+        if not conf:
+            return None
+        header = conf.get('header', 'X-Sendfile')
+        if header not in ('X-Sendfile', 'X-Accel-Redirect'):
+            raise ConfigurationError('unknown tiles.sendfile.header: %s' % header)
+        prefix = conf.get('prefix')
+        if header == 'X-Accel-Redirect' and not prefix:
+            raise ConfigurationError('tiles.sendfile.prefix required for X-Accel-Redirect')
+        base_dir = conf.get('base_dir')
+        if base_dir:
+            base_dir = self.context.globals.abspath(base_dir)
+        elif prefix:
+            base_dir = self.context.globals.get_path('cache.base_dir', {})
+        return SendfileOffload(header=header, base_dir=base_dir, prefix=prefix)
+
+    def wms_response_cache(self, conf):
+        from mapproxy.cache.response import MemoryResponseCache, FileResponseCache
+
+        cache_type = conf.get('type', 'memory')
+        max_size = int(conf.get('max_size_mb', 64) * 1024 * 1024)
+        ttl = conf.get('ttl', 300)
+        if cache_type == 'memory':
+            return MemoryResponseCache(max_size=max_size, ttl=ttl)
+        if cache_type == 'file':
+            directory = conf.get('directory')
+            if directory:
+                directory = self.context.globals.abspath(directory)
+            else:
+                directory = os.path.join(
+                    self.context.globals.get_path('cache.base_dir', {}), 'wms_responses')
+            # responses of older configurations are not used after a reload
+            config_hash = hashlib.md5()
+            for filename, timestamp in sorted(self.context.config_files().items()):
+                config_hash.update(('%s%s' % (filename, timestamp)).encode('utf-8'))
+            return FileResponseCache(directory, max_size=max_size, ttl=ttl,
+                namespace=config_hash.hexdigest())
+        raise ConfigurationError('unknown wms.response_cache.type: %s' % cache_type)
+
     def kml_service(self, conf):
         from mapproxy.service.kml import KMLServer
 
@@ -1888,7 +2081,9 @@ class ServiceConfiguration(ConfigurationBase):
         max_tile_age *= 60 * 60 # seconds
         use_grid_names = conf.get('use_grid_names', False)
         layers = self.tile_layers(conf, use_grid_names=use_grid_names)
-        return KMLServer(layers, md, max_tile_age=max_tile_age, use_dimension_layers=use_grid_names)
+        server = KMLServer(layers, md, max_tile_age=max_tile_age, use_dimension_layers=use_grid_names)
+        server.sendfile = self.sendfile_offload()
+        return server
 
     def tms_service(self, conf):
         from mapproxy.service.tile import TileServer
@@ -1901,8 +2096,10 @@ class ServiceConfiguration(ConfigurationBase):
         origin = conf.get('origin')
         use_grid_names = conf.get('use_grid_names', False)
         layers = self.tile_layers(conf, use_grid_names=use_grid_names)
-        return TileServer(layers, md, max_tile_age=max_tile_age, use_dimension_layers=use_grid_names,
+        server = TileServer(layers, md, max_tile_age=max_tile_age, use_dimension_layers=use_grid_names,
             origin=origin)
+        server.sendfile = self.sendfile_offload()
+        return server
 
     def wmts_service(self, conf):
         from mapproxy.service.wmts import WMTSServer, WMTSRestServer
@@ -1947,6 +2144,9 @@ class ServiceConfiguration(ConfigurationBase):
                     )
             )
 
+        sendfile = self.sendfile_offload()
+        for service in services:
+            service.sendfile = sendfile
         return services
 
     def wms_service(self, conf):
@@ -1992,6 +2192,15 @@ class ServiceConfiguration(ConfigurationBase):
         if isinstance(max_output_pixels, list):
             max_output_pixels = max_output_pixels[0] * max_output_pixels[1]
 
+        strip_rendering_min_pixels = conf.get('strip_rendering_min_pixels')
+        if isinstance(strip_rendering_min_pixels, list):
+            strip_rendering_min_pixels = strip_rendering_min_pixels[0] * strip_rendering_min_pixels[1]
+        strip_rendering_height = conf.get('strip_rendering_height', 512)
+
+        response_cache = None
+        if conf.get('response_cache'):
+            response_cache = self.wms_response_cache(conf['response_cache'])
+
         max_tile_age = self.context.globals.get_value('tiles.expires_hours')
         max_tile_age *= 60 * 60 # seconds
 
@@ -2002,6 +2211,10 @@ class ServiceConfiguration(ConfigurationBase):
             max_output_pixels=max_output_pixels, srs_extents=srs_extents,
             max_tile_age=max_tile_age, versions=versions,
             inspire_md=inspire_md,
+            strip_rendering_min_pixels=strip_rendering_min_pixels,
+            strip_rendering_height=strip_rendering_height,
+            response_cache=response_cache,
+            request_timeout=conf.get('request_timeout'),
             )
 
         server.fi_transformers = fi_xslt_transformers(conf, self.context)
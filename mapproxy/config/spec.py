@@ -75,6 +75,13 @@ http_opts = {
     'headers': {
         anything(): str()
     },
+    'rate_limit': {
+        'requests_per_second': number(),
+        'burst': int(),
+        'seed_requests_per_second': number(),
+        'seed_burst': int(),
+        'per_host': bool(),
+    },
 }
 
 mapserver_opts = {
@@ -367,6 +374,7 @@ mapproxy_yaml_spec = {
             'meta_buffer': number(),
             'bulk_meta_tiles': bool(),
             'max_tile_limit': number(),
+            'max_tile_limit_res_factor': number(),
             'minimize_meta_requests': bool(),
             'concurrent_tile_creators': int(),
             'link_single_color_images': bool(),
@@ -377,6 +385,15 @@ mapproxy_yaml_spec = {
                 'endpoint_url': str(),
             },
         },
+        'tile_creation': {
+            'max_concurrent': int(),
+            'max_concurrent_per_cache': int(),
+            'on_overload': str(),
+            'serve_stale': bool(),
+            'retry_after': int(),
+            'pool_size': int(),
+            'timeout': number(),
+        },
         'grid': {
             'tile_size': [int()],
         },
@@ -388,6 +405,11 @@ mapproxy_yaml_spec = {
         },
         'tiles': {
             'expires_hours': number(),
+            'sendfile': {
+                'header': str(),
+                'base_dir': str(),
+                'prefix': str(),
+            },
         },
         'mapserver': mapserver_opts,
         'renderd': {
@@ -408,6 +430,14 @@ mapproxy_yaml_spec = {
             'bulk_meta_tiles': bool(),
             'minimize_meta_requests': bool(),
             'concurrent_tile_creators': int(),
+            'tile_creation': {
+                'max_concurrent': int(),
+                'on_overload': str(),
+                'serve_stale': bool(),
+                'retry_after': int(),
+                'pool_size': int(),
+                'timeout': number(),
+            },
             'disable_storage': bool(),
             'format': str(),
             'image': image_opts,
@@ -463,6 +493,15 @@ mapproxy_yaml_spec = {
             },
             'on_source_errors': str(),
             'max_output_pixels': one_of(number(), [number()]),
+            'strip_rendering_min_pixels': one_of(number(), [number()]),
+            'strip_rendering_height': int(),
+            'request_timeout': number(),
+            'response_cache': {
+                'type': str(),
+                'max_size_mb': number(),
+                'ttl': number(),
+                'directory': str(),
+            },
             'strict': bool(),
             'md': ogc_service_md,
             'inspire_md': type_spec('type', inspire_md),
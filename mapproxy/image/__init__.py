@@ -22,6 +22,7 @@ from io import BytesIO
 
 from mapproxy.compat.image import Image, ImageChops, ImageFileDirectory_v2, TiffTags
 from mapproxy.image.opts import create_image, ImageFormat
+from mapproxy.image import encoders
 from mapproxy.config import base_config
 from mapproxy.srs import make_lin_transf, get_epsg_num
 from mapproxy.compat import string_type
@@ -41,11 +42,14 @@ magic_bytes = [
 
 def peek_image_format(buf):
     buf.seek(0)
-    header = buf.read(10)
+    header = buf.read(12)
     buf.seek(0)
     for format, bytes in magic_bytes:
         if header.startswith(bytes):
             return format
+    # RIFF container with file size in bytes 4-8
+    if header.startswith(b"RIFF") and header[8:12] == b"WEBP":
+        return 'webp'
     return None
 
 TIFF_MODELPIXELSCALETAG = 33550
@@ -313,6 +317,7 @@ def img_has_transparency(img):
 def img_to_buf(img, image_opts, georef=None):
     defaults = {}
     image_opts = image_opts.copy()
+    encoding_options = encoders.resolve_encoding_options(image_opts.encoding_options)
 
     # convert I or L images to target mode
     if image_opts.mode and img.mode[0] in ('I', 'L') and img.mode != image_opts.mode:
@@ -335,8 +340,8 @@ def img_to_buf(img, image_opts, georef=None):
     # quantize if colors is set, but not if we already have a paletted image
     if image_opts.colors and not (img.mode == 'P' and len(img.getpalette()) == image_opts.colors*3):
         quantizer = None
-        if 'quantizer' in image_opts.encoding_options:
-            quantizer = image_opts.encoding_options['quantizer']
+        if 'quantizer' in encoding_options:
+            quantizer = encoding_options['quantizer']
         if image_opts.transparent:
             img = quantize(img, colors=image_opts.colors, alpha=True,
                 defaults=defaults, quantizer=quantizer)
@@ -349,20 +354,41 @@ def img_to_buf(img, image_opts, georef=None):
     buf = BytesIO()
     if format == 'jpeg':
         img = img.convert('RGB')
-        if 'jpeg_quality' in image_opts.encoding_options:
-            defaults['quality'] = image_opts.encoding_options['jpeg_quality']
+        if 'jpeg_quality' in encoding_options:
+            defaults['quality'] = encoding_options['jpeg_quality']
         else:
             defaults['quality'] = base_config().image.jpeg_quality
+        if encoding_options.get('jpeg_encoder') == 'turbojpeg':
+            encoders.encode_turbojpeg(img, buf, quality=defaults['quality'])
+            buf.seek(0)
+            return buf
+        encoders.jpeg_save_options(encoding_options, defaults)
+
+    elif format == 'png':
+        encoders.png_save_options(encoding_options, defaults)
+
+    elif format == 'webp':
+        if not image_opts.transparent and img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        elif img.mode == 'P':
+            img = img.convert('RGBA')
+        encoders.webp_save_options(encoding_options, defaults)
 
     elif format == 'tiff':
+        from mapproxy.image.tiff import cog_encoder
+        cog = cog_encoder(img, image_opts, georef=georef)
+        if cog:
+            cog.write(buf)
+            buf.seek(0)
+            return buf
         if georef:
             tags = georef.tiff_tags(img.size)
             defaults['tiffinfo'] = tags
-        if 'tiff_compression' in image_opts.encoding_options:
-            defaults['compression'] = image_opts.encoding_options['tiff_compression']
+        if 'tiff_compression' in encoding_options:
+            defaults['compression'] = encoding_options['tiff_compression']
             if defaults['compression'] == 'jpeg':
-                if 'jpeg_quality' in image_opts.encoding_options:
-                    defaults['quality'] = image_opts.encoding_options['jpeg_quality']
+                if 'jpeg_quality' in encoding_options:
+                    defaults['quality'] = encoding_options['jpeg_quality']
 
     # unsupported transparency tuple can still be in non-RGB img.infos
     # see: https://github.com/python-pillow/Pillow/pull/2633
@@ -374,6 +400,10 @@ def img_to_buf(img, image_opts, georef=None):
     return buf
 
 def quantize(img, colors=256, alpha=False, defaults=None, quantizer=None):
+    if quantizer == 'libimagequant':
+        if not alpha:
+            img = img.convert('RGB')
+        return encoders.quantize_libimagequant(img, colors=colors)
     if hasattr(Image, 'FASTOCTREE') and quantizer in (None, 'fastoctree'):
         if not alpha:
             img = img.convert('RGB')
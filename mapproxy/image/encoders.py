@@ -0,0 +1,161 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Encoder presets and optional encoder/quantizer implementations.
+
+``img_to_buf`` uses the functions of this module to translate
+``encoding_options`` into save options for PIL, or to hand over the
+encoding to an alternative encoder (e.g. libjpeg-turbo via PyTurboJPEG).
+"""
+
+from mapproxy.compat.image import Image, has_libimagequant_support, has_webp_support
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJSAMP_420
+except ImportError:
+    TurboJPEG = None
+
+import logging
+log = logging.getLogger('mapproxy.image')
+
+
+# Presets only set defaults, explicit encoding_options always win.
+encoding_presets = {
+    'speed': {
+        'png_compress_level': 1,
+        'png_compress_strategy': 'rle',
+        'jpeg_optimize': False,
+        'webp_method': 1,
+    },
+    'default': {},
+    'size': {
+        'png_compress_level': 9,
+        'png_compress_strategy': 'default',
+        'jpeg_optimize': True,
+        'webp_method': 6,
+    },
+}
+
+png_compress_strategies = {
+    'default': 'DEFAULT_STRATEGY',
+    'filtered': 'FILTERED',
+    'huffman_only': 'HUFFMAN_ONLY',
+    'rle': 'RLE',
+    'fixed': 'FIXED',
+}
+
+quantizers = ('fastoctree', 'mediancut', 'libimagequant')
+
+jpeg_encoders = ('pil', 'turbojpeg')
+
+
+def resolve_encoding_options(options):
+    """
+    Return `options` with the defaults of the configured ``preset``.
+
+    >>> sorted(resolve_encoding_options({'preset': 'speed', 'png_compress_level': 3}).items())
+    [('jpeg_optimize', False), ('png_compress_level', 3), ('png_compress_strategy', 'rle'), ('webp_method', 1)]
+    >>> resolve_encoding_options({'jpeg_quality': 80})
+    {'jpeg_quality': 80}
+    """
+    if not options or 'preset' not in options:
+        return options
+    result = dict(encoding_presets[options['preset']])
+    result.update(options)
+    del result['preset']
+    return result
+
+
+def png_save_options(options, defaults):
+    """
+    Update PIL save `defaults` with the PNG related `options`.
+    """
+    if 'png_compress_level' in options:
+        defaults['compress_level'] = options['png_compress_level']
+    strategy = options.get('png_compress_strategy')
+    if strategy and hasattr(Image, png_compress_strategies[strategy]):
+        defaults['compress_type'] = getattr(Image, png_compress_strategies[strategy])
+
+
+def jpeg_save_options(options, defaults):
+    """
+    Update PIL save `defaults` with the JPEG related `options`.
+    """
+    if options.get('jpeg_optimize'):
+        defaults['optimize'] = True
+
+
+def webp_save_options(options, defaults):
+    """
+    Update PIL save `defaults` with the WebP related `options`.
+    """
+    if options.get('webp_lossless'):
+        defaults['lossless'] = True
+    if 'webp_quality' in options:
+        defaults['quality'] = options['webp_quality']
+    if 'webp_method' in options:
+        defaults['method'] = options['webp_method']
+
+
+def quantize_libimagequant(img, colors=256):
+    """
+    Quantize `img` with libimagequant (pngquant). Keeps the alpha channel
+    of RGBA images.
+    """
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA')
+    return img.quantize(colors, method=Image.LIBIMAGEQUANT)
+
+
+_turbojpeg = None
+
+def turbojpeg_encoder():
+    global _turbojpeg
+    if _turbojpeg is None:
+        _turbojpeg = TurboJPEG()
+    return _turbojpeg
+
+
+def encode_turbojpeg(img, buf, quality):
+    """
+    Encode `img` as JPEG into `buf` with libjpeg-turbo.
+    Uses the same 4:2:0 chroma subsampling as PIL.
+    """
+    import numpy
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    data = turbojpeg_encoder().encode(numpy.asarray(img), quality=quality,
+        pixel_format=TJPF_RGB, jpeg_subsample=TJSAMP_420)
+    buf.write(data)
+
+
+def check_encoder_support(options):
+    """
+    Check if the optional encoders and quantizers referenced in `options`
+    are available. Returns an error message or ``None``.
+    """
+    if options.get('quantizer') == 'libimagequant' and not has_libimagequant_support():
+        return 'quantizer libimagequant requires Pillow with libimagequant support'
+    if options.get('format') == 'webp' and not has_webp_support():
+        return 'image/webp requires Pillow with WebP support'
+    if options.get('jpeg_encoder') == 'turbojpeg':
+        if TurboJPEG is None:
+            return "jpeg_encoder turbojpeg requires the 'PyTurboJPEG' and 'numpy' packages"
+        try:
+            turbojpeg_encoder()
+        except (OSError, RuntimeError) as ex:
+            return 'jpeg_encoder turbojpeg: unable to load libjpeg-turbo (%s)' % ex
+    return None
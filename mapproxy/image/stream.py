@@ -0,0 +1,224 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Incremental encoding of large images that are rendered in horizontal strips.
+"""
+
+import struct
+import zlib
+
+from mapproxy.compat.image import Image
+from mapproxy.image import ImageSource, tiff
+from mapproxy.image.encoders import resolve_encoding_options
+from mapproxy.image.message import attribution_image
+
+
+def strip_bboxes(bbox, size, strip_height):
+    """
+    Split `bbox` of an image with `size` into horizontal strips, top to
+    bottom. Returns a list with the bbox and size of each strip.
+
+    >>> strip_bboxes((0, 0, 100, 100), (10, 10), 4)
+    [((0, 60.0, 100, 100), (10, 4)), ((0, 20.0, 100, 60.0), (10, 4)), ((0, 0, 100, 20.0), (10, 2))]
+    """
+    res = (bbox[3] - bbox[1]) / float(size[1])
+    strips = []
+    maxy = bbox[3]
+    for top in range(0, size[1], strip_height):
+        height = min(strip_height, size[1] - top)
+        if top + height == size[1]:
+            miny = bbox[1]
+        else:
+            miny = bbox[3] - (top + height) * res
+        strips.append(((bbox[0], miny, bbox[2], maxy), (size[0], height)))
+        maxy = miny
+    return strips
+
+
+class StripAttribution(object):
+    """
+    Attribution of an image with `size` that is rendered in strips.
+
+    The attribution text is placed at the bottom of the image, but the
+    last strip can be only a few pixels high. The text is drawn once for
+    the bottom rows of the image and each strip gets the rows it overlaps.
+    The height of these rows starts with `min_height` and is doubled
+    until the text fits.
+    """
+    def __init__(self, message, size, min_height=512):
+        width, height = size
+        rows = min(height, min_height)
+        while True:
+            img = attribution_image(message, (width, rows)).as_image()
+            bbox = img.getbbox()
+            if rows == height or bbox is None or bbox[1] > 0:
+                break
+            rows = min(height, rows * 2)
+        self.img = img
+        self.top = height - rows
+
+    def strip(self, top, size):
+        """
+        Return the attribution for the strip at row `top` with `size`,
+        or ``None`` if the strip does not overlap the attribution.
+        """
+        if top + size[1] <= self.top:
+            return None
+        img = Image.new('RGBA', size)
+        img.paste(self.img, (0, self.top - top))
+        return ImageSource(img, size=size)
+
+
+def strip_encoder(size, image_opts, georef=None):
+    """
+    Return an encoder for `image_opts.format`, or ``None`` if the
+    format does not support incremental encoding.
+    """
+    if image_opts.colors or image_opts.mode in ('P', 'L'):
+        # strips are encoded as RGB(A), quantization requires the
+        # complete image
+        return None
+    format = image_opts.format.ext.lower()
+    mode = 'RGBA' if image_opts.transparent else 'RGB'
+    encoding_options = resolve_encoding_options(image_opts.encoding_options) or {}
+    if format == 'png':
+        return PNGStripEncoder(size, mode,
+            compress_level=encoding_options.get('png_compress_level', 6))
+    if format in ('tiff', 'geotiff'):
+        if encoding_options.get('tiff_compression', 'raw') != 'raw':
+            return None
+        if encoding_options.get('tiff_cog'):
+            # overviews require the complete image
+            return None
+        return TIFFStripEncoder(size, mode, georef=georef)
+    return None
+
+
+class StripEncoder(object):
+    """
+    Encodes an image strip by strip, top to bottom.
+
+    Call `header` first, then `encode` for each strip and `finish` at
+    the end. All methods return the encoded bytes.
+    """
+    def __init__(self, size, mode):
+        self.size = size
+        self.mode = mode
+
+    def header(self):
+        return b''
+
+    def encode(self, img):
+        raise NotImplementedError()
+
+    def finish(self):
+        return b''
+
+    def content_length(self):
+        """
+        Return the size of the encoded image, if known in advance.
+        """
+        return None
+
+    def _strip_data(self, img):
+        if img.mode != self.mode:
+            img = img.convert(self.mode)
+        assert img.size[0] == self.size[0]
+        return img.tobytes()
+
+
+class PNGStripEncoder(StripEncoder):
+    """
+    Writes non-interlaced 8-bit RGB(A) PNG images with one IDAT
+    chunk for each strip.
+    """
+    def __init__(self, size, mode, compress_level=6):
+        StripEncoder.__init__(self, size, mode)
+        self.compressor = zlib.compressobj(compress_level)
+
+    def _chunk(self, type_, data):
+        return (struct.pack('>I', len(data)) + type_ + data +
+            struct.pack('>I', zlib.crc32(type_ + data) & 0xffffffff))
+
+    def header(self):
+        color_type = 6 if self.mode == 'RGBA' else 2
+        ihdr = struct.pack('>IIBBBBB', self.size[0], self.size[1], 8, color_type, 0, 0, 0)
+        return b'\x89PNG\r\n\x1a\n' + self._chunk(b'IHDR', ihdr)
+
+    def encode(self, img):
+        data = self._strip_data(img)
+        stride = self.size[0] * len(self.mode)
+        # filter type 0 (none) for each row
+        rows = b''.join(
+            b'\x00' + data[start:start + stride]
+            for start in range(0, len(data), stride)
+        )
+        # flush, so that each strip can be sent to the client right away
+        compressed = self.compressor.compress(rows) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        return self._chunk(b'IDAT', compressed)
+
+    def finish(self):
+        return self._chunk(b'IDAT', self.compressor.flush()) + self._chunk(b'IEND', b'')
+
+
+class TIFFStripEncoder(StripEncoder):
+    """
+    Writes uncompressed (Geo)TIFF images. The image file directory with
+    the offsets of all strips is written before the image data, as the
+    size of each strip is known in advance.
+    """
+    rows_per_strip = 64
+
+    def __init__(self, size, mode, georef=None):
+        StripEncoder.__init__(self, size, mode)
+        self.georef = georef
+        self.row_size = size[0] * len(mode)
+
+    def _entries(self, data_offset):
+        num_strips = (self.size[1] + self.rows_per_strip - 1) // self.rows_per_strip
+        offsets = []
+        counts = []
+        for i in range(num_strips):
+            rows = min(self.rows_per_strip, self.size[1] - i * self.rows_per_strip)
+            offsets.append(data_offset + i * self.rows_per_strip * self.row_size)
+            counts.append(rows * self.row_size)
+
+        entries = tiff.image_entries(self.size, self.mode)
+        entries.extend([
+            (tiff.COMPRESSION, tiff.SHORT, (tiff.COMPRESSION_NONE, )),
+            (tiff.ROWSPERSTRIP, tiff.LONG, (self.rows_per_strip, )),
+            (tiff.STRIPOFFSETS, tiff.LONG, tuple(offsets)),
+            (tiff.STRIPBYTECOUNTS, tiff.LONG, tuple(counts)),
+        ])
+        if self.georef:
+            entries.extend(tiff.georef_entries(self.georef, self.size))
+        return entries
+
+    def _ifd_size(self):
+        return tiff.ifd_size(self._entries(0))
+
+    def header(self):
+        data_offset = tiff.HEADER_SIZE + self._ifd_size()
+        return (tiff.tiff_header(tiff.HEADER_SIZE) +
+            tiff.ifd(self._entries(data_offset), tiff.HEADER_SIZE))
+
+    def encode(self, img):
+        # the image data of all strips is contiguous, so strips
+        # of the rendered image and of the TIFF do not need to match
+        return self._strip_data(img)
+
+    def content_length(self):
+        return tiff.HEADER_SIZE + self._ifd_size() + self.row_size * self.size[1]
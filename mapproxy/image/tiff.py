@@ -0,0 +1,278 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Low-level TIFF writing.
+
+PIL can only write complete images. The functions of this module write
+TIFF headers and image file directories (IFD) for images where the
+image data is written separately (e.g. in strips), and tiled
+Cloud Optimized GeoTIFFs with internal overviews.
+"""
+
+import struct
+import zlib
+
+from mapproxy.compat.image import Image
+
+from mapproxy.image import (
+    TIFF_MODELPIXELSCALETAG,
+    TIFF_MODELTIEPOINTTAG,
+    TIFF_GEOKEYDIRECTORYTAG,
+)
+
+SHORT = 3
+LONG = 4
+DOUBLE = 12
+
+_type_formats = {
+    SHORT: 'H',
+    LONG: 'I',
+    DOUBLE: 'd',
+}
+
+NEWSUBFILETYPE = 254
+IMAGEWIDTH = 256
+IMAGELENGTH = 257
+BITSPERSAMPLE = 258
+COMPRESSION = 259
+PHOTOMETRIC = 262
+STRIPOFFSETS = 273
+SAMPLESPERPIXEL = 277
+ROWSPERSTRIP = 278
+STRIPBYTECOUNTS = 279
+PLANARCONFIG = 284
+TILEWIDTH = 322
+TILELENGTH = 323
+TILEOFFSETS = 324
+TILEBYTECOUNTS = 325
+EXTRASAMPLES = 338
+
+SUBFILETYPE_REDUCEDIMAGE = 1
+COMPRESSION_NONE = 1
+COMPRESSION_DEFLATE = 8
+PHOTOMETRIC_MINISBLACK = 1
+PHOTOMETRIC_RGB = 2
+EXTRASAMPLE_UNASSALPHA = 2
+# GeoTIFF code for user-defined coordinate systems
+USER_DEFINED_CRS = 32767
+
+HEADER_SIZE = 8
+
+
+def tiff_header(first_ifd_offset):
+    """
+    Little-endian TIFF header.
+
+    >>> tiff_header(8)
+    b'II*\\x00\\x08\\x00\\x00\\x00'
+    """
+    return b'II' + struct.pack('<HI', 42, first_ifd_offset)
+
+
+def _entry_data(type_, values):
+    return struct.pack('<%d%s' % (len(values), _type_formats[type_]), *values)
+
+
+def ifd_size(entries):
+    """
+    Return the number of bytes of the IFD for `entries`, including all
+    values that do not fit into the entries.
+    """
+    size = 2 + len(entries) * 12 + 4
+    for _, type_, values in entries:
+        data_size = len(values) * struct.calcsize(_type_formats[type_])
+        if data_size > 4:
+            size += data_size + data_size % 2
+    return size
+
+
+def ifd(entries, offset, next_ifd_offset=0):
+    """
+    Return the IFD for `entries` as bytes. The IFD is placed at `offset`
+    and values that do not fit into the entries follow directly after
+    the IFD.
+
+    :param entries: list of ``(tag, type, values)``
+    """
+    entries = sorted(entries)
+    extra_offset = offset + 2 + len(entries) * 12 + 4
+    buf = [struct.pack('<H', len(entries))]
+    extra = []
+    for tag, type_, values in entries:
+        data = _entry_data(type_, values)
+        if len(data) > 4:
+            buf.append(struct.pack('<HHII', tag, type_, len(values), extra_offset))
+            if len(data) % 2:
+                data += b'\x00'
+            extra.append(data)
+            extra_offset += len(data)
+        else:
+            buf.append(struct.pack('<HHI', tag, type_, len(values)) + data.ljust(4, b'\x00'))
+    buf.append(struct.pack('<I', next_ifd_offset))
+    return b''.join(buf + extra)
+
+
+def image_entries(size, mode):
+    """
+    Return the basic IFD entries for an image of `size` and
+    `mode` (L, RGB or RGBA).
+    """
+    bands = len(mode)
+    entries = [
+        (IMAGEWIDTH, LONG, (size[0], )),
+        (IMAGELENGTH, LONG, (size[1], )),
+        (BITSPERSAMPLE, SHORT, (8, ) * bands),
+        (SAMPLESPERPIXEL, SHORT, (bands, )),
+        (PLANARCONFIG, SHORT, (1, )),
+    ]
+    if mode == 'L':
+        entries.append((PHOTOMETRIC, SHORT, (PHOTOMETRIC_MINISBLACK, )))
+    else:
+        entries.append((PHOTOMETRIC, SHORT, (PHOTOMETRIC_RGB, )))
+    if mode == 'RGBA':
+        entries.append((EXTRASAMPLES, SHORT, (EXTRASAMPLE_UNASSALPHA, )))
+    return entries
+
+
+def georef_entries(georef, size):
+    """
+    Return the GeoTIFF IFD entries for a `GeoReference`.
+    """
+    tags = georef.tiff_tags(size)
+    geokeys = list(tags[TIFF_GEOKEYDIRECTORYTAG])
+    if geokeys[-1] == 900913:
+        # does not fit into SHORT, use the official code
+        geokeys[-1] = 3857
+    elif geokeys[-1] > USER_DEFINED_CRS:
+        # codes that do not fit into SHORT (e.g. ESRI:102100) are not
+        # EPSG codes, the CRS is only defined by the tiepoint and scale
+        geokeys[-1] = USER_DEFINED_CRS
+    return [
+        (TIFF_MODELPIXELSCALETAG, DOUBLE, tuple(tags[TIFF_MODELPIXELSCALETAG])),
+        (TIFF_MODELTIEPOINTTAG, DOUBLE, tuple(tags[TIFF_MODELTIEPOINTTAG])),
+        (TIFF_GEOKEYDIRECTORYTAG, SHORT, tuple(geokeys)),
+    ]
+
+
+def cog_encoder(img, image_opts, georef=None):
+    """
+    Return a `CloudOptimizedGeoTIFF` for `img` if `image_opts` enables
+    the ``tiff_cog`` encoding option, otherwise ``None``.
+    """
+    encoding_options = image_opts.encoding_options or {}
+    if not encoding_options.get('tiff_cog'):
+        return None
+    compression = 'raw' if encoding_options.get('tiff_compression') == 'raw' else 'deflate'
+    mode = 'RGBA' if image_opts.transparent else 'RGB'
+    if img.mode == 'L' and not image_opts.transparent:
+        mode = 'L'
+    return CloudOptimizedGeoTIFF(img, georef=georef, mode=mode,
+        tile_size=encoding_options.get('tiff_tile_size', 256),
+        compression=compression)
+
+
+class CloudOptimizedGeoTIFF(object):
+    """
+    Tiled and compressed (Geo)TIFF with internal overviews.
+
+    All IFDs are placed at the beginning of the file, followed by the tiles
+    of the smallest overview up to the tiles of the full resolution image.
+    Clients can read the structure of the file with a single range request.
+
+    Tiles are compressed when the object is created. The encoded file can
+    then be iterated chunk by chunk, without creating the file in memory.
+    """
+    def __init__(self, img, georef=None, mode='RGBA', tile_size=256, compression='deflate'):
+        if img.mode != mode:
+            img = img.convert(mode)
+        self.mode = mode
+        self.georef = georef
+        self.tile_size = tile_size
+        self.compression = compression
+
+        self.levels = []
+        while True:
+            self.levels.append((img.size, self._encode_tiles(img)))
+            if img.size[0] <= tile_size and img.size[1] <= tile_size:
+                break
+            img = img.resize(((img.size[0] + 1) // 2, (img.size[1] + 1) // 2), Image.BOX)
+
+        self._header = self._build_header()
+
+    def _encode_tiles(self, img):
+        tiles = []
+        for y in range(0, img.size[1], self.tile_size):
+            for x in range(0, img.size[0], self.tile_size):
+                # edge tiles are padded to the full tile size
+                tile = img.crop((x, y, x + self.tile_size, y + self.tile_size))
+                data = tile.tobytes()
+                if self.compression == 'deflate':
+                    data = zlib.compress(data, 6)
+                tiles.append(data)
+        return tiles
+
+    def _entries(self, level, offsets):
+        size, tiles = self.levels[level]
+        entries = image_entries(size, self.mode)
+        entries.extend([
+            (COMPRESSION, SHORT, (COMPRESSION_DEFLATE if self.compression == 'deflate' else COMPRESSION_NONE, )),
+            (TILEWIDTH, SHORT, (self.tile_size, )),
+            (TILELENGTH, SHORT, (self.tile_size, )),
+            (TILEOFFSETS, LONG, tuple(offsets)),
+            (TILEBYTECOUNTS, LONG, tuple(len(t) for t in tiles)),
+        ])
+        if level == 0:
+            if self.georef:
+                entries.extend(georef_entries(self.georef, size))
+        else:
+            entries.append((NEWSUBFILETYPE, LONG, (SUBFILETYPE_REDUCEDIMAGE, )))
+        return entries
+
+    def _build_header(self):
+        ifd_offsets = []
+        pos = HEADER_SIZE
+        for level, (_, tiles) in enumerate(self.levels):
+            ifd_offsets.append(pos)
+            pos += ifd_size(self._entries(level, [0] * len(tiles)))
+
+        # tile data of the smallest overview first
+        tile_offsets = [None] * len(self.levels)
+        for level in range(len(self.levels) - 1, -1, -1):
+            offsets = []
+            for tile in self.levels[level][1]:
+                offsets.append(pos)
+                pos += len(tile)
+            tile_offsets[level] = offsets
+        self.size = pos
+
+        buf = [tiff_header(HEADER_SIZE)]
+        for level in range(len(self.levels)):
+            next_ifd = ifd_offsets[level + 1] if level + 1 < len(self.levels) else 0
+            buf.append(ifd(self._entries(level, tile_offsets[level]), ifd_offsets[level], next_ifd))
+        return b''.join(buf)
+
+    def __iter__(self):
+        yield self._header
+        for _, tiles in reversed(self.levels):
+            for tile in tiles:
+                yield tile
+
+    def content_length(self):
+        return self.size
+
+    def write(self, out):
+        for chunk in self:
+            out.write(chunk)
@@ -14,6 +14,7 @@
 # limitations under the License.
 
 import os
+from mapproxy.compat.image import Image
 from mapproxy.image import ImageSource
 from mapproxy.image.transform import ImageTransformer
 from mapproxy.image.opts import create_image
@@ -21,18 +22,45 @@ from mapproxy.image.opts import create_image
 import logging
 log = logging.getLogger(__name__)
 
+DECODE_SCALES = (8, 4, 2)
+
+def decode_scale(res_factor, tile_size):
+    """
+    Return the largest factor (1, 2, 4 or 8) tiles can be reduced with,
+    without loosing resolution for an output image that is `res_factor`
+    times coarser than the tiles.
+
+    >>> decode_scale(2.5, (256, 256))
+    2
+    >>> decode_scale(9.0, (256, 256))
+    8
+    >>> decode_scale(1.9, (256, 256))
+    1
+    >>> decode_scale(4.1, (256, 250))
+    2
+    """
+    for scale in DECODE_SCALES:
+        if (res_factor >= scale and tile_size[0] % scale == 0
+            and tile_size[1] % scale == 0):
+            return scale
+    return 1
+
 class TileMerger(object):
     """
     Merge multiple tiles into one image.
     """
-    def __init__(self, tile_grid, tile_size):
+    def __init__(self, tile_grid, tile_size, decode_scale=1):
         """
         :param tile_grid: the grid size
         :type tile_grid: ``(int(x_tiles), int(y_tiles))``
         :param tile_size: the size of each tile
+        :param decode_scale: reduce each tile by this factor before merging.
+            JPEG tiles are directly decoded at the reduced size.
         """
         self.tile_grid = tile_grid
-        self.tile_size = tile_size
+        self.src_tile_size = tile_size
+        self.decode_scale = decode_scale
+        self.tile_size = (tile_size[0] // decode_scale, tile_size[1] // decode_scale)
 
     def merge(self, ordered_tiles, image_opts):
         """
@@ -41,7 +69,7 @@ class TileMerger(object):
         :param ordered_tiles: list of tiles, sorted row-wise (top to bottom)
         :rtype: `ImageSource`
         """
-        if self.tile_grid == (1, 1):
+        if self.tile_grid == (1, 1) and self.decode_scale == 1:
             assert len(ordered_tiles) == 1
             if ordered_tiles[0] is not None:
                 tile = ordered_tiles.pop()
@@ -61,6 +89,8 @@ class TileMerger(object):
                 tile = source.as_image()
                 pos = self._tile_offset(i)
                 tile.draft(image_opts.mode, self.tile_size)
+                if tile.size != self.tile_size:
+                    tile = self._reduce(tile)
                 result.paste(tile, pos)
                 source.close_buffers()
             except IOError as e:
@@ -74,6 +104,18 @@ class TileMerger(object):
                     raise
         return ImageSource(result, size=src_size, image_opts=image_opts, cacheable=cacheable)
 
+    def _reduce(self, tile):
+        """
+        Reduce tiles that were not decoded at the reduced size (e.g. PNG).
+        """
+        if tile.mode == 'P':
+            tile = tile.convert('RGBA')
+        if hasattr(tile, 'reduce'):
+            factor = (tile.size[0] // self.tile_size[0], tile.size[1] // self.tile_size[1])
+            if tile.size == (factor[0] * self.tile_size[0], factor[1] * self.tile_size[1]):
+                return tile.reduce(factor)
+        return tile.resize(self.tile_size, Image.BILINEAR)
+
     def _src_size(self):
         width = self.tile_grid[0]*self.tile_size[0]
         height = self.tile_grid[1]*self.tile_size[1]
@@ -127,7 +169,7 @@ class TiledImage(object):
     """
     An image built-up from multiple tiles.
     """
-    def __init__(self, tiles, tile_grid, tile_size, src_bbox, src_srs):
+    def __init__(self, tiles, tile_grid, tile_size, src_bbox, src_srs, decode_scale=1):
         """
         :param tiles: all tiles (sorted row-wise, top to bottom)
         :param tile_grid: the tile grid size
@@ -136,12 +178,14 @@ class TiledImage(object):
         :param src_bbox: the bbox of all tiles
         :param src_srs: the srs of the bbox
         :param transparent: if the sources are transparent
+        :param decode_scale: build the image from tiles reduced by this factor
         """
         self.tiles = tiles
         self.tile_grid = tile_grid
         self.tile_size = tile_size
         self.src_bbox = src_bbox
         self.src_srs = src_srs
+        self.decode_scale = decode_scale
 
     def image(self, image_opts):
         """
@@ -149,7 +193,7 @@ class TiledImage(object):
 
         :rtype: `ImageSource`
         """
-        tm = TileMerger(self.tile_grid, self.tile_size)
+        tm = TileMerger(self.tile_grid, self.tile_size, decode_scale=self.decode_scale)
         return tm.merge(self.tiles, image_opts=image_opts)
 
     def transform(self, req_bbox, req_srs, out_size, image_opts):
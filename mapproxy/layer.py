@@ -19,10 +19,10 @@ Layers that can get maps/infos from different sources/caches.
 """
 
 from __future__ import division
-from mapproxy.grid import NoTiles, GridError, merge_resolution_range, bbox_intersects, bbox_contains
+from mapproxy.grid import NoTiles, GridError, merge_resolution_range, bbox_intersects, bbox_contains, get_resolution
 from mapproxy.image import SubImageSource, bbox_position_in_image
 from mapproxy.image.opts import ImageOptions
-from mapproxy.image.tile import TiledImage
+from mapproxy.image.tile import TiledImage, decode_scale
 from mapproxy.srs import SRS, bbox_equals, merge_bbox, make_lin_transf, SupportedSRS
 from mapproxy.proj import ProjError
 from mapproxy.compat import iteritems
@@ -113,9 +113,12 @@ class InfoLayer(object):
 class MapQuery(object):
     """
     Internal query for a map with a specific extent, size, srs, etc.
+
+    :param deadline: time (``time.time()``) when the query should be
+        finished, or ``None``
     """
     def __init__(self, bbox, size, srs, format='image/png', transparent=False,
-                 tiled_only=False, dimensions=None):
+                 tiled_only=False, dimensions=None, deadline=None):
         self.bbox = bbox
         self.size = size
         self.srs = srs
@@ -123,6 +126,7 @@ class MapQuery(object):
         self.transparent = transparent
         self.tiled_only = tiled_only
         self.dimensions = dimensions or {}
+        self.deadline = deadline
 
     def dimensions_for_params(self, params):
         """
@@ -379,7 +383,7 @@ class CacheMapLayer(MapLayer):
     supports_meta_tiles = True
 
     def __init__(self, tile_manager, extent=None, image_opts=None,
-        max_tile_limit=None):
+        max_tile_limit=None, max_tile_limit_res_factor=None):
         MapLayer.__init__(self, image_opts=image_opts)
         self.tile_manager = tile_manager
         self.grid = tile_manager.grid
@@ -388,6 +392,7 @@ class CacheMapLayer(MapLayer):
         if not self.tile_manager.rescale_tiles:
             self.res_range = merge_layer_res_ranges(self.tile_manager.sources)
         self.max_tile_limit = max_tile_limit
+        self.max_tile_limit_res_factor = max_tile_limit_res_factor
 
     def get_map(self, query):
         self.check_res_range(query)
@@ -402,7 +407,7 @@ class CacheMapLayer(MapLayer):
             size, offset, bbox = bbox_position_in_image(query.bbox, query.size, self.extent.bbox_for(query.srs))
             if size[0] == 0 or size[1] == 0:
                 raise BlankImage()
-            src_query = MapQuery(bbox, size, query.srs, query.format)
+            src_query = MapQuery(bbox, size, query.srs, query.format, deadline=query.deadline)
             resp = self._image(src_query)
             result = SubImageSource(resp, size=query.size, offset=offset, image_opts=self.image_opts,
                 cacheable=resp.cacheable)
@@ -410,6 +415,52 @@ class CacheMapLayer(MapLayer):
             result = self._image(query)
         return result
 
+    def _coarser_level_tiles(self, bbox, size, level):
+        """
+        Return the affected tiles of the first level above `level` that
+        requires less than `max_tile_limit` tiles. The resolution of this
+        level is at most `max_tile_limit_res_factor` times coarser than the
+        requested resolution.
+        """
+        max_res = get_resolution(bbox, size) * self.max_tile_limit_res_factor
+        for coarser_level in range(level - 1, -1, -1):
+            if self.grid.resolution(coarser_level) > max_res:
+                break
+            src_bbox, tile_grid, affected_tile_coords = \
+                self.grid.get_affected_level_tiles(bbox, coarser_level)
+            num_tiles = tile_grid[0] * tile_grid[1]
+            if num_tiles < self.max_tile_limit:
+                log.debug('too many tiles for level %d, using level %d with %d tiles',
+                    level, coarser_level, num_tiles)
+                return src_bbox, tile_grid, affected_tile_coords
+
+        raise MapBBOXError("too many tiles, max_tile_limit: %s, no level within max_tile_limit_res_factor: %s" %
+            (self.max_tile_limit, self.max_tile_limit_res_factor))
+
+    def _decode_scale(self, query, src_bbox, tile_grid):
+        """
+        Return the factor the tiles can be reduced with while loading.
+        Tiles are only reduced if the query is at least twice as coarse as
+        the tiles and if the resampling is not `nearest`.
+        """
+        if self.tile_manager.image_opts.resampling in (None, 'nearest'):
+            return 1
+
+        bbox = query.bbox
+        if query.srs != self.grid.srs:
+            try:
+                bbox = query.srs.transform_bbox_to(self.grid.srs, bbox)
+            except ProjError:
+                return 1
+
+        tile_size = self.grid.tile_size
+        src_res = ((src_bbox[2] - src_bbox[0]) / (tile_grid[0] * tile_size[0]),
+                   (src_bbox[3] - src_bbox[1]) / (tile_grid[1] * tile_size[1]))
+        dst_res = ((bbox[2] - bbox[0]) / query.size[0],
+                   (bbox[3] - bbox[1]) / query.size[1])
+        res_factor = min(dst_res[0] / src_res[0], dst_res[1] / src_res[1])
+        return decode_scale(res_factor, tile_size)
+
     def _check_tiled(self, query):
         if query.format != self.tile_manager.format:
             raise MapError("invalid tile format, use %s" % self.tile_manager.format)
@@ -418,19 +469,24 @@ class CacheMapLayer(MapLayer):
 
     def _image(self, query):
         try:
+            query_bbox, level = self.grid.get_affected_bbox_and_level(
+                query.bbox, query.size, req_srs=query.srs)
             src_bbox, tile_grid, affected_tile_coords = \
-                self.grid.get_affected_tiles(query.bbox, query.size,
-                                             req_srs=query.srs)
+                self.grid.get_affected_level_tiles(query_bbox, level)
+
+            num_tiles = tile_grid[0] * tile_grid[1]
+
+            if self.max_tile_limit and num_tiles >= self.max_tile_limit:
+                if not self.max_tile_limit_res_factor or query.tiled_only:
+                    raise MapBBOXError("too many tiles, max_tile_limit: %s, num_tiles: %s" % (self.max_tile_limit, num_tiles))
+                src_bbox, tile_grid, affected_tile_coords = \
+                    self._coarser_level_tiles(query_bbox, query.size, level)
+                num_tiles = tile_grid[0] * tile_grid[1]
         except NoTiles:
             raise BlankImage()
         except GridError as ex:
             raise MapBBOXError(ex.args[0])
 
-        num_tiles = tile_grid[0] * tile_grid[1]
-
-        if self.max_tile_limit and num_tiles >= self.max_tile_limit:
-            raise MapBBOXError("too many tiles, max_tile_limit: %s, num_tiles: %s" % (self.max_tile_limit, num_tiles))
-
         if query.tiled_only:
             if num_tiles > 1:
                 raise MapBBOXError("not a single tile")
@@ -440,7 +496,8 @@ class CacheMapLayer(MapLayer):
                 raise MapBBOXError("query does not align to tile boundaries")
 
         with self.tile_manager.session():
-            tile_collection = self.tile_manager.load_tile_coords(affected_tile_coords, with_metadata=query.tiled_only)
+            tile_collection = self.tile_manager.load_tile_coords(affected_tile_coords,
+                with_metadata=query.tiled_only, deadline=query.deadline)
 
         if tile_collection.empty:
             raise BlankImage()
@@ -453,7 +510,8 @@ class CacheMapLayer(MapLayer):
 
         tile_sources = [tile.source for tile in tile_collection]
         tiled_image = TiledImage(tile_sources, src_bbox=src_bbox, src_srs=self.grid.srs,
-                          tile_grid=tile_grid, tile_size=self.grid.tile_size)
+                          tile_grid=tile_grid, tile_size=self.grid.tile_size,
+                          decode_scale=self._decode_scale(query, src_bbox, tile_grid))
         try:
             return tiled_image.transform(query.bbox, query.srs, query.size,
                 self.tile_manager.image_opts)
@@ -41,21 +41,23 @@ class TileRequest(object):
     origin = None
     dimensions = {}
 
-    def __init__(self, request):
+    def __init__(self, request, match=None):
         self.tile = None
         self.format = None
         self.http = request
-        self._init_request()
+        self._init_request(match)
         self.origin = self.http.args.get('origin')
         if self.origin not in ('sw', 'nw', None):
             self.origin = None
 
-    def _init_request(self):
+    def _init_request(self, match=None):
         """
         Initialize tile request. Sets ``tile`` and ``layer``.
+        :param match: `tile_req_re` match of the path, if already matched
         :raise RequestError: if the format is not ``/layer/z/x/y.format``
         """
-        match = self.tile_req_re.search(self.http.path)
+        if match is None:
+            match = self.tile_req_re.search(self.http.path)
         if not match or match.group('begin') != self.req_prefix:
             raise RequestError('invalid request (%s)' % (self.http.path), request=self)
 
@@ -85,13 +87,18 @@ class TMSRequest(TileRequest):
         (/(?P<layer_spec>[^/]+))?
         $''', re.VERBOSE)
     root_request_re = re.compile(r'/tms/?$')
+    # matches complete tile request paths only, never capabilities requests
+    tile_only_req_re = re.compile(TileRequest.tile_req_re.pattern + '$', re.VERBOSE)
     use_profiles = True
     origin = 'sw'
 
-    def __init__(self, request):
+    def __init__(self, request, match=None):
         self.tile = None
         self.format = None
         self.http = request
+        if match is not None:
+            self._init_request(match)
+            return
         cap_match = self.capabilities_re.match(request.path)
         root_match = self.root_request_re.match(request.path)
         if cap_match:
@@ -110,9 +117,103 @@ class TMSRequest(TileRequest):
     def exception_handler(self):
         return TMSExceptionHandler()
 
+class TileBatchRequest(TileRequest):
+    """
+    Class for requests of multiple tiles of one level.
+
+    ``/tiles/layer/z/batch.format?tiles=x,y,x,y,...`` requests the listed
+    tiles, ``?range=minx,miny,maxx,maxy`` requests all tiles of the
+    (inclusive) tile range.
+    """
+    request_handler_name = 'batch'
+    batch_req_re = re.compile(r'''^(?P<begin>/[^/]+)/
+            ((?P<version>1\.0\.0)/)?
+            (?P<layer>[^/]+)/
+            ((?P<layer_spec>[^/]+)/)?
+            (?P<z>-?\d+)/
+            batch\.(?P<format>\w+)$''', re.VERBOSE)
+    max_tiles = 256
+
+    def __init__(self, request):
+        self.tile = None
+        self.format = None
+        self.http = request
+        self._init_request()
+        self.origin = self.http.args.get('origin')
+        if self.origin not in ('sw', 'nw', None):
+            self.origin = None
+
+    def _init_request(self):
+        """
+        Initialize batch request. Sets ``tiles`` and ``layer``.
+        :raise RequestError: for invalid paths or tile lists
+        """
+        match = self.batch_req_re.search(self.http.path)
+        if not match or match.group('begin') != self.req_prefix:
+            raise RequestError('invalid request (%s)' % (self.http.path), request=self)
+
+        self.layer = match.group('layer')
+        self.dimensions = {}
+        if match.group('layer_spec') is not None:
+            self.dimensions['_layer_spec'] = match.group('layer_spec')
+        self.format = match.group('format')
+        z = int(match.group('z'))
+        self.tiles = [(x, y, z) for x, y in self._tile_xys()]
+        if not self.tiles:
+            raise RequestError('missing tiles or range parameter', request=self)
+        if len(self.tiles) > self.max_tiles:
+            raise RequestError('too many tiles requested (max %d)' % self.max_tiles,
+                request=self)
+
+    def _tile_xys(self):
+        args = self.http.args
+        try:
+            if 'range' in args:
+                minx, miny, maxx, maxy = [int(v) for v in args['range'].split(',')]
+                if (maxx - minx + 1) * (maxy - miny + 1) > self.max_tiles:
+                    raise RequestError('too many tiles requested (max %d)' % self.max_tiles,
+                        request=self)
+                return [(x, y) for y in range(miny, maxy + 1) for x in range(minx, maxx + 1)]
+            values = [int(v) for v in args.get('tiles', '').split(',') if v]
+        except ValueError:
+            raise RequestError('invalid tiles or range parameter', request=self)
+        if len(values) % 2:
+            raise RequestError('invalid tiles parameter, expected x,y pairs', request=self)
+        xys = []
+        seen = set()
+        for xy in zip(values[::2], values[1::2]):
+            if xy not in seen:
+                seen.add(xy)
+                xys.append(xy)
+        return xys
+
+
+class TMSBatchRequest(TileBatchRequest):
+    """
+    Class for batch requests of the TMS 1.0.0 service.
+    """
+    req_prefix = '/tms'
+    use_profiles = True
+
+    def __init__(self, request):
+        TileBatchRequest.__init__(self, request)
+        self.origin = 'sw'
+
+    @property
+    def exception_handler(self):
+        return TMSExceptionHandler()
+
+
 def tile_request(req):
-    if req.path.startswith('/tms'):
-        return TMSRequest(req)
+    path = req.path
+    if '/batch.' in path:
+        if path.startswith('/tms'):
+            return TMSBatchRequest(req)
+        return TileBatchRequest(req)
+    if path.startswith('/tms'):
+        # tile requests are the most frequent requests, check them
+        # before the capabilities requests
+        return TMSRequest(req, TMSRequest.tile_only_req_re.match(path))
     else:
         return TileRequest(req)
 
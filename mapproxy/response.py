@@ -18,6 +18,7 @@ Service responses.
 """
 
 import hashlib
+import os
 from mapproxy.util.times import format_httpdate, parse_httpdate, timestamp
 from mapproxy.compat import PY2, text_type, iteritems
 
@@ -183,6 +184,50 @@ class Response(object):
             yield chunk
 
 
+class SendfileOffload(object):
+    """
+    Let the web server send cached files (X-Sendfile or X-Accel-Redirect).
+
+    Files within `base_dir` are referenced by the path relative to
+    `base_dir`, appended to `prefix`. Without `prefix`, the absolute path
+    is used (X-Sendfile).
+
+    >>> s = SendfileOffload('X-Accel-Redirect', base_dir='/data/cache', prefix='/cache/')
+    >>> s.location('/data/cache/osm/01/000/000/001.png')
+    '/cache/osm/01/000/000/001.png'
+    >>> s.location('/tmp/001.png') is None
+    True
+    >>> SendfileOffload('X-Sendfile').location('/tmp/001.png')
+    '/tmp/001.png'
+    """
+    def __init__(self, header='X-Sendfile', base_dir=None, prefix=None):
+        self.header = header
+        self.base_dir = os.path.abspath(base_dir) if base_dir else None
+        self.prefix = prefix
+
+    def location(self, filename):
+        filename = os.path.abspath(filename)
+        if self.base_dir:
+            if not filename.startswith(self.base_dir + os.sep):
+                return None
+            filename = filename[len(self.base_dir) + 1:]
+        if self.prefix is None:
+            return filename
+        return self.prefix.rstrip('/') + '/' + filename.replace(os.sep, '/')
+
+    def response(self, filename, content_type=None):
+        """
+        Return an empty `Response` with the sendfile header for `filename`,
+        or ``None`` if the file is not located within `base_dir`.
+        """
+        location = self.location(filename)
+        if location is None:
+            return None
+        resp = Response(b'', content_type=content_type)
+        resp.headers[self.header] = location
+        return resp
+
+
 # http://www.faqs.org/rfcs/rfc2616.html
 _status_codes = {
     100: 'Continue',
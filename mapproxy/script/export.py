@@ -24,14 +24,17 @@ import optparse
 import yaml
 
 from mapproxy.srs import SRS
+from mapproxy.image import GeoReference
+from mapproxy.image.tile import TiledImage
+from mapproxy.image.tiff import CloudOptimizedGeoTIFF
 from mapproxy.config.coverage import load_coverage
 from mapproxy.config.loader import (
     load_configuration, ConfigurationError,
     CacheConfiguration, GridConfiguration,
 )
 from mapproxy.util.coverage import  BBOXCoverage
-from mapproxy.seed.util import ProgressLog, format_bbox
-from mapproxy.seed.seeder import SeedTask, seed_task
+from mapproxy.seed.util import ProgressLog, ProgressStore, format_bbox
+from mapproxy.seed.seeder import SeedTask, SeedProgress, seed_task
 from mapproxy.config import spec as conf_spec
 from mapproxy.util.ext.dictspec.validator import validate, ValidationError
 
@@ -92,6 +95,51 @@ def format_export_task(task, custom_grid):
 
     return '\n'.join(info)
 
+#: maximum number of pixels of COG exports, the image is merged in memory
+MAX_COG_PIXELS = 10000 * 10000
+
+def export_cog(mgr, level, coverage, dest, dry_run=False, max_pixels=MAX_COG_PIXELS):
+    """
+    Merge all tiles of `level` within `coverage` and write them
+    as a single Cloud Optimized GeoTIFF to `dest`.
+
+    The complete image is merged in memory. Exits with an error if
+    it is larger than `max_pixels`.
+    """
+    grid = mgr.grid
+    bbox, tile_grid, tile_coords = grid.get_affected_level_tiles(
+        coverage.extent.bbox_for(grid.srs), level)
+    size = tile_grid[0] * grid.tile_size[0], tile_grid[1] * grid.tile_size[1]
+
+    print('========== COG export ==========')
+    print('  Level:  %d (%d x %d tiles)' % (level, tile_grid[0], tile_grid[1]))
+    print('  Size:   %d x %d px' % size)
+    print('  BBOX:   %s (%s)' % (format_bbox(bbox), grid.srs.srs_code))
+    if size[0] * size[1] > max_pixels:
+        print('ERROR: COG export is limited to %d pixels, select a lower level '
+            'or limit the export with --coverage' % max_pixels, file=sys.stderr)
+        sys.exit(2)
+    if dry_run:
+        return
+
+    with mgr.session():
+        tiles = mgr.load_tile_coords(list(tile_coords))
+
+    image_opts = mgr.image_opts
+    img = TiledImage([t.source for t in tiles], tile_grid, grid.tile_size,
+        bbox, grid.srs).image(image_opts).as_image()
+
+    tile_size = 256
+    if grid.tile_size[0] == grid.tile_size[1] and grid.tile_size[0] % 16 == 0:
+        # full resolution tiles of the COG match the tiles of the grid
+        tile_size = grid.tile_size[0]
+
+    cog = CloudOptimizedGeoTIFF(img, georef=GeoReference(bbox, grid.srs),
+        mode='RGBA' if image_opts.transparent else 'RGB', tile_size=tile_size)
+    with open(dest, 'wb') as f:
+        cog.write(f)
+
+
 def export_command(args=None):
     parser = optparse.OptionParser("%prog export [options] mapproxy_conf")
     parser.add_option("-f", "--mapproxy-conf", dest="mapproxy_conf",
@@ -141,6 +189,13 @@ def export_command(args=None):
     parser.add_option("--where",
         help="filter for OGR coverages")
 
+    parser.add_option("--continue", dest='continue_export',
+        action="store_true", default=False,
+        help="continue an aborted export")
+    parser.add_option("--progress-file", dest='progress_file',
+        default=None,
+        help="filename for storing the export progress (for --continue option)")
+
     from mapproxy.script.util import setup_logging
     import logging
     setup_logging(logging.WARN)
@@ -193,7 +248,7 @@ def export_command(args=None):
     else:
         custom_grid = False
 
-    if os.path.exists(options.dest) and not options.force:
+    if os.path.exists(options.dest) and not (options.force or options.continue_export):
         print('ERROR: destination exists, remove first or use --force', file=sys.stderr)
         sys.exit(2)
 
@@ -241,6 +296,9 @@ def export_command(args=None):
             'directory_layout': 'arcgis',
             'directory': options.dest,
         }
+    elif options.type == 'cog':
+        # tiles are only merged into the COG
+        cache_conf['disable_storage'] = True
     elif options.type in ('tms', None): # default
         cache_conf['cache'] = {
             'type': 'file',
@@ -278,16 +336,38 @@ def export_command(args=None):
     if not supports_tiled_access(mgr):
         print('WARN: grids are incompatible. needs to scale/reproject tiles for export.', file=sys.stderr)
 
+    if options.type == 'cog':
+        if len(levels) != 1:
+            print('ERROR: --type cog requires a single level', file=sys.stderr)
+            sys.exit(2)
+        export_cog(mgr, levels[0], seed_coverage, options.dest, dry_run=options.dry_run)
+        return
+
     md = dict(name='export', cache_name='cache', grid_name=options.grid, dest=options.dest)
     task = SeedTask(md, mgr, levels, 1, seed_coverage)
 
     print(format_export_task(task, custom_grid=custom_grid))
 
-    logger = ProgressLog(verbose=options.quiet==0, silent=options.quiet>=2)
+    progress = None
+    if options.continue_export or options.progress_file:
+        if not options.progress_file:
+            options.progress_file = '.mapproxy_export_progress'
+        progress = ProgressStore(options.progress_file,
+            continue_seed=options.continue_export)
+
+    logger = ProgressLog(verbose=options.quiet==0, silent=options.quiet>=2,
+        progress_store=progress)
+    seed_progress = None
+    if progress:
+        logger.current_task_id = task.id
+        seed_progress = SeedProgress(old_progress_identifier=progress.get(task.id))
     try:
         seed_task(task, progress_logger=logger, dry_run=options.dry_run,
-             concurrency=options.concurrency)
+             concurrency=options.concurrency, seed_progress=seed_progress)
     except KeyboardInterrupt:
         print('stopping...', file=sys.stderr)
         sys.exit(2)
 
+    if progress:
+        progress.remove()
+
@@ -143,6 +143,57 @@ def serve_multiapp_develop_command(args):
         threaded=True, passthrough_errors=True)
 
 
+def serve_production_command(args):
+    parser = optparse.OptionParser("usage: %prog serve-production [options] mapproxy.yaml")
+    parser.add_option("-b", "--bind",
+                      dest="address", default='127.0.0.1:8080',
+                      help="Server socket [127.0.0.1:8080]. Use 0.0.0.0 for external access. :1234 to change port.")
+    parser.add_option("-w", "--workers", type="int",
+                      dest="workers", default=None,
+                      help="Number of worker processes [number of CPUs].")
+    parser.add_option("-t", "--threads", type="int",
+                      dest="threads", default=8,
+                      help="Number of threads for each worker [8].")
+    parser.add_option("--max-requests", type="int",
+                      dest="max_requests", default=None,
+                      help="Restart workers after this number of requests.")
+    options, args = parser.parse_args(args)
+
+    if len(args) != 2:
+        parser.print_help()
+        print("\nERROR: MapProxy configuration required.")
+        sys.exit(1)
+
+    if not hasattr(os, 'fork'):
+        print("ERROR: serve-production requires a system with fork (e.g. Linux).")
+        sys.exit(1)
+
+    mapproxy_conf = args[1]
+    host, port = parse_bind_address(options.address)
+
+    workers = options.workers
+    if not workers:
+        import multiprocessing
+        workers = multiprocessing.cpu_count()
+
+    setup_logging()
+    from mapproxy.wsgiapp import make_wsgi_app
+    from mapproxy.config.loader import ConfigurationError
+    from mapproxy.util.prefork import PreforkServer
+
+    def make_app():
+        # configuration, grids and SRS are loaded in the master
+        # and shared with all workers
+        return make_wsgi_app(mapproxy_conf)
+
+    server = PreforkServer(host, port, make_app, workers=workers,
+        threads=options.threads, max_requests=options.max_requests)
+    try:
+        server.serve_forever()
+    except ConfigurationError:
+        sys.exit(2)
+
+
 def parse_bind_address(address, default=('localhost', 8080)):
     """
     >>> parse_bind_address('80')
@@ -286,6 +337,10 @@ commands = {
         'func': serve_develop_command,
         'help': 'Run MapProxy development server.'
     },
+    'serve-production': {
+        'func': serve_production_command,
+        'help': 'Run MapProxy with multiple processes and threads.'
+    },
     'serve-multiapp-develop': {
         'func': serve_multiapp_develop_command,
         'help': 'Run MultiMapProxy development server.'
@@ -34,6 +34,8 @@ from mapproxy.util.geom import GeometryError, EmptyGeometryError, CoverageReadEr
 from mapproxy.util.yaml import load_yaml_file, YAMLError
 from mapproxy.seed.util import bidict
 from mapproxy.seed.seeder import SeedTask, CleanupTask
+from mapproxy.seed.priority import SeedPriority, load_heatmap
+from mapproxy.seed.expire import load_expired_tiles
 from mapproxy.seed.spec import validate_seed_conf
 
 class SeedConfigurationError(ConfigurationError):
@@ -285,6 +287,51 @@ class SeedConfiguration(ConfigurationBase):
         if 'refresh_before' in self.conf:
             self.refresh_timestamp = before_timestamp_from_options(self.conf['refresh_before'])
 
+        self.seed_from = self.conf.get('seed_from', 'sources')
+        if self.seed_from not in ('sources', 'cached_level'):
+            raise SeedConfigurationError("%s: unknown seed_from '%s', use 'sources' or 'cached_level'"
+                % (self.name, self.seed_from))
+
+        self.expired_tiles = None
+        if self.conf.get('expire_tiles'):
+            expire_dir = abspath(self.conf['expire_tiles'])
+            if not os.path.exists(expire_dir):
+                raise SeedConfigurationError("%s: expire_tiles '%s' not found"
+                    % (self.name, expire_dir))
+            self.expired_tiles = load_expired_tiles(expire_dir)
+            if self.refresh_timestamp is None:
+                # recreate all expired tiles that were created before
+                # the expire files
+                self.refresh_timestamp = self.expired_tiles.timestamp
+
+        self.heatmap = None
+        priorities_conf = self.conf.get('priorities') or {}
+        if priorities_conf.get('heatmap'):
+            try:
+                self.heatmap = load_heatmap(abspath(priorities_conf['heatmap']))
+            except (IOError, ValueError) as ex:
+                raise SeedConfigurationError('%s: unable to load heatmap: %s' % (self.name, ex))
+        self.priority_regions = []
+        for coverage_name, weight in iteritems(priorities_conf.get('coverages') or {}):
+            try:
+                self.priority_regions.append((self.seeding_conf.coverage(coverage_name), weight))
+            except EmptyCoverageError:
+                continue
+
+    def priority(self, grid):
+        """
+        Return the `SeedPriority` for `grid`, or ``None`` if no priorities
+        are configured.
+        """
+        if self.heatmap is None and not self.priority_regions:
+            return None
+        try:
+            regions = [(coverage.transform_to(grid.srs), weight)
+                for coverage, weight in self.priority_regions]
+        except TransformationError:
+            raise SeedConfigurationError('%s: priority coverage transformation error' % self.name)
+        return SeedPriority(grid, heatmap=self.heatmap, regions=regions)
+
     def seed_tasks(self):
         for grid_name in self.grids:
             for cache_name, cache in iteritems(self.caches):
@@ -314,14 +361,23 @@ class SeedConfiguration(ConfigurationBase):
                         self.refresh_timestamp = 0
 
                 md = dict(name=self.name, cache_name=cache_name, grid_name=grid_name)
-
-                if tile_manager.rescale_tiles:
+                priority = self.priority(grid)
+
+                if self.seed_from == 'cached_level':
+                    # each level is created from the level below
+                    for l in sorted(levels, reverse=True):
+                        yield SeedTask(md, tile_manager, [l], self.refresh_timestamp, coverage,
+                            seed_from=self.seed_from, priority=priority,
+                            expired_tiles=self.expired_tiles)
+                elif tile_manager.rescale_tiles:
                     if tile_manager.rescale_tiles > 0:
                         levels = levels[::-1]
                     for l in levels:
-                        yield SeedTask(md, tile_manager, [l], self.refresh_timestamp, coverage)
+                        yield SeedTask(md, tile_manager, [l], self.refresh_timestamp, coverage,
+                            priority=priority, expired_tiles=self.expired_tiles)
                 else:
-                    yield SeedTask(md, tile_manager, levels, self.refresh_timestamp, coverage)
+                    yield SeedTask(md, tile_manager, levels, self.refresh_timestamp, coverage,
+                        priority=priority, expired_tiles=self.expired_tiles)
 
 class CleanupConfiguration(ConfigurationBase):
     def __init__(self, name, conf, seeding_conf):
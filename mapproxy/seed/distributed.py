@@ -0,0 +1,518 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Distributed seeding with a shared work queue.
+
+The coordinator partitions all seed tasks into ranges of meta tiles and
+adds them to the queue. Workers on any node claim a range with a lease,
+seed it and mark it as done. Leases are renewed while a range is seeded.
+Ranges of failed workers are claimed again after their lease expired.
+"""
+
+from __future__ import print_function, division
+
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+from mapproxy.seed.plan import meta_tile_range
+from mapproxy.seed.journal import task_meta_grid
+from mapproxy.seed.seeder import SeedTask, SeedInterrupted, seed_task, NONE
+from mapproxy.util.py import reraise
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class WorkRange(object):
+    """
+    Range of meta tiles of one level of a seed task.
+
+    :param task: key of the seed task (see `task_key`)
+    :param bbox: bbox of all meta tiles of the range
+    :param order: ranges are claimed in this order
+    """
+    def __init__(self, task, level, bbox, order=0, id=None):
+        self.task = task
+        self.level = level
+        self.bbox = bbox
+        self.order = order
+        self.id = id
+
+    def to_json(self):
+        return json.dumps({
+            'task': self.task, 'level': self.level, 'bbox': list(self.bbox),
+            'order': self.order,
+        })
+
+    @classmethod
+    def from_json(cls, data, id=None):
+        d = json.loads(data)
+        return cls(d['task'], d['level'], tuple(d['bbox']), order=d['order'], id=id)
+
+    def __repr__(self):
+        return 'WorkRange(%r, %r, %r)' % (self.task, self.level, self.bbox)
+
+
+def task_key(task):
+    """
+    Return a string that identifies `task` on all nodes.
+    """
+    name, cache_name, grid_name, levels = task.id
+    return json.dumps([name, cache_name, grid_name, list(levels)])
+
+
+def hilbert_index(order, x, y):
+    """
+    Return the position of `x`, `y` on a Hilbert curve that fills a
+    ``2**order * 2**order`` square. Neighbouring positions are close to
+    each other on the curve.
+
+    >>> [hilbert_index(1, x, y) for x, y in [(0, 0), (0, 1), (1, 1), (1, 0)]]
+    [0, 1, 2, 3]
+    """
+    index = 0
+    s = 1 << (order - 1) if order else 0
+    while s > 0:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        index += s * s * ((3 * rx) ^ ry)
+        # rotate quadrant
+        if ry == 0:
+            if rx == 1:
+                x = s - 1 - x
+                y = s - 1 - y
+            x, y = y, x
+        s >>= 1
+    return index
+
+
+def partition_task(task, block_size=32):
+    """
+    Return a list of `WorkRange` with up to ``block_size * block_size``
+    meta tiles for all levels of `task` that intersect the coverage.
+    Ranges are ordered by level and along a Hilbert curve, or by the
+    priority of the range first, if the task has a `SeedPriority`.
+    """
+    meta_grid = task_meta_grid(task)
+    bbox = task.coverage.extent.bbox_for(task.grid.srs)
+    key = task_key(task)
+    priority = task.priority
+    ranges = []
+    for level in task.levels:
+        x0, y0, x1, y1, meta_size = meta_tile_range(meta_grid, bbox, level)
+        step_x = meta_size[0] * block_size
+        step_y = meta_size[1] * block_size
+        blocks_x = (x1 - x0) // step_x + 1
+        blocks_y = (y1 - y0) // step_y + 1
+        order = max(blocks_x, blocks_y).bit_length()
+        if priority is not None:
+            hits = priority.block_hits(level, (x0, y0), (step_x, step_y), (blocks_x, blocks_y))
+        for by in range(blocks_y):
+            for bx in range(blocks_x):
+                bx0 = x0 + bx * step_x
+                by0 = y0 + by * step_y
+                bx1 = min(bx0 + step_x, x1 + meta_size[0]) - 1
+                by1 = min(by0 + step_y, y1 + meta_size[1]) - 1
+                range_bbox = task.grid._tiles_bbox([(bx0, by0, level), (bx1, by1, level)])
+                if task.intersects(range_bbox) == NONE:
+                    continue
+                work_range = WorkRange(key, level, range_bbox,
+                    order=(level << 40) + hilbert_index(order, bx, by))
+                if priority is not None:
+                    work_range.priority = (priority.weight(range_bbox), hits.get((bx, by), 0))
+                ranges.append(work_range)
+
+    if priority is not None:
+        ranges.sort(key=lambda r: (-r.priority[0], -r.priority[1], r.order))
+        for i, r in enumerate(ranges):
+            r.order = i
+    else:
+        ranges.sort(key=lambda r: r.order)
+    return ranges
+
+
+def unchecked_levels(levels, skip_geoms_for_last_levels):
+    """
+    Return the levels where `TileWalker` does not check the coverage.
+
+    >>> unchecked_levels([0, 1, 2, 3], 2)
+    [3]
+    >>> unchecked_levels([0, 1, 2, 3], 0)
+    []
+    """
+    if skip_geoms_for_last_levels < 2:
+        return []
+    return levels[-(skip_geoms_for_last_levels - 1):]
+
+
+class SQLiteWorkQueue(object):
+    """
+    Work queue in an SQLite file, e.g. on a shared filesystem.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        with self._db() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS ranges (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    task TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    ordering INTEGER NOT NULL,
+                    state TEXT NOT NULL DEFAULT 'pending',
+                    worker TEXT,
+                    lease_until REAL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS ranges_state_idx ON ranges (state, ordering)")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            """)
+
+    @contextmanager
+    def _db(self):
+        db = sqlite3.connect(self.filename, timeout=60, isolation_level='EXCLUSIVE')
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def has_task(self, task):
+        with self._db() as db:
+            return db.execute("SELECT 1 FROM ranges WHERE task = ? LIMIT 1",
+                (task, )).fetchone() is not None
+
+    def put(self, ranges):
+        with self._db() as db:
+            db.executemany("INSERT INTO ranges (task, data, ordering) VALUES (?, ?, ?)",
+                [(r.task, r.to_json(), r.order) for r in ranges])
+
+    def claim(self, worker, lease_timeout):
+        """
+        Return the next pending (or expired) `WorkRange` and lease it to
+        `worker` for `lease_timeout` seconds. Return ``None`` if there
+        is nothing to claim.
+        """
+        now = time.time()
+        with self._db() as db:
+            db.execute("""UPDATE ranges SET state = 'pending', worker = NULL
+                WHERE state = 'leased' AND lease_until < ?""", (now, ))
+            row = db.execute("""SELECT id, data FROM ranges WHERE state = 'pending'
+                ORDER BY ordering LIMIT 1""").fetchone()
+            if row is None:
+                return None
+            db.execute("""UPDATE ranges SET state = 'leased', worker = ?, lease_until = ?
+                WHERE id = ?""", (worker, now + lease_timeout, row[0]))
+        return WorkRange.from_json(row[1], id=row[0])
+
+    def renew(self, work_range, worker, lease_timeout):
+        """
+        Extend the lease. Return ``False`` if `worker` lost the lease.
+        """
+        with self._db() as db:
+            cur = db.execute("""UPDATE ranges SET lease_until = ?
+                WHERE id = ? AND worker = ? AND state = 'leased'""",
+                (time.time() + lease_timeout, work_range.id, worker))
+            return cur.rowcount == 1
+
+    def release(self, work_range, worker):
+        with self._db() as db:
+            db.execute("""UPDATE ranges SET state = 'pending', worker = NULL
+                WHERE id = ? AND worker = ? AND state = 'leased'""", (work_range.id, worker))
+
+    def complete(self, work_range, worker):
+        with self._db() as db:
+            db.execute("UPDATE ranges SET state = 'done', worker = ? WHERE id = ?",
+                (worker, work_range.id))
+
+    def stats(self):
+        """
+        Return the number of ranges for each state, e.g.
+        ``{'pending': 10, 'leased': 2, 'done': 5}``.
+        """
+        stats = {'pending': 0, 'leased': 0, 'done': 0}
+        with self._db() as db:
+            for state, count in db.execute("SELECT state, count(*) FROM ranges GROUP BY state"):
+                stats[state] = count
+        return stats
+
+    def mark_distributed(self):
+        """
+        Mark that the coordinator added all ranges.
+        """
+        with self._db() as db:
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('distributed', '1')")
+
+    def is_distributed(self):
+        with self._db() as db:
+            return db.execute("SELECT 1 FROM meta WHERE key = 'distributed'").fetchone() is not None
+
+
+_redis_claim = """
+local now = tonumber(ARGV[1])
+for _, id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)) do
+    redis.call('ZREM', KEYS[2], id)
+    redis.call('HDEL', KEYS[4], id)
+    redis.call('ZADD', KEYS[1], redis.call('HGET', KEYS[5], id), id)
+end
+local next = redis.call('ZRANGE', KEYS[1], 0, 0)
+if #next == 0 then
+    return false
+end
+local id = next[1]
+redis.call('ZREM', KEYS[1], id)
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[3]), id)
+redis.call('HSET', KEYS[4], id, ARGV[2])
+return {id, redis.call('HGET', KEYS[3], id)}
+"""
+
+
+class RedisWorkQueue(object):
+    """
+    Work queue in Redis. Pending and leased ranges are stored in sorted
+    sets, claims are atomic Lua scripts.
+    """
+    def __init__(self, host='localhost', port=6379, db=0, prefix='mapproxy-seed'):
+        if redis is None:
+            raise ImportError("Redis work queue requires 'redis' package.")
+        self.r = redis.StrictRedis(host=host, port=port, db=db)
+        self.prefix = prefix
+        self._claim = self.r.register_script(_redis_claim)
+
+    def _key(self, name):
+        return '%s:%s' % (self.prefix, name)
+
+    def has_task(self, task):
+        return self.r.sismember(self._key('tasks'), task)
+
+    def put(self, ranges):
+        pipe = self.r.pipeline()
+        for r in ranges:
+            r.id = self.r.incr(self._key('id'))
+            pipe.sadd(self._key('tasks'), r.task)
+            pipe.hset(self._key('data'), r.id, r.to_json())
+            pipe.hset(self._key('order'), r.id, r.order)
+            pipe.zadd(self._key('pending'), {r.id: r.order})
+        pipe.execute()
+
+    def claim(self, worker, lease_timeout):
+        result = self._claim(
+            keys=[self._key('pending'), self._key('leased'), self._key('data'),
+                self._key('worker'), self._key('order')],
+            args=[time.time(), worker, lease_timeout],
+        )
+        if not result:
+            return None
+        id, data = result
+        return WorkRange.from_json(data.decode('utf-8'), id=int(id))
+
+    def _owns(self, work_range, worker):
+        owner = self.r.hget(self._key('worker'), work_range.id)
+        return owner is not None and owner.decode('utf-8') == worker
+
+    def renew(self, work_range, worker, lease_timeout):
+        if not self._owns(work_range, worker):
+            return False
+        self.r.zadd(self._key('leased'), {work_range.id: time.time() + lease_timeout}, xx=True)
+        return True
+
+    def release(self, work_range, worker):
+        if not self._owns(work_range, worker):
+            return
+        pipe = self.r.pipeline()
+        pipe.zrem(self._key('leased'), work_range.id)
+        pipe.hdel(self._key('worker'), work_range.id)
+        pipe.zadd(self._key('pending'), {work_range.id: work_range.order})
+        pipe.execute()
+
+    def complete(self, work_range, worker):
+        pipe = self.r.pipeline()
+        pipe.zrem(self._key('leased'), work_range.id)
+        pipe.zrem(self._key('pending'), work_range.id)
+        pipe.hdel(self._key('worker'), work_range.id)
+        pipe.incr(self._key('done'))
+        pipe.execute()
+
+    def stats(self):
+        return {
+            'pending': self.r.zcard(self._key('pending')),
+            'leased': self.r.zcard(self._key('leased')),
+            'done': int(self.r.get(self._key('done')) or 0),
+        }
+
+    def mark_distributed(self):
+        self.r.set(self._key('distributed'), 1)
+
+    def is_distributed(self):
+        return bool(self.r.exists(self._key('distributed')))
+
+
+def open_work_queue(url):
+    """
+    Return the work queue for `url`, either ``sqlite:///path/to/file``
+    (or just a path) or ``redis://host:port/db/prefix``.
+    """
+    if url.startswith('redis://'):
+        parts = url[len('redis://'):].split('/')
+        host, _, port = parts[0].partition(':')
+        kw = {}
+        if len(parts) > 1 and parts[1]:
+            kw['db'] = int(parts[1])
+        if len(parts) > 2 and parts[2]:
+            kw['prefix'] = parts[2]
+        return RedisWorkQueue(host=host or 'localhost', port=int(port or 6379), **kw)
+    if url.startswith('sqlite://'):
+        url = url[len('sqlite://'):]
+    return SQLiteWorkQueue(url)
+
+
+def distribute(tasks, queue, block_size=32):
+    """
+    Add all ranges of `tasks` to the `queue`. Tasks that are already in
+    the queue are skipped. Returns the number of new ranges.
+
+    The queue is marked as distributed afterwards, even if no range was
+    added, so that the workers know when they are finished.
+    """
+    num = 0
+    for task in tasks:
+        if task.coverage is False:
+            continue
+        key = task_key(task)
+        if queue.has_task(key):
+            log.info('task %s already in queue', key)
+            continue
+        ranges = partition_task(task, block_size=block_size)
+        queue.put(ranges)
+        num += len(ranges)
+    queue.mark_distributed()
+    return num
+
+
+def default_worker_id():
+    return '%s-%d' % (socket.gethostname(), os.getpid())
+
+
+class LeaseRenewer(threading.Thread):
+    """
+    Renews the lease of a `WorkRange` till it is stopped.
+    """
+    def __init__(self, queue, work_range, worker, lease_timeout):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.queue = queue
+        self.work_range = work_range
+        self.worker = worker
+        self.lease_timeout = lease_timeout
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.lease_timeout / 3):
+            try:
+                if not self.queue.renew(self.work_range, self.worker, self.lease_timeout):
+                    log.warning('lost lease for %r', self.work_range)
+                    return
+            except Exception as ex:
+                log.warning('unable to renew lease for %r: %s', self.work_range, ex)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def seed_worker(tasks, queue, worker=None, lease_timeout=300, concurrency=2,
+    skip_geoms_for_last_levels=0, progress_logger=None, poll_interval=10):
+    """
+    Claim and seed ranges from `queue` till the coordinator distributed
+    all tasks and no range is pending or leased. Waits for the
+    coordinator if the queue is empty.
+    Returns the number of seeded ranges.
+    """
+    worker = worker or default_worker_id()
+    tasks = dict((task_key(t), t) for t in tasks)
+    seeded = 0
+    while True:
+        work_range = queue.claim(worker, lease_timeout)
+        if work_range is None:
+            stats = queue.stats()
+            if not stats['pending'] and not stats['leased'] and queue.is_distributed():
+                return seeded
+            # wait for the coordinator, for other workers, or till
+            # their leases expire
+            time.sleep(min(poll_interval, lease_timeout))
+            continue
+
+        task = tasks.get(work_range.task)
+        if task is None:
+            queue.release(work_range, worker)
+            raise SeedInterrupted('unknown seed task %s in queue, all workers need the same'
+                ' seed configuration' % work_range.task)
+
+        if progress_logger:
+            progress_logger.log_message('seeding level %d of %s in %s' % (
+                work_range.level, task.md['name'],
+                ', '.join('%.2f' % c for c in work_range.bbox)))
+
+        renewer = LeaseRenewer(queue, work_range, worker, lease_timeout)
+        renewer.start()
+        try:
+            seed_range(task, work_range, concurrency=concurrency,
+                skip_geoms_for_last_levels=skip_geoms_for_last_levels,
+                progress_logger=progress_logger)
+        except BaseException:
+            exc_info = sys.exc_info()
+            renewer.stop()
+            try:
+                queue.release(work_range, worker)
+            except Exception:
+                log.warning('unable to release %r', work_range)
+            reraise(exc_info)
+        renewer.stop()
+        queue.complete(work_range, worker)
+        seeded += 1
+
+
+def seed_range(task, work_range, concurrency=2, skip_geoms_for_last_levels=0,
+    progress_logger=None):
+    """
+    Seed all meta tiles of `work_range`.
+    """
+    range_task = SeedTask(task.md, task.tile_manager, [work_range.level],
+        task.refresh_timestamp, task.coverage, seed_from=task.seed_from)
+    # TileWalker does not check the coverage if less than
+    # skip_geoms_for_last_levels levels are left
+    skip_geoms = 0
+    if work_range.level in unchecked_levels(task.levels, skip_geoms_for_last_levels):
+        skip_geoms = 2
+    seed_task(range_task, concurrency=concurrency, skip_geoms_for_last_levels=skip_geoms,
+        progress_logger=progress_logger, bbox=work_range.bbox)
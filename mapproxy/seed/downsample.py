@@ -0,0 +1,83 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Creation of tiles from the cached tiles of the next level.
+
+Seed tasks with ``seed_from: cached_level`` build each meta tile from the
+tiles of the next (higher resolution) level that are already in the cache,
+without any source requests. Tasks are seeded level by level, bottom-up,
+so that each level is built from the level seeded before.
+"""
+
+from mapproxy.cache.tile import Tile, TileCollection, split_meta_tiles
+from mapproxy.image.tile import TiledImage
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def downsample_meta_tile(tile_mgr, meta_tile):
+    """
+    Create all tiles of `meta_tile` from the cached tiles of the next
+    level and store them in the cache of `tile_mgr`.
+
+    Missing tiles of the next level are left blank. Nothing is stored if
+    none of them is cached.
+
+    :returns: the created tiles
+    """
+    grid = tile_mgr.grid
+    level = meta_tile.main_tile_coord[2]
+    if level + 1 >= grid.levels:
+        return []
+
+    src_bbox, src_tile_grid, src_coords = grid.get_affected_level_tiles(
+        meta_tile.bbox, level + 1)
+    src_tiles = TileCollection(src_coords)
+    tile_mgr.cache.load_tiles([t for t in src_tiles if t.coord is not None])
+    if src_tiles.blank:
+        log.debug('no cached tiles for %r in level %d', meta_tile.main_tile_coord, level + 1)
+        return []
+
+    tiled_image = TiledImage([t.source for t in src_tiles], src_bbox=src_bbox,
+        src_srs=grid.srs, tile_grid=src_tile_grid, tile_size=grid.tile_size)
+    meta_tile_image = tiled_image.transform(meta_tile.bbox, grid.srs, meta_tile.size,
+        tile_mgr.image_opts)
+
+    tiles = split_meta_tiles(meta_tile_image, meta_tile.tile_patterns, grid.tile_size,
+        tile_mgr.image_opts)
+    tiles = [tile_mgr.apply_tile_filter(t) for t in tiles]
+    tile_mgr.cache.store_tiles(tiles)
+    return tiles
+
+
+def downsample_tile_coords(tile_mgr, meta_grid, tile_coords):
+    """
+    Create all meta tiles that contain `tile_coords` from the cached tiles
+    of the next level. Only one meta tile is loaded at a time.
+
+    :param meta_grid: `MetaGrid` (without buffer) of the seeded meta tiles
+    """
+    created = []
+    done = set()
+    for coord in tile_coords:
+        meta_tile = meta_grid.meta_tile(coord)
+        if meta_tile.main_tile_coord in done:
+            continue
+        done.add(meta_tile.main_tile_coord)
+        with tile_mgr.lock(Tile(meta_tile.main_tile_coord)):
+            created.extend(downsample_meta_tile(tile_mgr, meta_tile))
+    return created
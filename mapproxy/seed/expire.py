@@ -0,0 +1,125 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Incremental seeding of the tiles from expire tile files.
+"""
+
+import os
+
+from mapproxy.grid import tile_grid
+from mapproxy.seed.distributed import hilbert_index
+from mapproxy.seed.plan import meta_tile_range
+from mapproxy.util.geom import expire_tile_files, read_expire_tiles
+
+
+def load_expired_tiles(expire_dir):
+    """
+    Load all expire tile files from `expire_dir` (file or directory).
+    The timestamp of the `ExpiredTiles` is the modification time of the
+    newest file.
+    """
+    files = expire_tile_files(expire_dir)
+    if not files:
+        return ExpiredTiles([])
+    timestamp = max(os.path.getmtime(f) for f in files)
+    tiles = [(x, y, z) for z, x, y in read_expire_tiles(expire_dir)]
+    return ExpiredTiles(tiles, timestamp=timestamp)
+
+
+class ExpiredTiles(object):
+    """
+    Expired tiles, e.g. from the expire lists of OpenStreetMap diff imports.
+
+    Duplicate tiles are removed and each expired tile marks all its parent
+    tiles as expired. The meta tiles of each seeded level are then
+    calculated from the expired tiles of the closest level of the expire
+    grid, instead of thousands of tiles of a higher level.
+
+    :param tiles: list of ``(x, y, z)`` tiles of `grid`
+    :param timestamp: time of the expiration, tiles created after this
+        time are up-to-date
+    :param grid: the grid of the tiles, defaults to the webmercator grid
+        with origin ``nw``, as used by osm2pgsql and imposm
+    """
+    def __init__(self, tiles, timestamp=None, grid=None):
+        self.grid = grid or tile_grid(3857, origin='nw')
+        self.timestamp = timestamp
+        self.tiles = set()
+        for tile in tiles:
+            x, y, z = tile
+            if z < 0 or z >= self.grid.levels:
+                continue
+            width, height = self.grid.grid_sizes[z]
+            if 0 <= x < width and 0 <= y < height:
+                self.tiles.add(tile)
+
+        # expired tiles of each level, including all parents of the
+        # expired tiles of higher levels
+        self.levels = {}
+        for x, y, z in self.tiles:
+            while z >= 0:
+                level_tiles = self.levels.setdefault(z, set())
+                if (x, y, z) in level_tiles:
+                    # parents are already expired
+                    break
+                level_tiles.add((x, y, z))
+                x //= 2
+                y //= 2
+                z -= 1
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def _level_tiles(self, grid, level):
+        """
+        Return the expired tiles that cover the expired area of `level`
+        of `grid`.
+        """
+        if grid.srs != self.grid.srs:
+            # resolutions are not comparable
+            return self.tiles
+        expire_level = self.grid.closest_level(grid.resolutions[level])
+        tiles = set(self.levels.get(expire_level, ()))
+        # lower levels contain larger areas than the tiles of expire_level
+        tiles.update(t for t in self.tiles if t[2] < expire_level)
+        return tiles
+
+    def meta_tiles(self, meta_grid, level):
+        """
+        Return the main tiles of all meta tiles of `meta_grid` in `level`
+        that intersect an expired tile. The tiles are ordered along a
+        Hilbert curve.
+        """
+        grid = meta_grid.grid
+        width, height = grid.grid_sizes[level]
+        meta_tiles = set()
+        for tile in self._level_tiles(grid, level):
+            bbox = self.grid.tile_bbox(tile)
+            if grid.srs != self.grid.srs:
+                bbox = self.grid.srs.transform_bbox_to(grid.srs, bbox)
+            x0, y0, x1, y1, meta_size = meta_tile_range(meta_grid, bbox, level)
+            if x1 < 0 or y1 < 0 or x0 >= width or y0 >= height:
+                continue
+            for y in range(max(0, y0), min(y1, height - 1) + 1, meta_size[1]):
+                for x in range(max(0, x0), min(x1, width - 1) + 1, meta_size[0]):
+                    meta_tiles.add((x, y, level))
+
+        if not meta_tiles:
+            return []
+        meta_size = meta_grid._meta_size(level)
+        order = max(width // meta_size[0], height // meta_size[1]).bit_length()
+        return sorted(meta_tiles, key=lambda t: hilbert_index(order,
+            t[0] // meta_size[0], t[1] // meta_size[1]))
@@ -0,0 +1,221 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Journal of all processed meta tiles of a seed task.
+
+The journal is a memory-mapped file with one bitmap for each level. Each
+bitmap covers all meta tiles within the bbox of the seed coverage. Seed
+workers mark meta tiles after they were stored, so that a continued seed
+skips all finished meta tiles, even after a crash.
+"""
+
+from __future__ import division
+
+import errno
+import json
+import mmap
+import multiprocessing
+import os
+import struct
+
+from mapproxy.grid import MetaGrid
+from mapproxy.seed.plan import SeedPlanner, meta_tile_range
+from mapproxy.util.fs import ensure_directory
+
+import logging
+log = logging.getLogger(__name__)
+
+# number of bits for all byte values
+_bit_counts = bytearray(bin(i).count('1') for i in range(256))
+
+
+def _count_bits(data, chunk_size=1024*1024):
+    count = 0
+    for offset in range(0, len(data), chunk_size):
+        chunk = data[offset:offset + chunk_size]
+        count += sum(bytearray(chunk).translate(_bit_counts))
+    return count
+
+
+def task_meta_grid(task):
+    """
+    Return the `MetaGrid` that the seeder uses for `task`.
+    """
+    tile_mgr = task.tile_manager
+    meta_size = tile_mgr.meta_grid.meta_size if tile_mgr.meta_grid else (1, 1)
+    return MetaGrid(tile_mgr.grid, meta_size=meta_size, meta_buffer=0)
+
+
+class SeedJournal(object):
+    """
+    Memory-mapped bitmaps of processed meta tiles.
+
+    The file is reused if the grid, the levels and the bbox are unchanged,
+    otherwise (or with `reset`) the journal starts empty. The journal
+    must be created before the seed workers are started, they share the
+    mapping and the lock.
+
+    :param filename: location of the journal
+    :param meta_grid: `MetaGrid` of the seeded meta tiles
+    :param levels: seeded levels
+    :param bbox: bbox of the seed coverage in the SRS of the grid
+    :param coverage: coverage to count the meta tiles for `progress`
+    :param reset: start with an empty journal
+    """
+    magic = b'MPSJ'
+    version = 1
+    header_size = 4096
+
+    def __init__(self, filename, meta_grid, levels, bbox, coverage=None, reset=False):
+        self.filename = filename
+        self.meta_grid = meta_grid
+        grid = meta_grid.grid
+
+        self.ranges = {}
+        offset = self.header_size
+        for level in levels:
+            x0, y0, x1, y1, meta_size = meta_tile_range(meta_grid, bbox, level)
+            width = (x1 - x0) // meta_size[0] + 1
+            height = (y1 - y0) // meta_size[1] + 1
+            self.ranges[level] = (x0, y0, width, height, meta_size, offset)
+            offset += (width * height + 7) // 8
+        self.size = offset
+
+        self.layout = {
+            'srs': grid.srs.srs_code,
+            'grid_bbox': list(grid.bbox),
+            'tile_size': list(grid.tile_size),
+            'resolutions': [grid.resolution(l) for l in levels],
+            'ranges': [[level] + list(self.ranges[level][:4]) for level in levels],
+        }
+
+        self._lock = multiprocessing.Lock()
+        self._done = multiprocessing.Value('l', 0, lock=False)
+        self._file = None
+        self._mmap = None
+        self._open(reset=reset)
+
+        self.total = None
+        if coverage is not None and SeedPlanner.available():
+            planner = SeedPlanner(meta_grid, coverage, levels)
+            self.total = sum(planner.count_meta_tiles(bbox, level) for level in levels)
+
+    def _open(self, reset=False):
+        header = None
+        if not reset:
+            header = self._read_header()
+            if header is not None and header != self.layout:
+                log.info('seed journal %s for other task, starting new journal', self.filename)
+                header = None
+
+        if header is None:
+            ensure_directory(self.filename)
+            with open(self.filename, 'wb') as f:
+                data = json.dumps(self.layout).encode('utf-8')
+                if len(data) + 12 > self.header_size:
+                    raise ValueError('too many levels for seed journal')
+                f.write(self.magic + struct.pack('<II', self.version, len(data)) + data)
+                # file without data blocks, empty bitmaps are read as zero
+                f.truncate(self.size)
+
+        self._file = open(self.filename, 'r+b')
+        self._mmap = mmap.mmap(self._file.fileno(), self.size)
+        self._done.value = _count_bits(self._mmap[self.header_size:])
+
+    def _read_header(self):
+        try:
+            with open(self.filename, 'rb') as f:
+                data = f.read(self.header_size)
+                if os.fstat(f.fileno()).st_size != self.size:
+                    return None
+        except (IOError, OSError) as ex:
+            if ex.errno != errno.ENOENT:
+                log.warning('unable to read seed journal %s: %s', self.filename, ex)
+            return None
+        if data[:4] != self.magic:
+            return None
+        version, length = struct.unpack('<II', data[4:12])
+        if version != self.version:
+            return None
+        try:
+            return json.loads(data[12:12 + length].decode('utf-8'))
+        except ValueError:
+            return None
+
+    def _position(self, tile_coord):
+        """
+        Return the byte offset and bit mask of the meta tile that contains
+        `tile_coord`, or ``None`` for tiles outside of the journal.
+        """
+        x, y, z = tile_coord
+        if z not in self.ranges:
+            return None
+        x0, y0, width, height, meta_size, offset = self.ranges[z]
+        col = (x - x0) // meta_size[0]
+        row = (y - y0) // meta_size[1]
+        if col < 0 or row < 0 or col >= width or row >= height:
+            return None
+        idx = row * width + col
+        return offset + (idx >> 3), 1 << (idx & 7)
+
+    def is_done(self, tile_coord):
+        pos = self._position(tile_coord)
+        if pos is None:
+            return False
+        offset, bit = pos
+        return bool(bytearray(self._mmap[offset:offset+1])[0] & bit)
+
+    def mark_done(self, tile_coord):
+        """
+        Mark the meta tile that contains `tile_coord` as processed.
+        """
+        pos = self._position(tile_coord)
+        if pos is None:
+            return
+        offset, bit = pos
+        with self._lock:
+            value = bytearray(self._mmap[offset:offset+1])[0]
+            if not value & bit:
+                self._mmap[offset:offset+1] = bytes(bytearray([value | bit]))
+                self._done.value += 1
+
+    @property
+    def done(self):
+        """
+        Number of processed meta tiles.
+        """
+        return self._done.value
+
+    def progress(self):
+        """
+        Return the ratio of processed meta tiles, or ``None`` if the
+        total number of meta tiles is unknown.
+        """
+        if not self.total:
+            return None
+        return min(1.0, self.done / self.total)
+
+    def flush(self):
+        self._mmap.flush()
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.flush()
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,294 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Vectorized planning of the (meta) tiles to seed.
+
+The coverage is rasterized for each level into an array with one cell for
+each meta tile. Rectangular blocks of cells are checked against the coverage
+and only blocks at the boundary of the coverage are subdivided, so that
+cells inside or outside of the coverage are never checked individually.
+"""
+
+from __future__ import division
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import shapely
+    if not hasattr(shapely, 'intersects'):
+        # vectorized functions require Shapely 2
+        shapely = None
+except ImportError:
+    shapely = None
+
+from mapproxy.util.coverage import GeomCoverage
+
+
+def meta_tile_range(meta_grid, bbox, level):
+    """
+    Return the first and last main tile coordinates and the meta size of
+    all meta tiles affected by `bbox`. Same as
+    `MetaGrid.get_affected_level_tiles`, but the coordinates are sorted.
+
+    >>> from mapproxy.grid import MetaGrid, TileGrid
+    >>> meta_tile_range(MetaGrid(TileGrid(), (4, 4)), (0, 0, 1e6, 1e6), 5)
+    (16, 16, 16, 16, (4, 4))
+    """
+    grid = meta_grid.grid
+    # remove 1/10 of a pixel so we don't get a tiles we only touch
+    delta = grid.resolutions[level] / 10.0
+    x0, y0, _ = grid.tile(bbox[0]+delta, bbox[1]+delta, level)
+    x1, y1, _ = grid.tile(bbox[2]-delta, bbox[3]-delta, level)
+    meta_size = meta_grid._meta_size(level)
+    x0 = x0//meta_size[0] * meta_size[0]
+    x1 = x1//meta_size[0] * meta_size[0]
+    y0 = y0//meta_size[1] * meta_size[1]
+    y1 = y1//meta_size[1] * meta_size[1]
+    return min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1), meta_size
+
+
+class SeedPlanner(object):
+    """
+    Plans all meta tiles of a seed task within a bbox at once.
+
+    :param meta_grid: `MetaGrid` of the `TileWalker`
+    :param coverage: coverage of the seed task in the SRS of the grid
+    :param levels: all levels of the seed task
+    :param skip_geoms_for_last_levels: do not check the coverage for the
+        last N levels
+    :param max_meta_tiles: only plan bboxes with at most that many meta
+        tiles in the last level
+    """
+    # subdivided blocks with that many cells are checked cell by cell
+    block_size = 16
+
+    def __init__(self, meta_grid, coverage, levels, skip_geoms_for_last_levels=0,
+        max_meta_tiles=4096):
+        self.meta_grid = meta_grid
+        self.grid = meta_grid.grid
+        self.coverage = coverage
+        self.levels = levels
+        self.skip_geoms_for_last_levels = skip_geoms_for_last_levels
+        self.max_meta_tiles = max_meta_tiles
+        self.geom = None
+        if (shapely and isinstance(coverage, GeomCoverage)
+            and coverage.srs == self.grid.srs):
+            self.geom = coverage.geom
+            shapely.prepare(self.geom)
+
+    @staticmethod
+    def available():
+        return np is not None
+
+    def num_meta_tiles(self, bbox, level):
+        x0, y0, x1, y1, meta_size = meta_tile_range(self.meta_grid, bbox, level)
+        return ((x1 - x0) // meta_size[0] + 1) * ((y1 - y0) // meta_size[1] + 1)
+
+    def can_plan(self, bbox, levels):
+        return self.num_meta_tiles(bbox, levels[-1]) <= self.max_meta_tiles
+
+    def _meta_tiles(self, bbox, level):
+        """
+        Return the x and y coordinates of the meta tiles affected by `bbox`
+        and the bounds of each column and row. Rows are ordered bottom-up.
+        """
+        x0, y0, x1, y1, meta_size = meta_tile_range(self.meta_grid, bbox, level)
+        res = self.grid.resolution(level)
+        width = res * self.grid.tile_size[0]
+        height = res * self.grid.tile_size[1]
+
+        xs = np.arange(x0, x1 + 1, meta_size[0])
+        minx = self.grid.bbox[0] + np.round(xs * width, 12)
+        maxx = (self.grid.bbox[0] + np.round((xs + meta_size[0] - 1) * width, 12)
+            + round(width, 12))
+
+        if self.grid.flipped_y_axis:
+            ys = np.arange(y1, y0 - 1, -meta_size[1])
+            maxy = self.grid.bbox[3] - np.round(ys * height, 12)
+            miny = (self.grid.bbox[3] - np.round((ys + meta_size[1] - 1) * height, 12)
+                - round(height, 12))
+        else:
+            ys = np.arange(y0, y1 + 1, meta_size[1])
+            miny = self.grid.bbox[1] + np.round(ys * height, 12)
+            maxy = (self.grid.bbox[1] + np.round((ys + meta_size[1] - 1) * height, 12)
+                + round(height, 12))
+        return xs, ys, (minx, maxx), (miny, maxy)
+
+    def _skip_geom(self, level):
+        return len([l for l in self.levels if l >= level]) < self.skip_geoms_for_last_levels
+
+    def plan(self, bbox, levels, all_subtiles=False):
+        """
+        Return all meta tiles within `bbox` that intersect the coverage.
+
+        :param levels: levels to plan, in ascending order
+        :param all_subtiles: return all meta tiles and do not check for
+            intersections with the coverage
+        :returns: ``(level, num_meta_tiles, [(x, y, level), ...])`` for
+            each level, deepest level first. The tiles of a level are
+            sorted row-wise like `MetaGrid.get_affected_level_tiles`
+            and `num_meta_tiles` includes all skipped meta tiles.
+        """
+        checked_level = None
+        if self.skip_geoms_for_last_levels and len(self.levels) >= self.skip_geoms_for_last_levels:
+            checked_level = self.levels[-self.skip_geoms_for_last_levels]
+
+        result = []
+        checked = None
+        for level in levels:
+            xs, ys, cols, rows = self._meta_tiles(bbox, level)
+            if all_subtiles:
+                mask = np.ones((len(ys), len(xs)), dtype=bool)
+            elif self._skip_geom(level):
+                if checked is None:
+                    mask = np.ones((len(ys), len(xs)), dtype=bool)
+                else:
+                    mask = overlapping_cells(checked, cols, rows,
+                        delta=self.grid.resolutions[level] / 10.0)
+            else:
+                mask = self._coverage_mask(cols, rows)
+            if level == checked_level:
+                checked = mask, cols, rows
+
+            grid_size = self.grid.grid_sizes[level]
+            mask &= ((xs >= 0) & (xs < grid_size[0]))[np.newaxis, :]
+            mask &= ((ys >= 0) & (ys < grid_size[1]))[:, np.newaxis]
+
+            # rows top-down
+            row_idx, col_idx = np.nonzero(mask[::-1])
+            tiles = list(zip(
+                xs[col_idx].tolist(),
+                ys[::-1][row_idx].tolist(),
+                [level] * len(row_idx),
+            ))
+            result.append((level, mask.size, tiles))
+        result.reverse()
+        return result
+
+    def count_meta_tiles(self, bbox, level):
+        """
+        Return the number of meta tiles within `bbox` that intersect the
+        coverage. Only checks the boundary of the coverage and does not
+        allocate an array for all meta tiles.
+        """
+        xs, ys, cols, rows = self._meta_tiles(bbox, level)
+        grid_size = self.grid.grid_sizes[level]
+        in_x = (xs >= 0) & (xs < grid_size[0])
+        in_y = (ys >= 0) & (ys < grid_size[1])
+        if not in_x.any() or not in_y.any():
+            return 0
+        cols = cols[0][in_x], cols[1][in_x]
+        rows = rows[0][in_y], rows[1][in_y]
+
+        count = 0
+        for r0, r1, c0, c1, cells in self._coverage_blocks(cols, rows):
+            if cells is None:
+                count += (r1 - r0) * (c1 - c0)
+            else:
+                count += int(cells.sum())
+        return count
+
+    def _coverage_mask(self, cols, rows):
+        """
+        Return a boolean array with all cells that intersect the coverage.
+        """
+        mask = np.zeros((len(rows[0]), len(cols[0])), dtype=bool)
+        for r0, r1, c0, c1, cells in self._coverage_blocks(cols, rows):
+            mask[r0:r1, c0:c1] = True if cells is None else cells
+        return mask
+
+    def _coverage_blocks(self, cols, rows):
+        """
+        Yield ``(r0, r1, c0, c1, cells)`` for all blocks of cells that
+        intersect the coverage. `cells` is ``None`` if the coverage
+        contains the whole block, otherwise a boolean array with all
+        intersecting cells of the block.
+        """
+        srs = self.grid.srs
+        blocks = [(0, len(rows[0]), 0, len(cols[0]))]
+        while blocks:
+            r0, r1, c0, c1 = blocks.pop()
+            bbox = (cols[0][c0], rows[0][r0], cols[1][c1-1], rows[1][r1-1])
+            if self.coverage.contains(bbox, srs):
+                yield r0, r1, c0, c1, None
+                continue
+            if not self.coverage.intersects(bbox, srs):
+                continue
+            if (r1 - r0) * (c1 - c0) <= self.block_size:
+                yield r0, r1, c0, c1, self._intersecting_cells(
+                    (cols[0][c0:c1], cols[1][c0:c1]),
+                    (rows[0][r0:r1], rows[1][r0:r1]),
+                )
+                continue
+            # split longer side
+            if c1 - c0 >= r1 - r0:
+                c = (c0 + c1) // 2
+                blocks.append((r0, r1, c0, c))
+                blocks.append((r0, r1, c, c1))
+            else:
+                r = (r0 + r1) // 2
+                blocks.append((r0, r, c0, c1))
+                blocks.append((r, r1, c0, c1))
+
+    def _intersecting_cells(self, cols, rows):
+        minx, miny = np.meshgrid(cols[0], rows[0])
+        maxx, maxy = np.meshgrid(cols[1], rows[1])
+        if self.geom is not None:
+            return shapely.intersects(self.geom, shapely.box(minx, miny, maxx, maxy))
+
+        srs = self.grid.srs
+        result = np.zeros(minx.shape, dtype=bool)
+        for idx in np.ndindex(minx.shape):
+            result[idx] = self.coverage.intersects(
+                (minx[idx], miny[idx], maxx[idx], maxy[idx]), srs)
+        return result
+
+
+def overlapping_cells(other, cols, rows, delta=0):
+    """
+    Return a boolean array with all cells that overlap a cell in the
+    `other` ``(mask, cols, rows)`` by more than `delta`.
+
+    >>> other = (np.array([[False, True]]),
+    ...     (np.array([0, 10]), np.array([10, 20])),
+    ...     (np.array([0]), np.array([10])))
+    >>> overlapping_cells(other,
+    ...     (np.array([0, 5, 10, 15]), np.array([5, 10, 15, 20])),
+    ...     (np.array([0, 5]), np.array([5, 10])), delta=0.1).tolist()
+    [[False, False, True, True], [False, False, True, True]]
+    """
+    mask, other_cols, other_rows = other
+
+    # summed-area table of the other mask
+    table = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=np.int64)
+    table[1:, 1:] = mask.cumsum(axis=0).cumsum(axis=1)
+
+    # index ranges [start, stop) of the overlapping cells
+    col_start = np.searchsorted(other_cols[1], cols[0] + delta, side='right')
+    col_stop = np.searchsorted(other_cols[0], cols[1] - delta, side='left')
+    row_start = np.searchsorted(other_rows[1], rows[0] + delta, side='right')
+    row_stop = np.searchsorted(other_rows[0], rows[1] - delta, side='left')
+    col_stop = np.maximum(col_start, col_stop)
+    row_stop = np.maximum(row_start, row_stop)
+
+    count = (table[row_stop[:, np.newaxis], col_stop[np.newaxis, :]]
+        - table[row_start[:, np.newaxis], col_stop[np.newaxis, :]]
+        - table[row_stop[:, np.newaxis], col_start[np.newaxis, :]]
+        + table[row_start[:, np.newaxis], col_start[np.newaxis, :]])
+    return count > 0
@@ -0,0 +1,113 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Priorities for the areas of a seed task.
+
+Seed tasks with priorities are split into ranges of meta tiles (see
+`mapproxy.seed.distributed.partition_task`) and the ranges with the highest
+priority are seeded first. Ranges with the same priority are seeded along
+a Hilbert curve.
+"""
+
+import re
+
+
+def load_heatmap(filename):
+    """
+    Load the number of requests for each tile from `filename`. Each line
+    contains the tile coordinate as ``z/x/y`` and the number of requests,
+    e.g. ``12/2148/1365 42``. Lines without a number count as one
+    request. Empty lines and lines starting with ``#`` are ignored.
+
+    :returns: dict with the number of requests for each ``(x, y, z)``
+    """
+    heatmap = {}
+    with open(filename) as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            m = re.match(r'^(\d+)/(\d+)/(\d+)(?:\s+(\d+(?:\.\d*)?))?$', line)
+            if not m:
+                raise ValueError('invalid line %d in heatmap %s: %r' % (
+                    lineno, filename, line))
+            z, x, y = int(m.group(1)), int(m.group(2)), int(m.group(3))
+            hits = float(m.group(4)) if m.group(4) else 1
+            heatmap[x, y, z] = heatmap.get((x, y, z), 0) + hits
+    return heatmap
+
+
+class SeedPriority(object):
+    """
+    Priorities of a seed task from weighted coverages and from the number
+    of requests for each tile.
+
+    The priority of a range of meta tiles is the highest weight of all
+    intersecting `regions`, followed by the sum of all requests of the
+    `heatmap` tiles within the range.
+
+    :param grid: the seeded grid
+    :param heatmap: dict with the number of requests for tiles of `grid`
+        (see `load_heatmap`)
+    :param regions: list of ``(coverage, weight)``, coverages in the SRS
+        of `grid`
+    """
+    def __init__(self, grid, heatmap=None, regions=None):
+        self.grid = grid
+        self.regions = sorted(regions or [], key=lambda r: -r[1])
+        self.heatmap = []
+        for (x, y, z), hits in (heatmap or {}).items():
+            if z >= grid.levels:
+                continue
+            width, height = grid.grid_sizes[z]
+            if x < 0 or y < 0 or x >= width or y >= height:
+                continue
+            self.heatmap.append((grid.tile_bbox((x, y, z)), hits))
+
+    def weight(self, bbox):
+        """
+        Return the highest weight of all regions that intersect `bbox`.
+        """
+        for coverage, weight in self.regions:
+            if coverage.intersects(bbox, self.grid.srs):
+                return weight
+        return 0
+
+    def block_hits(self, level, origin, step, num_blocks):
+        """
+        Return the number of requests for each block of meta tiles.
+
+        :param origin: first tile ``(x, y)`` of the first block
+        :param step: number of tiles ``(x, y)`` of each block
+        :param num_blocks: number of blocks ``(x, y)``
+        :returns: dict with the number of requests for each ``(bx, by)``
+        """
+        hits = {}
+        res = self.grid.resolutions[level]
+        for bbox, count in self.heatmap:
+            # heatmap tiles of lower levels cover multiple blocks, remove a
+            # small border so we don't get blocks we only touch
+            delta = min(res / 10.0, (bbox[2] - bbox[0]) / 4.0)
+            x0, y0, _ = self.grid.tile(bbox[0] + delta, bbox[1] + delta, level)
+            x1, y1, _ = self.grid.tile(bbox[2] - delta, bbox[3] - delta, level)
+            bx0 = max(0, (min(x0, x1) - origin[0]) // step[0])
+            bx1 = min(num_blocks[0] - 1, (max(x0, x1) - origin[0]) // step[0])
+            by0 = max(0, (min(y0, y1) - origin[1]) // step[1])
+            by1 = min(num_blocks[1] - 1, (max(y0, y1) - origin[1]) // step[1])
+            for by in range(by0, by1 + 1):
+                for bx in range(bx0, bx1 + 1):
+                    hits[bx, by] = hits.get((bx, by), 0) + count
+        return hits
@@ -31,6 +31,8 @@ from mapproxy.config.loader import load_configuration, ConfigurationError
 from mapproxy.seed.config import load_seed_tasks_conf
 from mapproxy.seed.seeder import seed, SeedInterrupted
 from mapproxy.seed.cleanup import cleanup
+from mapproxy.seed.distributed import open_work_queue, distribute, seed_worker
+from mapproxy.client.ratelimit import rate_limit_stats
 from mapproxy.seed.util import (format_seed_task, format_cleanup_task,
     ProgressLog, ProgressStore)
 from mapproxy.seed.cachelock import CacheLocker
@@ -82,6 +84,21 @@ def parse_duration(string):
     return duration
 
 
+def print_rate_limit_stats(before, after):
+    """
+    Print the requests and the time spent waiting for each rate limit
+    between the `before` and `after` `rate_limit_stats`.
+    """
+    for name, stats in sorted(after.items()):
+        start = before.get(name, {})
+        requests = stats['requests'] - start.get('requests', 0)
+        if not requests:
+            continue
+        print('rate limit %s: %d requests, %d delayed, %.1fs waiting' % (
+            name, requests, stats['delayed'] - start.get('delayed', 0),
+            stats['waited'] - start.get('waited', 0.0)))
+
+
 class SeedScript(object):
     usage = "usage: %prog [options] seed_conf"
     parser = OptionParser(usage)
@@ -97,6 +114,11 @@ class SeedScript(object):
     parser.add_option("-c", "--concurrency", type="int",
                       dest="concurrency", default=2,
                       help="number of parallel seed processes")
+    parser.add_option("--chunk-size", type="int",
+                      dest="chunk_size", default=None, metavar="N",
+                      help="number of meta tiles that are passed to the seed processes"
+                           " at once. defaults to a size based on the time for each"
+                           " meta tile")
     parser.add_option("-n", "--dry-run",
                       action="store_true", dest="dry_run", default=False,
                       help="do not seed, just print output")
@@ -136,6 +158,20 @@ class SeedScript(object):
                       default=None,
                       help="filename for storing the seed progress (for --continue option)")
 
+    parser.add_option("--distributed", dest='distributed_queue',
+                      default=None, metavar='QUEUE',
+                      help="seed with multiple nodes that share the work queue "
+                      "QUEUE (sqlite:///path/to/file or redis://host:port/db)")
+
+    parser.add_option("--coordinator",
+                      action="store_true", default=False,
+                      help="add all seed tasks to the --distributed work queue")
+
+    parser.add_option("--lease-timeout", dest='lease_timeout', type="int",
+                      default=300, metavar='SECONDS',
+                      help="reassign ranges of --distributed workers that did not "
+                      "respond within SECONDS (default 300)")
+
     parser.add_option("--duration", dest="duration",
                       help="stop seeding after (120s, 15m, 4h, 0.5d, etc)",
                       type=str, action="callback", callback=check_duration)
@@ -168,6 +204,11 @@ class SeedScript(object):
         if not options.conf_file:
             self.parser.error('missing mapproxy configuration -f/--proxy-conf')
 
+        if options.distributed_queue and options.dry_run:
+            self.parser.error('--dry-run is not supported with --distributed')
+        if options.chunk_size is not None and options.chunk_size < 1:
+            self.parser.error('--chunk-size needs to be 1 or larger')
+
         setup_logging(options.logging_conf)
 
         if options.duration:
@@ -239,11 +280,21 @@ class SeedScript(object):
                     print('========== Seeding tasks ==========')
                     print('Start seeding process (%d task%s)' % (
                         len(seed_tasks), 's' if len(seed_tasks) > 1 else ''))
-                    logger = ProgressLog(verbose=options.quiet==0, silent=options.quiet>=2,
-                        progress_store=progress)
-                    seed(seed_tasks, progress_logger=logger, dry_run=options.dry_run,
-                         concurrency=options.concurrency, cache_locker=cache_locker,
-                         skip_geoms_for_last_levels=options.geom_levels)
+                    rate_limits = rate_limit_stats()
+                    if options.distributed_queue:
+                        self.seed_distributed(seed_tasks, options)
+                    else:
+                        logger = ProgressLog(verbose=options.quiet==0, silent=options.quiet>=2,
+                            progress_store=progress)
+                        seed(seed_tasks, progress_logger=logger, dry_run=options.dry_run,
+                             concurrency=options.concurrency, cache_locker=cache_locker,
+                             skip_geoms_for_last_levels=options.geom_levels,
+                             chunk_size=options.chunk_size)
+                    if options.quiet == 0:
+                        print_rate_limit_stats(rate_limits, rate_limit_stats())
+                if cleanup_tasks and options.distributed_queue and not options.coordinator:
+                    print('skipping cleanup tasks, only the --coordinator runs cleanup tasks')
+                    cleanup_tasks = []
                 if cleanup_tasks:
                     print('========== Cleanup tasks ==========')
                     print('Start cleanup process (%d task%s)' % (
@@ -263,6 +314,25 @@ class SeedScript(object):
             if progress:
                 progress.remove()
 
+    def seed_distributed(self, seed_tasks, options):
+        if any(t.seed_from == 'cached_level' for t in seed_tasks):
+            # levels are created from each other, ranges of all levels
+            # can not be seeded in parallel
+            print('error: seed_from: cached_level is not supported with --distributed')
+            sys.exit(2)
+        if any(t.expired_tiles is not None for t in seed_tasks):
+            print('error: expire_tiles is not supported with --distributed')
+            sys.exit(2)
+        queue = open_work_queue(options.distributed_queue)
+        if options.coordinator:
+            num = distribute(seed_tasks, queue)
+            print('added %d ranges to the work queue' % num)
+        logger = ProgressLog(verbose=options.quiet==0, silent=options.quiet>=2)
+        num = seed_worker(seed_tasks, queue, lease_timeout=options.lease_timeout,
+            concurrency=options.concurrency, skip_geoms_for_last_levels=options.geom_levels,
+            progress_logger=logger)
+        print('seeded %d ranges' % num)
+
     def task_names(self, seed_conf, options):
         seed_names = cleanup_names = []
 
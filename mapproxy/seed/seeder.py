@@ -16,6 +16,7 @@
 from __future__ import print_function, division
 
 import sys
+import multiprocessing
 from collections import deque
 from contextlib import contextmanager
 import time
@@ -32,6 +33,9 @@ from mapproxy.compat.itertools import izip_longest
 from mapproxy.util.lock import LockTimeout
 from mapproxy.seed.util import format_seed_task, timestamp
 from mapproxy.seed.cachelock import DummyCacheLocker, CacheLockedError
+from mapproxy.seed.plan import SeedPlanner
+from mapproxy.seed.journal import task_meta_grid
+from mapproxy.seed.downsample import downsample_tile_coords
 
 from mapproxy.seed.util import (exp_backoff, limit_sub_bbox,
     status_symbol, BackoffError)
@@ -54,56 +58,154 @@ if sys.platform == 'win32' or (sys.platform == 'darwin' and sys.version_info >=
     proc_class = threading.Thread
     queue_class = Queue.Queue
 else:
-    import multiprocessing
     proc_class = multiprocessing.Process
     queue_class = multiprocessing.Queue
 
 
+class WorkerStats(object):
+    """
+    Time and number of the meta tiles that were processed by all workers
+    of a `TileWorkerPool`. Shared between all worker processes.
+    """
+    def __init__(self):
+        self._values = multiprocessing.Array('d', 2)
+
+    def add(self, seconds, meta_tiles):
+        with self._values.get_lock():
+            self._values[0] += seconds
+            self._values[1] += meta_tiles
+
+    @property
+    def meta_tiles(self):
+        return int(self._values[1])
+
+    def tile_time(self):
+        """
+        Return the average time in seconds for each meta tile, or ``None``
+        if no meta tile was processed.
+        """
+        seconds, meta_tiles = self._values[:]
+        if not meta_tiles:
+            return None
+        return seconds / meta_tiles
+
+
 class TileWorkerPool(object):
     """
     Manages multiple TileWorker.
+
+    Meta tiles are sent to the workers in chunks, to reduce the overhead
+    of the queue for meta tiles that are processed fast (e.g. tiles that
+    are already cached, or blank tiles). Chunks contain up to `chunk_size`
+    meta tiles. Without a `chunk_size`, the size is calculated from the
+    time the workers needed for the previous meta tiles, so that each chunk
+    contains about `chunk_time` seconds of work.
     """
-    def __init__(self, task, worker_class, size=2, dry_run=False, progress_logger=None):
+    #: maximum number of meta tiles of adaptive chunks
+    max_chunk_size = 64
+    #: work of each adaptive chunk in seconds
+    chunk_time = 0.2
+
+    def __init__(self, task, worker_class, size=2, dry_run=False, progress_logger=None,
+        journal=None, chunk_size=None):
         self.tiles_queue = queue_class(size)
         self.task = task
         self.dry_run = dry_run
         self.procs = []
         self.progress_logger = progress_logger
+        self.chunk_size = chunk_size
+        self.chunk = []
+        self.chunk_start = None
+        self.chunks = 0
+        self.stopped = False
+        self.meta_tiles = 0
+        self.start_time = time.time()
+        self.stats = WorkerStats()
         conf = base_config()
         for _ in range(size):
-            worker = worker_class(self.task, self.tiles_queue, conf)
+            worker = worker_class(self.task, self.tiles_queue, conf, journal=journal,
+                stats=self.stats)
             worker.start()
             self.procs.append(worker)
 
     def process(self, tiles, progress):
+        self.meta_tiles += 1
         if not self.dry_run:
-            while True:
-                try:
-                    self.tiles_queue.put(tiles, timeout=5)
-                except Queue.Full:
-                    alive = False
-                    for proc in self.procs:
-                        if proc.is_alive():
-                            alive = True
-                            break
-                    if not alive:
-                        log.warning('no workers left, stopping')
-                        raise SeedInterrupted
-                    continue
-                else:
-                    break
+            if not self.chunk:
+                self.chunk_start = time.time()
+            self.chunk.append(tiles)
+            if len(self.chunk) >= self.current_chunk_size():
+                self.flush()
+            else:
+                self.flush_pending()
 
             if self.progress_logger:
                 self.progress_logger.log_step(progress)
 
+    def current_chunk_size(self):
+        """
+        Return the number of meta tiles for the next chunk.
+        """
+        if self.chunk_size:
+            return self.chunk_size
+        tile_time = self.stats.tile_time()
+        if tile_time is None:
+            # nothing processed yet
+            return 1
+        if tile_time * self.max_chunk_size <= self.chunk_time:
+            return self.max_chunk_size
+        return max(1, int(self.chunk_time / tile_time))
+
+    def flush_pending(self):
+        """
+        Send the pending meta tiles to the workers, if the chunk was
+        started more than `chunk_time` seconds ago. Called by the walker
+        before it checks the next tiles, so that the workers are not
+        idle while the walker checks already cached areas.
+        """
+        if self.chunk and self.chunk_start + self.chunk_time < time.time():
+            self.flush()
+
+    def flush(self):
+        """
+        Send all pending meta tiles to the workers.
+        """
+        if not self.chunk:
+            return
+        chunk, self.chunk = self.chunk, []
+        while True:
+            try:
+                self.tiles_queue.put(chunk, timeout=5)
+            except Queue.Full:
+                alive = False
+                for proc in self.procs:
+                    if proc.is_alive():
+                        alive = True
+                        break
+                if not alive:
+                    log.warning('no workers left, stopping')
+                    raise SeedInterrupted
+                continue
+            else:
+                break
+        self.chunks += 1
+
     def stop(self, force=False):
         """
         Stop seed workers by sending None-sentinel and joining the workers.
 
         :param force: Skip sending None-sentinel and join with a timeout.
                       For use when workers might be shutdown already by KeyboardInterrupt.
+                      Pending meta tiles are dropped.
         """
-        if not force:
+        if self.stopped:
+            return
+        self.stopped = True
+
+        if force:
+            self.chunk = []
+        else:
+            self.flush()
             alives = 0
             for proc in self.procs:
                 if proc.is_alive():
@@ -127,15 +229,25 @@ class TileWorkerPool(object):
         for proc in self.procs:
             proc.join(timeout)
 
+        if self.progress_logger and not force:
+            self.progress_logger.log_throughput(self.meta_tiles, self.chunks,
+                time.time() - self.start_time, self.stats.tile_time())
+
 
 class TileWorker(proc_class):
-    def __init__(self, task, tiles_queue, conf):
+    """
+    Processes the chunks of meta tiles from the `tiles_queue` until it
+    gets a ``None``-sentinel. Subclasses implement `process_tiles`.
+    """
+    def __init__(self, task, tiles_queue, conf, journal=None, stats=None):
         proc_class.__init__(self)
         proc_class.daemon = True
         self.task = task
         self.tile_mgr = task.tile_manager
         self.tiles_queue = tiles_queue
         self.conf = conf
+        self.journal = journal
+        self.stats = stats
 
     def run(self):
         with local_base_config(self.conf):
@@ -146,25 +258,51 @@ class TileWorker(proc_class):
             except BackoffError:
                 return
 
-class TileSeedWorker(TileWorker):
     def work_loop(self):
         while True:
-            tiles = self.tiles_queue.get()
-            if tiles is None:
+            chunk = self.tiles_queue.get()
+            if chunk is None:
                 return
-            with self.tile_mgr.session():
-                exp_backoff(self.tile_mgr.load_tile_coords, args=(tiles,),
-                    max_repeat=100, max_backoff=600,
-                    exceptions=(SourceError, IOError), ignore_exceptions=(LockTimeout, ))
+            start = time.time()
+            for tiles in chunk:
+                self.process_tiles(tiles)
+            if self.stats:
+                self.stats.add(time.time() - start, len(chunk))
 
-class TileCleanupWorker(TileWorker):
+    def process_tiles(self, tiles):
+        raise NotImplementedError()
+
+class TileSeedWorker(TileWorker):
+    def process_tiles(self, tiles):
+        with self.tile_mgr.session():
+            exp_backoff(self.tile_mgr.load_tile_coords, args=(tiles,),
+                max_repeat=100, max_backoff=600,
+                exceptions=(SourceError, IOError), ignore_exceptions=(LockTimeout, ))
+        if self.journal:
+            # all tiles are from the same meta tile
+            self.journal.mark_done(tiles[0])
+
+class TileDownsampleWorker(TileWorker):
+    """
+    Creates the tiles from the cached tiles of the next level, for
+    tasks with ``seed_from: cached_level``.
+    """
     def work_loop(self):
-        while True:
-            tiles = self.tiles_queue.get()
-            if tiles is None:
-                return
-            with self.tile_mgr.session():
-                self.tile_mgr.remove_tile_coords(tiles)
+        self.meta_grid = task_meta_grid(self.task)
+        TileWorker.work_loop(self)
+
+    def process_tiles(self, tiles):
+        with self.tile_mgr.session():
+            exp_backoff(downsample_tile_coords, args=(self.tile_mgr, self.meta_grid, tiles),
+                max_repeat=100, max_backoff=600,
+                exceptions=(IOError, ), ignore_exceptions=(LockTimeout, ))
+        if self.journal:
+            self.journal.mark_done(tiles[0])
+
+class TileCleanupWorker(TileWorker):
+    def process_tiles(self, tiles):
+        with self.tile_mgr.session():
+            self.tile_mgr.remove_tile_coords(tiles)
 
 class SeedProgress(object):
     def __init__(self, old_progress_identifier=None):
@@ -204,6 +342,27 @@ class SeedProgress(object):
     def already_processed(self):
         return self.can_skip(self.old_level_progresses, self.level_progresses)
 
+    def resumes_below(self):
+        """
+        Return True if the old progress is below the current level, i.e.
+        if some subtiles of the current level were already processed.
+
+        >>> p = SeedProgress([(0, 4), (1, 4)])
+        >>> with p.step_down(0, 4):
+        ...     p.resumes_below()
+        True
+        >>> with p.step_down(1, 4):
+        ...     p.resumes_below()
+        False
+        """
+        if self.old_level_progresses is None:
+            return False
+        if self.old_level_progresses == []:
+            return True
+        current = (self.level_progresses or [])[:self.level_progresses_level]
+        return (len(self.old_level_progresses) > len(current)
+            and self.old_level_progresses[:len(current)] == current)
+
     def current_progress_identifier(self):
         if self.already_processed() or self.level_progresses is None:
             return self.old_level_progresses
@@ -274,10 +433,21 @@ class TileWalker(object):
     for each (meta) tile. It traverses the tile grid (pyramid) depth-first.
     Intersection with coverages are checked before handling subtiles in the next level,
     allowing to determine if all subtiles should be seeded or skipped.
+
+    Small bboxes (with up to `plan_max_meta_tiles` meta tiles in the last level)
+    are planned with `SeedPlanner` for all remaining levels at once, if NumPy is
+    available.
+
+    Tiles of the last level are checked in batches of `check_batch_size` meta
+    tiles with `TileManager.are_cached`/`are_stale`.
     """
+    plan_max_meta_tiles = 4096
+    # number of meta tiles that are checked with a single `TileManager.are_cached` call
+    check_batch_size = 256
+
     def __init__(self, task, worker_pool, handle_stale=False, handle_uncached=False,
                  work_on_metatiles=True, skip_geoms_for_last_levels=0, progress_logger=None,
-                 seed_progress=None):
+                 seed_progress=None, journal=None):
         self.tile_mgr = task.tile_manager
         self.task = task
         self.worker_pool = worker_pool
@@ -286,6 +456,7 @@ class TileWalker(object):
         self.work_on_metatiles = work_on_metatiles
         self.skip_geoms_for_last_levels = skip_geoms_for_last_levels
         self.progress_logger = progress_logger
+        self.journal = journal
 
         num_seed_levels = len(task.levels)
         if num_seed_levels >= 4:
@@ -313,11 +484,35 @@ class TileWalker(object):
 
         # [0] irregular tile grids: where one tile does not have exactly 4 subtiles
         # Typically when you use res_factor, or a custom res list.
+
+        # The optional `journal` (SeedJournal) marks all processed meta tiles and
+        # skips them exactly, also when a seed is continued.
         self.seeded_tiles = {l: deque(maxlen=64) for l in task.levels}
 
-    def walk(self):
+        if journal is not None:
+            # Continue from the journal alone. The stored progress can be
+            # ahead of meta tiles that were still queued (or in a pending
+            # chunk) when the seed was interrupted. These tiles are not
+            # marked in the journal and need to be seeded again.
+            self.seed_progress.old_level_progresses = None
+
+        self.planner = None
+        if SeedPlanner.available() and self.plan_max_meta_tiles:
+            self.planner = SeedPlanner(self.grid, task.coverage, task.levels,
+                skip_geoms_for_last_levels=skip_geoms_for_last_levels,
+                max_meta_tiles=self.plan_max_meta_tiles)
+
+    def walk(self, bbox=None):
+        """
+        :param bbox: only walk through the tiles within this bbox (in the
+                     SRS of the grid), e.g. for a range of distributed seeding
+        """
         assert self.handle_stale or self.handle_uncached
-        bbox = self.task.coverage.extent.bbox_for(self.tile_mgr.grid.srs)
+        cov_bbox = self.task.coverage.extent.bbox_for(self.tile_mgr.grid.srs)
+        if bbox is None:
+            bbox = cov_bbox
+        else:
+            bbox = limit_sub_bbox(cov_bbox, bbox)
         if self.seed_progress.already_processed():
             # nothing to seed
             self.seed_progress.step_forward()
@@ -328,6 +523,37 @@ class TileWalker(object):
                 pass
         self.report_progress(self.task.levels[0], self.task.coverage.bbox)
 
+    def walk_tiles(self, level_tiles):
+        """
+        Process the meta tiles of each level, instead of walking through
+        the tile pyramid. Meta tiles outside of the coverage are skipped.
+
+        :param level_tiles: list of ``(level, subtiles)`` with the main
+                            tiles of the meta tiles
+        """
+        assert self.handle_stale or self.handle_uncached
+        for i, (level, subtiles) in enumerate(level_tiles):
+            num_batches = (len(subtiles) + self.check_batch_size - 1) // self.check_batch_size
+            with self.seed_progress.step_down(i, len(level_tiles)):
+                for j in range(num_batches):
+                    if not self.seed_progress.running():
+                        self.report_progress(level, self.task.coverage.bbox)
+                        self.tile_mgr.cleanup()
+                        return
+                    with self.seed_progress.step_down(j, num_batches):
+                        if self.seed_progress.already_processed():
+                            self.seed_progress.step_forward()
+                            continue
+                        batch = subtiles[j * self.check_batch_size:(j + 1) * self.check_batch_size]
+                        batch = [t for t in batch
+                            if self.task.intersects(self.grid.meta_tile(t).bbox)]
+                        self._process_subtiles(batch, level)
+                        self.seed_progress.step_forward()
+                if not num_batches:
+                    self.seed_progress.step_forward()
+            self.report_progress(level, self.task.coverage.bbox)
+            self.tile_mgr.cleanup()
+
     def _walk(self, cur_bbox, levels, current_level=0, all_subtiles=False):
         """
         :param cur_bbox: the bbox to seed in this call
@@ -335,6 +561,10 @@ class TileWalker(object):
         :param all_subtiles: seed all subtiles and do not check for
                              intersections with bbox/geom
         """
+        if (self.planner and self.planner.can_plan(cur_bbox, levels)
+            and not self.seed_progress.resumes_below()):
+            return self._walk_planned(cur_bbox, levels, all_subtiles=all_subtiles)
+
         bbox_, tiles, subtiles = self.grid.get_affected_level_tiles(cur_bbox, current_level)
         total_subtiles = tiles[0] * tiles[1]
         if len(levels) < self.skip_geoms_for_last_levels:
@@ -356,6 +586,8 @@ class TileWalker(object):
             levels = levels[1:]
             process = True
 
+        # subtiles of the last level are checked in batches
+        batch = []
         for i, (subtile, sub_bbox, intersection) in enumerate(subtiles):
             if subtile is None: # no intersection
                 self.seed_progress.step_forward(total_subtiles)
@@ -377,38 +609,100 @@ class TileWalker(object):
             if not process:
                 continue
 
-            # check if subtile was already processed. see comment in __init__
-            if subtile in self.seeded_tiles[current_level]:
-                if not levels:
+            if levels:
+                self._process_subtiles([subtile], current_level)
+                continue
+
+            batch.append(subtile)
+            if len(batch) >= self.check_batch_size:
+                self._process_subtiles(batch, current_level)
+                for _ in batch:
+                    self.seed_progress.step_forward(total_subtiles)
+                batch = []
+
+        if batch:
+            self._process_subtiles(batch, current_level)
+            for _ in batch:
+                self.seed_progress.step_forward(total_subtiles)
+
+        if len(levels) >= 4:
+            # call cleanup to close open caches
+            # for connection based caches
+            self.tile_mgr.cleanup()
+
+    def _walk_planned(self, cur_bbox, levels, all_subtiles=False):
+        """
+        Process all subtiles of `levels` within `cur_bbox` with the
+        tiles from `SeedPlanner`. The seed progress is not stepped down
+        into the subtiles, a continued seed restarts with `cur_bbox`.
+        """
+        plan = self.planner.plan(cur_bbox, levels, all_subtiles=all_subtiles)
+        total_subtiles = sum(num for _, num, _ in plan)
+
+        for level, num, subtiles in plan:
+            if not self.seed_progress.running():
+                self.report_progress(level, cur_bbox)
+                self.tile_mgr.cleanup()
+                raise StopProcess()
+
+            for i in range(0, len(subtiles), self.check_batch_size):
+                batch = subtiles[i:i + self.check_batch_size]
+                self._process_subtiles(batch, level)
+                for _ in batch:
                     self.seed_progress.step_forward(total_subtiles)
+            if num > len(subtiles):
+                # skipped subtiles outside of the coverage
+                self.seed_progress.step_forward(total_subtiles / (num - len(subtiles)))
+
+            if level <= self.report_till_level:
+                self.report_progress(level, cur_bbox)
+
+        if len(levels) > 4:
+            self.tile_mgr.cleanup()
+
+    def _process_subtiles(self, subtiles, level):
+        """
+        Process all `subtiles` of `level`. The cache is checked for all
+        tiles of the batch at once.
+        """
+        batch = []
+        for subtile in subtiles:
+            # check if subtile was already processed. see comment in __init__
+            if subtile in self.seeded_tiles[level]:
+                continue
+            self.seeded_tiles[level].appendleft(subtile)
+            if self.journal and self.journal.is_done(subtile):
                 continue
-            self.seeded_tiles[current_level].appendleft(subtile)
 
             if not self.work_on_metatiles:
                 # collect actual tiles
-                handle_tiles = self.grid.tile_list(subtile)
+                handle_tiles = [t for t in self.grid.tile_list(subtile) if t is not None]
             else:
                 handle_tiles = [subtile]
+            batch.append((subtile, handle_tiles))
+
+        if not batch:
+            return
 
+        # send pending meta tiles before the (slow) check of the batch
+        self.worker_pool.flush_pending()
+
+        if self.handle_uncached or self.handle_stale:
+            coords = [t for _, handle_tiles in batch for t in handle_tiles]
             if self.handle_uncached:
-                handle_tiles = [t for t in handle_tiles if
-                                    t is not None and
-                                    not self.tile_mgr.is_cached(t)]
-            elif self.handle_stale:
-                handle_tiles = [t for t in handle_tiles if
-                                    t is not None and
-                                    self.tile_mgr.is_stale(t)]
+                handle = [not c for c in self.tile_mgr.are_cached(coords)]
+            else:
+                handle = self.tile_mgr.are_stale(coords)
+            handle = set(t for t, h in zip(coords, handle) if h)
+            batch = [(subtile, [t for t in handle_tiles if t in handle])
+                for subtile, handle_tiles in batch]
+
+        for subtile, handle_tiles in batch:
             if handle_tiles:
                 self.count += 1
                 self.worker_pool.process(handle_tiles, self.seed_progress)
-
-            if not levels:
-                self.seed_progress.step_forward(total_subtiles)
-
-        if len(levels) >= 4:
-            # call cleanup to close open caches
-            # for connection based caches
-            self.tile_mgr.cleanup()
+            elif self.journal:
+                self.journal.mark_done(subtile)
 
     def report_progress(self, level, bbox):
         if self.progress_logger:
@@ -436,13 +730,26 @@ class TileWalker(object):
                     yield None, None, None
 
 class SeedTask(object):
-    def __init__(self, md, tile_manager, levels, refresh_timestamp, coverage):
+    """
+    :param seed_from: ``'sources'`` to create tiles with the sources of the
+        cache, or ``'cached_level'`` to create them from the cached tiles
+        of the next level
+    :param priority: `SeedPriority` to seed ranges of meta tiles ordered by
+        their priority, instead of walking through the tile pyramid
+    :param expired_tiles: `ExpiredTiles` to seed only the meta tiles of
+        the expired tiles
+    """
+    def __init__(self, md, tile_manager, levels, refresh_timestamp, coverage,
+        seed_from='sources', priority=None, expired_tiles=None):
         self.md = md
         self.tile_manager = tile_manager
         self.grid = tile_manager.grid
         self.levels = levels
         self.refresh_timestamp = refresh_timestamp
         self.coverage = coverage
+        self.seed_from = seed_from
+        self.priority = priority
+        self.expired_tiles = expired_tiles
 
     @property
     def id(self):
@@ -477,7 +784,7 @@ class CleanupTask(object):
         return NONE
 
 def seed(tasks, concurrency=2, dry_run=False, skip_geoms_for_last_levels=0,
-    progress_logger=None, cache_locker=None):
+    progress_logger=None, cache_locker=None, chunk_size=None):
     if cache_locker is None:
         cache_locker = DummyCacheLocker()
 
@@ -496,7 +803,7 @@ def seed(tasks, concurrency=2, dry_run=False, skip_geoms_for_last_levels=0,
                     start_progress = None
                 seed_progress = SeedProgress(old_progress_identifier=start_progress)
                 seed_task(task, concurrency, dry_run, skip_geoms_for_last_levels, progress_logger,
-                    seed_progress=seed_progress)
+                    seed_progress=seed_progress, chunk_size=chunk_size)
         except CacheLockedError:
             print('    ...cache is locked, skipping')
             active_tasks = [task] + active_tasks[:-1]
@@ -505,7 +812,7 @@ def seed(tasks, concurrency=2, dry_run=False, skip_geoms_for_last_levels=0,
 
 
 def seed_task(task, concurrency=2, dry_run=False, skip_geoms_for_last_levels=0,
-    progress_logger=None, seed_progress=None):
+    progress_logger=None, seed_progress=None, bbox=None, chunk_size=None):
     if task.coverage is False:
         return
     if task.refresh_timestamp is not None:
@@ -516,19 +823,79 @@ def seed_task(task, concurrency=2, dry_run=False, skip_geoms_for_last_levels=0,
     if task.tile_manager.rescale_tiles:
         work_on_metatiles = False
 
-    tile_worker_pool = TileWorkerPool(task, TileSeedWorker, dry_run=dry_run,
-        size=concurrency, progress_logger=progress_logger)
-    tile_walker = TileWalker(task, tile_worker_pool, handle_uncached=True,
+    journal = None
+    if progress_logger and progress_logger.progress_store and not dry_run:
+        journal = progress_logger.progress_store.journal(task)
+        progress_logger.journal = journal
+
+    worker_class = TileSeedWorker
+    if task.seed_from == 'cached_level':
+        worker_class = TileDownsampleWorker
+
+    tile_worker_pool = TileWorkerPool(task, worker_class, dry_run=dry_run,
+        size=concurrency, progress_logger=progress_logger, journal=journal,
+        chunk_size=chunk_size)
+    walker_options = dict(handle_uncached=True,
         skip_geoms_for_last_levels=skip_geoms_for_last_levels, progress_logger=progress_logger,
         seed_progress=seed_progress,
         work_on_metatiles=work_on_metatiles,
+        journal=journal,
     )
     try:
-        tile_walker.walk()
+        if task.expired_tiles is not None and bbox is None:
+            walk_expired(task, tile_worker_pool, **walker_options)
+        elif task.priority is not None and bbox is None:
+            walk_prioritized(task, tile_worker_pool, **walker_options)
+        else:
+            TileWalker(task, tile_worker_pool, **walker_options).walk(bbox=bbox)
     except KeyboardInterrupt:
         tile_worker_pool.stop(force=True)
         raise
     finally:
-        tile_worker_pool.stop()
+        try:
+            tile_worker_pool.stop()
+        finally:
+            if journal:
+                progress_logger.journal = None
+                journal.close()
 
 
+def walk_prioritized(task, worker_pool, seed_progress=None, skip_geoms_for_last_levels=0,
+    block_size=32, **walker_options):
+    """
+    Walk through the ranges of meta tiles of `task` in the order of their
+    priority (see `SeedPriority`). The index of the current range is
+    stored in the `seed_progress`, so that a continued seed starts with
+    this range.
+
+    :param block_size: ranges with up to ``block_size * block_size`` meta
+        tiles, see `partition_task`
+    """
+    # distributed imports the seeder
+    from mapproxy.seed.distributed import partition_task, unchecked_levels
+    seed_progress = seed_progress or SeedProgress()
+    unchecked = unchecked_levels(task.levels, skip_geoms_for_last_levels)
+
+    ranges = partition_task(task, block_size=block_size)
+    for i, work_range in enumerate(ranges):
+        range_task = SeedTask(task.md, task.tile_manager, [work_range.level],
+            task.refresh_timestamp, task.coverage, seed_from=task.seed_from)
+        with seed_progress.step_down(i, len(ranges)):
+            # TileWalker does not check the coverage if less than
+            # skip_geoms_for_last_levels levels are left
+            TileWalker(range_task, worker_pool, seed_progress=seed_progress,
+                skip_geoms_for_last_levels=2 if work_range.level in unchecked else 0,
+                **walker_options).walk(bbox=work_range.bbox)
+        if not seed_progress.running():
+            return
+
+
+def walk_expired(task, worker_pool, **walker_options):
+    """
+    Seed the meta tiles of all expired tiles of `task` (see `ExpiredTiles`),
+    level by level.
+    """
+    tile_walker = TileWalker(task, worker_pool, **walker_options)
+    level_tiles = [(level, task.expired_tiles.meta_tiles(tile_walker.grid, level))
+        for level in task.levels]
+    tile_walker.walk_tiles(level_tiles)
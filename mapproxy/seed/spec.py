@@ -56,6 +56,14 @@ seed_yaml_spec = {
             'grids': [str()],
             'coverages': [str()],
             'refresh_before': time_spec,
+            'seed_from': str(),
+            'expire_tiles': str(),
+            'priorities': {
+                'heatmap': str(),
+                'coverages': {
+                    anything(): number(),
+                },
+            },
             'levels': one_off([int()], from_to_spec),
             'resolutions': one_off([int()], from_to_spec),
         },
@@ -20,6 +20,8 @@ import sys
 import stat
 import math
 import time
+import hashlib
+import shutil
 from datetime import datetime
 
 try:
@@ -48,6 +50,7 @@ class ProgressStore(object):
     """
     def __init__(self, filename=None, continue_seed=True):
         self.filename = filename
+        self.continue_seed = continue_seed
         if continue_seed:
             self.status = self.load()
         else:
@@ -80,6 +83,23 @@ class ProgressStore(object):
         self.status = {}
         if os.path.exists(self.filename):
             os.remove(self.filename)
+        if os.path.exists(self.journal_dir):
+            shutil.rmtree(self.journal_dir)
+
+    @property
+    def journal_dir(self):
+        return self.filename + '.journal'
+
+    def journal(self, task):
+        """
+        Return a `SeedJournal` for `task`. The journal is only continued
+        with `continue_seed`.
+        """
+        from mapproxy.seed.journal import SeedJournal, task_meta_grid
+        name = hashlib.md5(repr(task.id).encode('utf-8')).hexdigest()
+        bbox = task.coverage.extent.bbox_for(task.grid.srs)
+        return SeedJournal(os.path.join(self.journal_dir, name), task_meta_grid(task),
+            task.levels, bbox, coverage=task.coverage, reset=not self.continue_seed)
 
     def get(self, task_identifier):
         return self.status.get(task_identifier, None)
@@ -99,6 +119,17 @@ class ProgressLog(object):
         self.silent = silent
         self.current_task_id = None
         self.progress_store = progress_store
+        self._journal = None
+        self._journal_start = None
+
+    @property
+    def journal(self):
+        return self._journal
+
+    @journal.setter
+    def journal(self, journal):
+        self._journal = journal
+        self._journal_start = (time.time(), journal.done) if journal else None
 
     def log_message(self, msg):
         self.out.write('[%s] %s\n' % (
@@ -117,6 +148,23 @@ class ProgressLog(object):
             self.out.flush()
             self._laststep = time.time()
 
+    def log_throughput(self, meta_tiles, chunks, seconds, tile_time=None):
+        """
+        Log the number of meta tiles that the `TileWalker` passed to the
+        workers, and the average time of the workers for each meta tile.
+        """
+        if self.silent or not meta_tiles:
+            return
+        msg = '%d meta tiles' % (meta_tiles, )
+        if chunks:
+            # no chunks for dry runs
+            msg += ' in %d chunks' % (chunks, )
+        msg += ', %s (%.1f meta tiles/s)' % (format_duration(seconds),
+            meta_tiles / seconds if seconds else 0.0)
+        if tile_time is not None:
+            msg += ', %.1fms per meta tile in each worker' % (tile_time * 1000, )
+        self.log_message(msg)
+
     def log_progress(self, progress, level, bbox, tiles):
         progress_interval = 1
         if not self.verbose:
@@ -132,16 +180,50 @@ class ProgressLog(object):
                 self.progress_store.add(self.current_task_id,
                     progress.current_progress_identifier())
                 self.progress_store.write()
+            if self.journal:
+                self.journal.flush()
 
         if self.silent:
             return
 
         if log_progess:
-            self.out.write('[%s] %2s %6.2f%% %s (%d tiles)\n' % (
-                timestamp(), level, progress.progress*100,
-                format_bbox(bbox), tiles))
+            if self.journal:
+                self.out.write('[%s] %2s %6.2f%% %s (%s)\n' % (
+                    timestamp(), level, progress.progress*100,
+                    format_bbox(bbox), self.journal_status()))
+            else:
+                self.out.write('[%s] %2s %6.2f%% %s (%d tiles)\n' % (
+                    timestamp(), level, progress.progress*100,
+                    format_bbox(bbox), tiles))
             self.out.flush()
 
+    def journal_status(self):
+        """
+        Return the number of finished meta tiles and the estimated
+        remaining time from the journal.
+        """
+        done = self.journal.done
+        if not self.journal.total:
+            return '%d meta tiles done' % done
+        status = '%d/%d meta tiles done' % (done, self.journal.total)
+        start_time, start_done = self._journal_start
+        if done > start_done:
+            rate = (done - start_done) / (time.time() - start_time)
+            remaining = max(0, self.journal.total - done) / rate
+            status += ', ETA %s' % format_duration(remaining)
+        return status
+
+
+def format_duration(seconds):
+    """
+    >>> format_duration(59)
+    '0:00:59'
+    >>> format_duration(3600 * 30 + 61)
+    '30:01:01'
+    """
+    seconds = int(seconds)
+    return '%d:%02d:%02d' % (seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
 
 def limit_sub_bbox(bbox, sub_bbox):
     """
@@ -218,6 +300,12 @@ def format_seed_task(task):
     else:
         info.append('   Complete grid: %s (EPSG:4326)' % (format_bbox(map_extent_from_grid(task.grid).llbbox), ))
     info.append('    Levels: %s' % (task.levels, ))
+    if task.seed_from == 'cached_level':
+        info.append('    Downsampling: tiles from the next cached level')
+    if task.expired_tiles is not None:
+        info.append('    Limited to %d expired tiles' % (len(task.expired_tiles), ))
+    elif task.priority is not None:
+        info.append('    Order: by priority')
 
     if task.refresh_timestamp:
         info.append('    Overwriting: tiles older than %s' %
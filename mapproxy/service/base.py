@@ -17,11 +17,13 @@
 Service handler (WMS, TMS, etc.).
 """
 from mapproxy.exception import RequestError
+from mapproxy.response import Response
 
 class Server(object):
     names = tuple()
     request_parser = lambda x: None
     request_methods = ()
+    sendfile = None
     
     def handle(self, req):
         try:
@@ -43,4 +45,38 @@ class Server(object):
                 image, service, layers, environ=environ, query_extent=query_extent)
         return image
 
+    def tile_response(self, tile, content_type):
+        """
+        Return the `Response` for a rendered `tile`. The web server sends
+        the file of cached tiles if `sendfile` offloading is configured
+        and the tile was not modified.
+        """
+        location = getattr(tile, 'location', None)
+        if self.sendfile and location:
+            resp = self.sendfile.response(location, content_type=content_type)
+            if resp:
+                return resp
+        return Response(tile.as_buffer(), content_type=content_type)
 
+    def not_modified_response(self, layer, tile_request, coverage=None,
+        use_profiles=False, max_age=None):
+        """
+        Return a 304 Not Modified response if the client already has the
+        requested tile, otherwise ``None``. Compares the ``If-None-Match``
+        and ``If-Modified-Since`` headers with the metadata of the cached
+        tile, so the tile data is only loaded if the client needs it.
+        """
+        environ = tile_request.http.environ
+        if 'HTTP_IF_NONE_MATCH' not in environ and 'HTTP_IF_MODIFIED_SINCE' not in environ:
+            return None
+        tile = layer.cached_tile_metadata(tile_request, use_profiles=use_profiles,
+            coverage=coverage)
+        if tile is None:
+            return None
+        resp = Response(b'')
+        resp.cache_headers(tile.timestamp, etag_data=(tile.timestamp, tile.size),
+                           max_age=max_age)
+        resp.make_conditional(tile_request.http)
+        if resp.status.startswith('304'):
+            return resp
+        return None
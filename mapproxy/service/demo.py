@@ -59,7 +59,7 @@ class DemoServer(Server):
         self.image_formats = image_formats
         filter_image_format = []
         for format in self.image_formats:
-            if 'image/jpeg' == format or 'image/png' == format:
+            if format in ('image/jpeg', 'image/png', 'image/webp'):
                 filter_image_format.append(format)
         self.image_formats = filter_image_format
         self.srs = srs
@@ -35,8 +35,8 @@ class KMLRequest(TileRequest):
             (?P<x>-?\d+)/
             (?P<y>-?\d+)\.(?P<format>\w+)''', re.VERBOSE)
 
-    def __init__(self, request):
-        TileRequest.__init__(self, request)
+    def __init__(self, request, match=None):
+        TileRequest.__init__(self, request, match)
         if self.format == 'kml':
             self.request_handler_name = 'kml'
 
@@ -68,7 +68,12 @@ class KMLInitRequest(TileRequest):
         return PlainExceptionHandler()
 
 def kml_request(req):
-    if KMLInitRequest.tile_req_re.match(req.path):
+    path = req.path
+    # KMLInitRequest paths never contain the tile coordinates
+    match = KMLRequest.tile_req_re.match(path)
+    if match:
+        return KMLRequest(req, match)
+    if KMLInitRequest.tile_req_re.match(path):
         return KMLInitRequest(req)
     else:
         return KMLRequest(req)
@@ -96,10 +101,13 @@ class KMLServer(Server):
         map_request.origin = 'sw'
         layer = self.layer(map_request)
         limit_to = self.authorize_tile_layer(layer, map_request)
+        resp = self.not_modified_response(layer, map_request, coverage=limit_to,
+            max_age=self.max_tile_age)
+        if resp:
+            return resp
         tile = layer.render(map_request, coverage=limit_to)
         tile_format = getattr(tile, 'format', map_request.format)
-        resp = Response(tile.as_buffer(),
-                        content_type='image/' + tile_format)
+        resp = self.tile_response(tile, content_type='image/' + tile_format)
         resp.cache_headers(tile.timestamp, etag_data=(tile.timestamp, tile.size),
                            max_age=self.max_tile_age)
         resp.make_conditional(map_request.http)
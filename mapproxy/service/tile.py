@@ -18,6 +18,7 @@ from __future__ import division
 
 import math
 import time
+import uuid
 
 from mapproxy.compat import iteritems, itervalues
 from mapproxy.response import Response
@@ -26,10 +27,11 @@ from mapproxy.service.base import Server
 from mapproxy.request.tile import tile_request
 from mapproxy.request.base import split_mime_type
 from mapproxy.layer import map_extent_from_grid
+from mapproxy.cache.tile import Tile
 from mapproxy.source import SourceError
-from mapproxy.srs import SRS
+from mapproxy.srs import SRS, merge_bbox
 from mapproxy.grid import default_bboxs
-from mapproxy.image import BlankImageSource
+from mapproxy.image import BlankImageSource, peek_image_format
 from mapproxy.image.opts import ImageOptions
 from mapproxy.image.mask import mask_image_source_from_coverage
 from mapproxy.util.ext.odict import odict
@@ -52,7 +54,7 @@ class TileServer(Server):
     """
     names = ('tiles', 'tms')
     request_parser = staticmethod(tile_request)
-    request_methods = ('map', 'tms_capabilities, tms_root_resource')
+    request_methods = ('map', 'batch', 'tms_capabilities, tms_root_resource')
     template_file = 'tms_capabilities.xml'
     layer_template_file = 'tms_tilemap_capabilities.xml'
     root_resource_template_file = 'tms_root_resource.xml'
@@ -74,15 +76,22 @@ class TileServer(Server):
             tile_request.origin = self.origin
         layer, limit_to = self.layer(tile_request)
 
-        def decorate_img(image):
-            query_extent = (layer.grid.srs.srs_code,
-                layer.tile_bbox(tile_request, use_profiles=tile_request.use_profiles))
-            return self.decorate_img(image, 'tms', [layer.name], tile_request.http.environ, query_extent)
+        resp = self.not_modified_response(layer, tile_request, coverage=limit_to,
+            use_profiles=tile_request.use_profiles, max_age=self.max_tile_age)
+        if resp:
+            return resp
+
+        decorate_img = None
+        if 'mapproxy.decorate_img' in tile_request.http.environ:
+            def decorate_img(image):
+                query_extent = (layer.grid.srs.srs_code,
+                    layer.tile_bbox(tile_request, use_profiles=tile_request.use_profiles))
+                return self.decorate_img(image, 'tms', [layer.name], tile_request.http.environ, query_extent)
 
         tile = layer.render(tile_request, use_profiles=tile_request.use_profiles, coverage=limit_to, decorate_img=decorate_img)
 
         tile_format = getattr(tile, 'format', tile_request.format)
-        resp = Response(tile.as_buffer(), content_type='image/' + tile_format)
+        resp = self.tile_response(tile, content_type='image/' + tile_format)
         if tile.cacheable:
             resp.cache_headers(tile.timestamp, etag_data=(tile.timestamp, tile.size),
                                max_age=self.max_tile_age)
@@ -91,6 +100,40 @@ class TileServer(Server):
         resp.make_conditional(tile_request.http)
         return resp
 
+    def batch(self, batch_request):
+        """
+        :return: all requested tiles as a multipart/mixed response
+        :rtype: Response
+        """
+        if self.origin and not batch_request.origin:
+            batch_request.origin = self.origin
+        layer, limit_to = self.layer(batch_request)
+
+        decorate_img = None
+        if 'mapproxy.decorate_img' in batch_request.http.environ:
+            def decorate_img(image, tile_coord):
+                query_extent = (layer.grid.srs.srs_code, layer.grid.tile_bbox(tile_coord))
+                return self.decorate_img(image, 'tms', [layer.name], batch_request.http.environ, query_extent)
+
+        tiles = layer.render_batch(batch_request, use_profiles=batch_request.use_profiles,
+            coverage=limit_to, decorate_img=decorate_img)
+
+        # URL of each tile as a single tile request
+        path = batch_request.http.path
+        url_prefix = batch_request.http.script_url + path[:path.rindex('/batch.') + 1]
+        url_template = url_prefix.replace('%', '%%') + '%d/%d.' + batch_request.format
+        boundary = uuid.uuid4().hex
+        resp = Response(multipart_tiles(tiles, url_template, boundary),
+            content_type='multipart/mixed; boundary=' + boundary)
+        if all(tile.cacheable for _, tile in tiles):
+            timestamp = max(tile.timestamp or 0 for _, tile in tiles)
+            resp.cache_headers(timestamp, etag_data=[(tile.timestamp, tile.size) for _, tile in tiles],
+                               max_age=self.max_tile_age)
+        else:
+            resp.cache_headers(no_cache=True)
+        resp.make_conditional(batch_request.http)
+        return resp
+
     def _internal_layer(self, tile_request):
         if '_layer_spec' in tile_request.dimensions:
             name = tile_request.layer + '_' + tile_request.dimensions['_layer_spec']
@@ -124,6 +167,9 @@ class TileServer(Server):
             if request.tile:
                 query_extent = (tile_layer.grid.srs.srs_code,
                     tile_layer.tile_bbox(request, use_profiles=request.use_profiles))
+            elif getattr(request, 'tiles', None):
+                query_extent = (tile_layer.grid.srs.srs_code,
+                    tile_layer.tiles_bbox(request, use_profiles=request.use_profiles))
             else:
                 query_extent = None # for layer capabilities
             result = request.http.environ['mapproxy.authorize']('tms', [tile_layer.name],
@@ -244,8 +290,10 @@ class TileLayer(object):
             return 'image/png'
         return self.md.get('format', 'image/png')
 
-    def _internal_tile_coord(self, tile_request, use_profiles=False):
-        tile_coord = self.grid.internal_tile_coord(tile_request.tile, use_profiles)
+    def _internal_tile_coord(self, tile_request, use_profiles=False, tile=None):
+        if tile is None:
+            tile = tile_request.tile
+        tile_coord = self.grid.internal_tile_coord(tile, use_profiles)
         if tile_coord is None:
             raise RequestError('The requested tile is outside the bounding box'
                                ' of the tile map.', request=tile_request,
@@ -272,6 +320,14 @@ class TileLayer(object):
         tile_coord = self._internal_tile_coord(tile_request, use_profiles=use_profiles)
         return self.grid.tile_bbox(tile_coord, limit=limit)
 
+    def tiles_bbox(self, batch_request, use_profiles=False):
+        bbox = None
+        for tile in batch_request.tiles:
+            tile_coord = self._internal_tile_coord(batch_request, use_profiles=use_profiles, tile=tile)
+            tile_bbox = self.grid.tile_bbox(tile_coord)
+            bbox = merge_bbox(bbox, tile_bbox) if bbox else tile_bbox
+        return bbox
+
     def checked_dimensions(self, tile_request):
         dimensions = {}
 
@@ -314,6 +370,7 @@ class TileLayer(object):
             if tile.source is None:
                 return self.empty_response()
 
+            source = tile.source
             # Provide the wrapping WSGI app or filter the opportunity to process the
             # image before it's wrapped up in a response
             if decorate_img:
@@ -333,10 +390,127 @@ class TileLayer(object):
                 return TileResponse(tile, format=format, image_opts=image_opts)
 
             format = None if self._mixed_format else tile_request.format
-            return TileResponse(tile, format=format, image_opts=self.tile_manager.image_opts)
+            location = None
+            if tile.source is source and format:
+                location = self._tile_location(tile)
+            return TileResponse(tile, format=format, image_opts=self.tile_manager.image_opts,
+                location=location)
         except SourceError as e:
             raise RequestError(e.args[0], request=tile_request, internal=True)
 
+    def render_batch(self, batch_request, use_profiles=False, coverage=None, decorate_img=None):
+        """
+        Render all tiles of `batch_request`. The tiles are loaded with a
+        single `load_tile_coords` call, so that caches can load them in bulk.
+
+        :param decorate_img: called with the image source and internal
+            tile coord of each tile
+        :returns: list of the requested tile (x, y, z) and the tile response
+        """
+        if batch_request.format != self.format:
+            raise RequestError('invalid format (%s). this tile set only supports (%s)'
+                               % (batch_request.format, self.format), request=batch_request,
+                               code='InvalidParameterValue')
+
+        tile_coords = [
+            self._internal_tile_coord(batch_request, use_profiles=use_profiles, tile=tile)
+            for tile in batch_request.tiles
+        ]
+
+        intersecting = set()
+        load_coords = []
+        for tile_coord in tile_coords:
+            if coverage:
+                tile_bbox = self.grid.tile_bbox(tile_coord)
+                if coverage.contains(tile_bbox, self.grid.srs):
+                    pass
+                elif coverage.intersects(tile_bbox, self.grid.srs):
+                    intersecting.add(tile_coord)
+                else:
+                    continue
+            load_coords.append(tile_coord)
+
+        dimensions = self.checked_dimensions(batch_request)
+
+        try:
+            with self.tile_manager.session():
+                tiles = self.tile_manager.load_tile_coords(load_coords,
+                    dimensions=dimensions, with_metadata=True)
+        except SourceError as e:
+            raise RequestError(e.args[0], request=batch_request, internal=True)
+
+        format = None if self._mixed_format else batch_request.format
+        result = []
+        for req_tile, tile_coord in zip(batch_request.tiles, tile_coords):
+            if tile_coord not in tiles or tiles[tile_coord].source is None:
+                result.append((req_tile, self.empty_response()))
+                continue
+            tile = tiles[tile_coord]
+            if decorate_img:
+                tile.source = decorate_img(tile.source, tile_coord)
+            if tile_coord in intersecting:
+                if self.empty_response_as_png:
+                    tile_format = 'png'
+                    image_opts = ImageOptions(transparent=True, format='png')
+                else:
+                    tile_format = self.format
+                    image_opts = tile.source.image_opts
+                tile.source = mask_image_source_from_coverage(
+                    tile.source, self.grid.tile_bbox(tile_coord), self.grid.srs, coverage, image_opts)
+                result.append((req_tile, TileResponse(tile, format=tile_format, image_opts=image_opts)))
+            else:
+                result.append((req_tile, TileResponse(tile, format=format,
+                    image_opts=self.tile_manager.image_opts)))
+        return result
+
+    def _tile_location(self, tile):
+        """
+        Return the filename of the cached `tile`, if the file can be sent
+        to the client without re-encoding.
+        """
+        filename = getattr(tile.source, 'filename', None)
+        if not filename:
+            return None
+        source_opts = tile.source.image_opts
+        if source_opts and source_opts.format and source_opts.format != self.tile_manager.image_opts.format:
+            return None
+        return filename
+
+    def cached_tile_metadata(self, tile_request, use_profiles=False, coverage=None):
+        """
+        Return the cached `Tile` for `tile_request` with ``timestamp``
+        and ``size``, without loading the tile data. Returns ``None`` if the
+        tile is not cached, stale, or if the cache does not store the
+        modification time of the tiles.
+
+        Returns always ``None`` for layers with dimensions, as the tiles
+        are only loaded with the dimensions of the request in `render`.
+        """
+        if tile_request.format != self.format:
+            return None
+        if self.dimensions:
+            return None
+
+        tile_coord = self._internal_tile_coord(tile_request, use_profiles=use_profiles)
+        if coverage and not coverage.intersects(self.grid.tile_bbox(tile_coord), self.grid.srs):
+            return None
+
+        tile = Tile(tile_coord)
+        try:
+            with self.tile_manager.session():
+                self.tile_manager.cache.load_tile_metadata(tile)
+        except NotImplementedError:
+            return None
+
+        # missing tiles have no timestamp, some caches use -1 for
+        # tiles without timestamp
+        if not tile.timestamp or tile.timestamp < 0:
+            return None
+        max_mtime = self.tile_manager.expire_timestamp(tile)
+        if max_mtime is not None and tile.timestamp < max_mtime:
+            return None
+        return tile
+
     def get_info(self, info_request):
         if info_request.format != self.format:
             raise RequestError('invalid format (%s). this tile set only supports (%s)'
@@ -389,6 +563,28 @@ class TileLayer(object):
 
 
 
+def multipart_tiles(tiles, url_template, boundary):
+    """
+    Yield the parts of a multipart/mixed response for `tiles`.
+    Each part contains one tile, with the URL of the tile as
+    ``Content-Location``.
+
+    :param tiles: list of the tile (x, y, z) and the tile response
+    :param url_template: URL of a single tile with ``%d`` for x and y
+    """
+    for (x, y, z), tile in tiles:
+        data = tile.as_buffer()
+        if hasattr(data, 'read'):
+            data.seek(0)
+            data = data.read()
+        yield ('--%s\r\nContent-Type: image/%s\r\nContent-Location: %s\r\n'
+            'Content-Length: %d\r\n\r\n' % (boundary, tile.format,
+            url_template % (x, y), len(data))).encode('ascii')
+        yield data
+        yield b'\r\n'
+    yield ('--%s--\r\n' % boundary).encode('ascii')
+
+
 class ImageResponse(object):
     """
     Response from an image.
@@ -408,24 +604,26 @@ class TileResponse(object):
     """
     Response from a Tile.
     """
-    def __init__(self, tile, format=None, timestamp=None, image_opts=None):
+    def __init__(self, tile, format=None, timestamp=None, image_opts=None, location=None):
         self.tile = tile
         self.timestamp = tile.timestamp
         self.size = tile.size
         self.cacheable = tile.cacheable
-        self._buf = self.tile.source_buffer(format=format, image_opts=image_opts)
+        # filename of the cached tile, see Server.tile_response
+        self.location = location
+        self._format = format
+        self._image_opts = image_opts
+        self._buf = None
         self.format = format or self._format_from_magic_bytes()
 
     def as_buffer(self):
+        if self._buf is None:
+            # only read when the tile is not offloaded
+            self._buf = self.tile.source_buffer(format=self._format, image_opts=self._image_opts)
         return self._buf
 
     def _format_from_magic_bytes(self):
-        #read the 2 magic bytes from the buffer
-        magic_bytes = self._buf.read(2)
-        self._buf.seek(0)
-        if magic_bytes == b'\xFF\xD8':
-            return 'jpeg'
-        return 'png'
+        return peek_image_format(self.as_buffer()) or 'png'
 
 class TileServiceGrid(object):
     """
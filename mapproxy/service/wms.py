@@ -16,21 +16,27 @@
 """
 WMS service handler
 """
+import time
+
 from mapproxy.compat import iteritems
 from mapproxy.compat.itertools import chain
 from functools import partial
 from math import sqrt
 from mapproxy.cache.tile import CacheInfo
+from mapproxy.cache.response import response_cache_key
 from mapproxy.featureinfo import combine_docs
 from mapproxy.request.wms import (wms_request, WMS111LegendGraphicRequest,
     mimetype_from_infotype, infotype_from_mimetype, switch_bbox_epsg_axis_order)
 from mapproxy.srs import SRS, TransformationError
 from mapproxy.service.base import Server
 from mapproxy.response import Response
-from mapproxy.source import SourceError
+from mapproxy.source import SourceError, check_deadline
 from mapproxy.exception import RequestError
 from mapproxy.image import bbox_position_in_image, SubImageSource, BlankImageSource, GeoReference
+from mapproxy.image import filter_format
 from mapproxy.image.merge import concat_legends, LayerMerger
+from mapproxy.image.stream import strip_bboxes, strip_encoder, StripAttribution
+from mapproxy.image.tiff import cog_encoder
 from mapproxy.image.opts import ImageOptions
 from mapproxy.image.message import attribution_image, message_image
 from mapproxy.layer import BlankImage, MapQuery, InfoQuery, LegendQuery, MapError, LimitedLayer
@@ -60,6 +66,9 @@ class WMSServer(Server):
         srs_extents=None, max_tile_age=None,
         versions=None,
         inspire_md=None,
+        strip_rendering_min_pixels=None, strip_rendering_height=512,
+        response_cache=None,
+        request_timeout=None,
         ):
         Server.__init__(self)
         self.request_parser = request_parser or partial(wms_request, strict=strict, versions=versions)
@@ -78,12 +87,20 @@ class WMSServer(Server):
         self.max_output_pixels = max_output_pixels
         self.max_tile_age = max_tile_age
         self.inspire_md = inspire_md
+        self.strip_rendering_min_pixels = strip_rendering_min_pixels
+        self.strip_rendering_height = strip_rendering_height
+        self.response_cache = response_cache
+        self.request_timeout = request_timeout
 
     def map(self, map_request):
         self.check_map_request(map_request)
 
         params = map_request.params
-        query = MapQuery(params.bbox, params.size, SRS(params.srs), params.format)
+        deadline = None
+        if self.request_timeout:
+            deadline = time.time() + self.request_timeout
+        query = MapQuery(params.bbox, params.size, SRS(params.srs), params.format,
+            deadline=deadline)
 
         if map_request.params.get('tiled', 'false').lower() == 'true':
             query.tiled_only = True
@@ -101,7 +118,8 @@ class WMSServer(Server):
                     img = BlankImageSource(size=params.size, image_opts=img_opts, cacheable=True)
                     return Response(img.as_buffer(), content_type=img_opts.format.mime_type)
                 sub_size, offset, sub_bbox = bbox_position_in_image(params.bbox, params.size, limited_extent.bbox)
-                query = MapQuery(sub_bbox, sub_size, SRS(params.srs), params.format)
+                query = MapQuery(sub_bbox, sub_size, SRS(params.srs), params.format,
+                    deadline=deadline)
 
         actual_layers = odict()
         for layer_name in map_request.params.layers:
@@ -120,6 +138,15 @@ class WMSServer(Server):
 
         self.filter_actual_layers(actual_layers, map_request.params.layers, authorized_layers)
 
+        cache_key = None
+        if self.response_cache and not query.tiled_only:
+            cache_key = self.response_cache_key(map_request, actual_layers,
+                authorized_layers, coverage)
+            if cache_key:
+                cached = self.response_cache.get(cache_key)
+                if cached:
+                    return Response(cached.data, content_type=cached.content_type)
+
         render_layers = []
         for layers in actual_layers.values():
             render_layers.extend(layers)
@@ -127,19 +154,17 @@ class WMSServer(Server):
         self.update_query_with_fwd_params(query, params=params,
             layers=render_layers)
 
-        raise_source_errors =  True if self.on_error == 'raise' else False
-        renderer = LayerRenderer(render_layers, query, map_request,
-                                 raise_source_errors=raise_source_errors,
-                                 concurrent_rendering=self.concurrent_layer_renderer)
-
-        merger = LayerMerger()
-        renderer.render(merger)
-
-        if self.attribution and self.attribution.get('text') and not query.tiled_only:
-            merger.add(attribution_image(self.attribution['text'], query.size))
         img_opts = self.image_formats[params.format_mime_type].copy()
         img_opts.bgcolor = params.bgcolor
         img_opts.transparent = params.transparent
+
+        if query == orig_query:
+            encoder = self.strip_encoder(query, img_opts, map_request.http.environ)
+            if encoder:
+                return self.strip_response(encoder, render_layers, query, map_request,
+                    img_opts, coverage)
+
+        merger = self.render_map(render_layers, query, map_request, img_opts, coverage)
         result = merger.merge(size=query.size, image_opts=img_opts,
             bbox=query.bbox, bbox_srs=params.srs, coverage=coverage)
 
@@ -151,14 +176,27 @@ class WMSServer(Server):
         result = self.decorate_img(result, 'wms.map', actual_layers.keys(),
             map_request.http.environ, (query.srs.srs_code, query.bbox))
 
+        cog = None
         try:
             result.georef = GeoReference(bbox=orig_query.bbox, srs=orig_query.srs)
-            result_buf = result.as_buffer(img_opts)
+            if filter_format(img_opts.format.ext) == 'tiff':
+                cog = cog_encoder(result.as_image(), img_opts, georef=result.georef)
+            if cog:
+                # stream tiles of the COG instead of copying them into a buffer
+                result_buf = iter(cog)
+            else:
+                result_buf = result.as_buffer(img_opts)
         except IOError as ex:
             raise RequestError('error while processing image file: %s' % ex,
                 request=map_request)
 
+        if cache_key and result.cacheable and not cog:
+            result_buf = result_buf.read()
+            self.response_cache.put(cache_key, result_buf, img_opts.format.mime_type)
+
         resp = Response(result_buf, content_type=img_opts.format.mime_type)
+        if cog:
+            resp.headers['Content-length'] = str(cog.content_length())
 
         if query.tiled_only and isinstance(result.cacheable, CacheInfo):
             cache_info = result.cacheable
@@ -171,6 +209,132 @@ class WMSServer(Server):
 
         return resp
 
+    def response_cache_key(self, map_request, actual_layers, authorized_layers, coverage):
+        """
+        Return the key of the GetMap response for `response_cache`, or
+        ``None`` if the response should not be cached.
+
+        The key contains all request parameters, with the BBOX rounded to
+        1/100 pixel, and the layers that are rendered after authorization.
+        """
+        if coverage is not None:
+            return None
+        if 'mapproxy.decorate_img' in map_request.http.environ:
+            return None
+        if authorized_layers is not PERMIT_ALL_LAYERS:
+            for layer_name in actual_layers:
+                if authorized_layers[layer_name] is not None:
+                    # limited_to for single layers
+                    return None
+
+        params = map_request.params
+        width, height = params.size
+        bbox = params.bbox
+        res = ((bbox[2] - bbox[0]) / width, (bbox[3] - bbox[1]) / height)
+        parts = [
+            ('bbox', tuple(int(round(v * 100 / res[i % 2])) for i, v in enumerate(bbox))),
+            ('size', (width, height)),
+            ('srs', params.srs),
+            ('format', params.format_mime_type),
+            ('transparent', params.transparent),
+            ('bgcolor', params.bgcolor),
+            ('render_layers', ','.join(actual_layers.keys())),
+        ]
+        skip_params = set(['bbox', 'width', 'height', 'srs', 'crs', 'format',
+            'transparent', 'bgcolor'])
+        for key, value in sorted((k.lower(), v) for k, v in params.iteritems()):
+            if key not in skip_params:
+                parts.append((key, value))
+        return response_cache_key(parts)
+
+    def render_map(self, render_layers, query, map_request, img_opts, coverage, attribution=True):
+        """
+        Render all `render_layers` for `query`. Returns the `LayerMerger`
+        with all rendered layers.
+        """
+        raise_source_errors =  True if self.on_error == 'raise' else False
+        renderer = LayerRenderer(render_layers, query, map_request,
+                                 raise_source_errors=raise_source_errors,
+                                 concurrent_rendering=self.concurrent_layer_renderer)
+
+        merger = LayerMerger()
+        renderer.render(merger)
+
+        if attribution and self.attribution and self.attribution.get('text') and not query.tiled_only:
+            merger.add(attribution_image(self.attribution['text'], query.size))
+        return merger
+
+    def strip_encoder(self, query, img_opts, environ):
+        """
+        Return a `StripEncoder` if the map should be rendered in strips,
+        or ``None``.
+        """
+        if not self.strip_rendering_min_pixels or query.tiled_only:
+            return None
+        if query.size[0] * query.size[1] < self.strip_rendering_min_pixels:
+            return None
+        if 'mapproxy.decorate_img' in environ:
+            # decorate_img requires the complete image
+            return None
+        return strip_encoder(query.size, img_opts,
+            georef=GeoReference(bbox=query.bbox, srs=query.srs))
+
+    def strip_response(self, encoder, render_layers, query, map_request, img_opts, coverage):
+        """
+        Render the map in horizontal strips and stream each encoded strip
+        to the client. Only the tiles and images of one strip are kept
+        in memory.
+
+        The first strip is rendered before the response is returned,
+        so that errors still result in an exception response. The
+        response is never cacheable, as the later strips are not
+        rendered when the headers are sent.
+        """
+        chunks = self._render_strips(encoder, render_layers, query, map_request,
+            img_opts, coverage)
+        try:
+            first_chunk = next(chunks)
+        except IOError as ex:
+            raise RequestError('error while processing image file: %s' % ex,
+                request=map_request)
+
+        resp = Response(chain([first_chunk], chunks),
+            content_type=img_opts.format.mime_type)
+        content_length = encoder.content_length()
+        if content_length is not None:
+            resp.headers['Content-length'] = str(content_length)
+        resp.cache_headers(no_cache=True)
+        return resp
+
+    def _render_strips(self, encoder, render_layers, query, map_request, img_opts, coverage):
+        header = encoder.header()
+        attribution = None
+        if self.attribution and self.attribution.get('text'):
+            attribution = StripAttribution(self.attribution['text'], query.size,
+                min_height=self.strip_rendering_height)
+        strips = strip_bboxes(query.bbox, query.size, self.strip_rendering_height)
+        top = 0
+        for i, (bbox, size) in enumerate(strips):
+            last_strip = i == len(strips) - 1
+            strip_query = MapQuery(bbox, size, query.srs, query.format,
+                deadline=query.deadline)
+            self.update_query_with_fwd_params(strip_query, params=map_request.params,
+                layers=render_layers)
+            merger = self.render_map(render_layers, strip_query, map_request, img_opts,
+                coverage, attribution=False)
+            if attribution:
+                strip_attribution = attribution.strip(top, size)
+                if strip_attribution:
+                    merger.add(strip_attribution)
+            result = merger.merge(size=size, image_opts=img_opts,
+                bbox=bbox, bbox_srs=map_request.params.srs, coverage=coverage)
+            data = header + encoder.encode(result.as_image())
+            header = b''
+            if last_strip:
+                data += encoder.finish()
+            top += size[1]
+            yield data
+
     def capabilities(self, map_request):
         # TODO: debug layer
         # if '__debug__' in map_request.params:
@@ -633,6 +797,8 @@ class LayerRenderer(object):
 
     def _render_layer(self, layer):
         try:
+            # skip layers that start after the deadline
+            check_deadline(self.query.deadline)
             layer_img = layer.get_map(self.query)
             if layer_img is not None:
                 layer_img.opacity = layer.opacity
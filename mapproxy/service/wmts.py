@@ -95,14 +95,21 @@ class WMTSServer(Server):
 
         limited_to = self.authorize_tile_layer(tile_layer, request)
 
-        def decorate_img(image):
-            query_extent = tile_layer.grid.srs.srs_code, tile_layer.tile_bbox(request)
-            return self.decorate_img(image, 'wmts', [tile_layer.name], request.http.environ, query_extent)
+        resp = self.not_modified_response(tile_layer, request, coverage=limited_to,
+            max_age=self.max_tile_age)
+        if resp:
+            return resp
+
+        decorate_img = None
+        if 'mapproxy.decorate_img' in request.http.environ:
+            def decorate_img(image):
+                query_extent = tile_layer.grid.srs.srs_code, tile_layer.tile_bbox(request)
+                return self.decorate_img(image, 'wmts', [tile_layer.name], request.http.environ, query_extent)
 
         tile = tile_layer.render(request, coverage=limited_to, decorate_img=decorate_img)
 
         # set the content_type to tile.format and not to request.format ( to support mixed_mode)
-        resp = Response(tile.as_buffer(), content_type='image/' + tile.format)
+        resp = self.tile_response(tile, content_type='image/' + tile.format)
         resp.cache_headers(tile.timestamp, etag_data=(tile.timestamp, tile.size),
                            max_age=self.max_tile_age)
         resp.make_conditional(request.http)
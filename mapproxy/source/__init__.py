@@ -17,6 +17,8 @@
 Map/information sources for layers or tile cache.
 """
 
+import time
+
 from mapproxy.layer import (
     MapLayer, MapExtent, DefaultMapExtent, MapError, MapBBOXError, BlankImage, InfoLayer
 )
@@ -33,6 +35,16 @@ class SourceBBOXError(SourceError, MapBBOXError):
 class InvalidSourceQuery(SourceError):
     pass
 
+class DeadlineExceeded(SourceError):
+    pass
+
+def check_deadline(deadline):
+    """
+    Raise `DeadlineExceeded` if the `deadline` (``time.time()``) has passed.
+    """
+    if deadline is not None and time.time() >= deadline:
+        raise DeadlineExceeded('request deadline exceeded')
+
 class InfoSource(InfoLayer):
     def get_info(self, query):
         raise NotImplementedError
@@ -72,7 +72,8 @@ class TiledSource(MapLayer):
         tile_coord = next(tiles)
 
         try:
-            return self.client.get_tile(tile_coord, format=query.format)
+            return self.client.get_tile(tile_coord, format=query.format,
+                deadline=query.deadline)
         except HTTPClientError as e:
             if self.error_handler:
                 resp = self.error_handler.handle(e.response_code, query)
@@ -73,6 +73,15 @@ def create_is_x_functions():
 create_is_x_functions()
 del create_is_x_functions
 
+def is_webp(fileobj):
+    if not hasattr(fileobj, 'read'):
+        fileobj = BytesIO(fileobj)
+    pos = fileobj.tell()
+    fileobj.seek(0)
+    header = fileobj.read(12)
+    fileobj.seek(pos)
+    return header.startswith(b'RIFF') and header[8:12] == b'WEBP'
+
 
 def is_transparent(img_data):
     data = BytesIO(img_data)
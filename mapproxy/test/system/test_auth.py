@@ -515,6 +515,26 @@ class TestTMSAuth(SysTest):
         assert resp.content_type == "image/png"
         assert resp.content_length > 1000
 
+    def test_get_tile_batch(self, app):
+
+        def auth(service, layers, environ, query_extent, **kw):
+            assert service == "tms"
+            assert query_extent[0] == "EPSG:900913"
+            # extent of all requested tiles
+            assert bbox_equals(
+                query_extent[1], (-20037508.342789244, -20037508.342789244,
+                    20037508.342789244, 0)
+            )
+            assert len(layers) == 1
+            return {"authorized": "partial", "layers": {"layer1": {"tile": True}}}
+
+        resp = app.get(
+            TMS_CAPABILITIES_REQ + "/layer1_EPSG900913/0/batch.png?tiles=0,0,1,0",
+            extra_environ={"mapproxy.authorize": auth},
+        )
+        assert resp.content_type == "multipart/mixed"
+        assert resp.body.count(b"Content-Type: image/png") == 2
+
     def test_get_tile_global_limited_to(self, app):
         # check with limited_to for all layers
         auth_dict = {
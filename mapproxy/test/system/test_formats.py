@@ -186,6 +186,7 @@ class TestTMS(SysTest):
             ["jpeg_cache_tiff_source", "tiffsource", "jpeg", "jpeg", "tiff"],
             ["png_cache_all_source", "allsource", "png", "png", "png"],
             ["jpeg_cache_png_jpeg_source", "pngjpegsource", "jpeg", "jpeg", "jpeg"],
+            ["webp_cache_png_source", "allsource", "webp", "webp", "png"],
         ],
     )
     def test_get_cached(
@@ -18,13 +18,16 @@ import time
 import shutil
 import tempfile
 
+from mapproxy.compat.image import Image
 from mapproxy.config.loader import load_configuration
 from mapproxy.cache.tile import Tile
 from mapproxy.image import ImageSource
 from mapproxy.image.opts import ImageOptions
 from mapproxy.seed.seeder import seed
 from mapproxy.seed.cleanup import cleanup
+from mapproxy.seed.distributed import SQLiteWorkQueue, distribute, seed_worker
 from mapproxy.seed.config import load_seed_tasks_conf
+from mapproxy.seed.util import ProgressLog, ProgressStore
 from mapproxy.config import local_base_config
 from mapproxy.util.fs import ensure_directory
 
@@ -100,6 +103,57 @@ class SeedTestBase(SeedTestEnvironment):
             seed(tasks, dry_run=False)
             cleanup(cleanup_tasks, verbose=False, dry_run=False)
 
+    def test_seed_journal(self):
+        progress_file = os.path.join(self.dir, 'progress')
+        with tmp_image((256, 256), format='png') as img:
+            img_data = img.read()
+            expected_req = ({'path': r'/service?LAYERS=foo&SERVICE=WMS&FORMAT=image%2Fpng'
+                                  '&REQUEST=GetMap&VERSION=1.1.1&bbox=-180.0,-90.0,180.0,90.0'
+                                  '&width=256&height=128&srs=EPSG:4326'},
+                            {'body': img_data, 'headers': {'content-type': 'image/png'}})
+            with mock_httpd(('localhost', 42423), [expected_req]):
+                with local_base_config(self.mapproxy_conf.base_config):
+                    seed_conf  = load_seed_tasks_conf(self.seed_conf_file, self.mapproxy_conf)
+                    tasks = seed_conf.seeds(['one'])
+                    logger = ProgressLog(silent=True,
+                        progress_store=ProgressStore(progress_file, continue_seed=False))
+                    seed(tasks, dry_run=False, progress_logger=logger)
+
+        assert os.path.exists(progress_file + '.journal')
+        os.remove(os.path.join(self.dir, 'cache/one_EPSG4326/00/000/000/000/000/000/000.png'))
+
+        with local_base_config(self.mapproxy_conf.base_config):
+            # continued seed skips tile from the journal, no request
+            store = ProgressStore(progress_file, continue_seed=True)
+            journal = store.journal(tasks[0])
+            assert journal.done == 1
+            assert journal.is_done((0, 0, 0))
+            journal.close()
+            # continue without tree position
+            store.status = {}
+            seed(tasks, dry_run=False, progress_logger=ProgressLog(silent=True, progress_store=store))
+            assert not self.tile_exists((0, 0, 0))
+
+            store.remove()
+            assert not os.path.exists(progress_file + '.journal')
+
+    def test_seed_distributed(self):
+        queue = SQLiteWorkQueue(os.path.join(self.dir, 'queue.sqlite'))
+        with tmp_image((256, 256), format='png') as img:
+            img_data = img.read()
+            expected_req = ({'path': r'/service?LAYERS=foo&SERVICE=WMS&FORMAT=image%2Fpng'
+                                  '&REQUEST=GetMap&VERSION=1.1.1&bbox=-180.0,-90.0,180.0,90.0'
+                                  '&width=256&height=128&srs=EPSG:4326'},
+                            {'body': img_data, 'headers': {'content-type': 'image/png'}})
+            with mock_httpd(('localhost', 42423), [expected_req]):
+                with local_base_config(self.mapproxy_conf.base_config):
+                    seed_conf  = load_seed_tasks_conf(self.seed_conf_file, self.mapproxy_conf)
+                    tasks = seed_conf.seeds(['one'])
+                    assert distribute(tasks, queue) == 1
+                    assert seed_worker(tasks, queue) == 1
+        assert self.tile_exists((0, 0, 0))
+        assert queue.stats() == {'pending': 0, 'leased': 0, 'done': 1}
+
 class TestSeedOldConfiguration(SeedTestBase):
     seed_conf_name = 'seed_old.yaml'
     mapproxy_conf_name = 'seed_mapproxy.yaml'
@@ -137,6 +191,13 @@ class TestSeed(SeedTestBase):
     mapproxy_conf_name = 'seed_mapproxy.yaml'
     empty_ogrdata = 'empty_ogrdata.geojson'
 
+    def setup(self):
+        SeedTestBase.setup(self)
+        # referenced by the prioritized and expired seeds
+        shutil.copy(os.path.join(FIXTURE_DIR, 'heatmap.txt'), self.dir)
+        shutil.copytree(os.path.join(FIXTURE_DIR, 'seed_expire'),
+            os.path.join(self.dir, 'expire'))
+
     def test_cleanup_levels(self):
         seed_conf  = load_seed_tasks_conf(self.seed_conf_file, self.mapproxy_conf)
         cleanup_tasks = seed_conf.cleanups(['cleanup'])
@@ -201,6 +262,70 @@ class TestSeed(SeedTestBase):
         assert not self.tile_exists((2, 0, 3))
         assert self.tile_exists((4, 0, 3))
 
+    def test_seed_from_cached_level(self):
+        for x in range(4):
+            for y in range(2):
+                tile = self.make_tile((x, y, 2))
+                with open(tile, 'wb') as f:
+                    f.write(create_tmp_image((256, 256), color=(255, 0, 0) if x < 2 else (0, 0, 255)))
+
+        seed_conf = load_seed_tasks_conf(self.seed_conf_file, self.mapproxy_conf)
+        tasks = seed_conf.seeds(['downsample'])
+        assert [t.levels for t in tasks] == [[1], [0]]
+        # no requests to the source
+        with mock_httpd(('localhost', 42423), []):
+            seed(tasks, dry_run=False)
+
+        assert self.tile_exists((0, 0, 1))
+        assert self.tile_exists((1, 0, 1))
+        assert self.tile_exists((0, 0, 0))
+        tile_dir = os.path.join(self.dir, 'cache/one_EPSG4326/')
+        with open(tile_dir + '01/000/000/000/000/000/000.png', 'rb') as f:
+            assert Image.open(f).convert('RGB').getpixel((128, 128)) == (255, 0, 0)
+        with open(tile_dir + '00/000/000/000/000/000/000.png', 'rb') as f:
+            img = Image.open(f).convert('RGB')
+            assert img.getpixel((64, 192)) == (255, 0, 0)
+            assert img.getpixel((192, 192)) == (0, 0, 255)
+
+    def test_seed_prioritized(self):
+        with local_base_config(self.mapproxy_conf.base_config):
+            seed_conf = load_seed_tasks_conf(self.seed_conf_file, self.mapproxy_conf)
+            tasks = seed_conf.seeds(['prioritized'])
+            assert len(tasks) == 1
+            priority = tasks[0].priority
+            assert priority.weight((-90, -45, -45, 0)) == 10
+            assert priority.weight((45, -45, 90, 0)) == 0
+            assert priority.heatmap == [((90.0, 0.0, 180.0, 90.0), 10)]
+
+            seed(tasks, dry_run=True)
+
+    def test_seed_expired(self):
+        # north east tile of level 1 in webmercator, in both files,
+        # expired right now
+        for name in ('a.txt', 'b.txt'):
+            os.utime(os.path.join(self.dir, 'expire', name), None)
+        # level 2 is a single meta tile, created after the expire files
+        self.make_tile((0, 0, 2), timestamp=time.time() + 60)
+        west_tile = self.make_tile((0, 0, 3), timestamp=time.time() - 60)
+        east_tile = self.make_tile((4, 0, 3), timestamp=time.time() - 60)
+
+        expected_req = ({'path': r'/service?LAYERS=foo&SERVICE=WMS&FORMAT=image%2Fpng'
+                              '&REQUEST=GetMap&VERSION=1.1.1&bbox=-14.0625,-90.0,180.0,90.0'
+                              '&width=1104&height=1024&srs=EPSG:4326'},
+                        {'body': create_tmp_image((1104, 1024)),
+                         'headers': {'content-type': 'image/png'}})
+        with mock_httpd(('localhost', 42423), [expected_req]):
+            with local_base_config(self.mapproxy_conf.base_config):
+                seed_conf = load_seed_tasks_conf(self.seed_conf_file, self.mapproxy_conf)
+                tasks = seed_conf.seeds(['expired'])
+                assert len(tasks[0].expired_tiles) == 1
+                assert abs(tasks[0].refresh_timestamp - time.time()) < 10
+                seed(tasks, dry_run=False)
+
+        # only the expired meta tile of level 3 was created again
+        assert os.path.getmtime(east_tile) > time.time() - 10
+        assert os.path.getmtime(west_tile) < time.time() - 10
+
     def test_seed_mbtile(self):
         with tmp_image((256, 256), format='png') as img:
             img_data = img.read()
@@ -301,8 +426,8 @@ class TestSeed(SeedTestBase):
     def test_active_seed_tasks(self):
         with local_base_config(self.mapproxy_conf.base_config):
             seed_conf = load_seed_tasks_conf(self.seed_conf_file, self.mapproxy_conf)
-            assert len(seed_conf.seed_tasks_names()) == 5
-            assert len(seed_conf.seeds()) == 5
+            assert len(seed_conf.seed_tasks_names()) == 8
+            assert len(seed_conf.seeds()) == 8
 
     def test_seed_refresh_remove_before_from_file(self):
         # tile already there but old
@@ -0,0 +1,69 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from io import BytesIO
+
+import pytest
+
+from mapproxy.test.image import create_tmp_image, is_png, tmp_image
+from mapproxy.test.http import mock_httpd
+from mapproxy.test.system import SysTest
+
+
+@pytest.fixture(scope="module")
+def config_file():
+    return "sendfile.yaml"
+
+
+TILE_PATH = "tms_cache_EPSG900913/01/000/000/000/000/000/001.png"
+
+
+class TestSendfile(SysTest):
+
+    @pytest.fixture
+    def cached_tile(self, cache_dir):
+        cache_dir.join(TILE_PATH).write_binary(
+            create_tmp_image((256, 256), format="png"), ensure=True)
+
+    @pytest.mark.parametrize("url", [
+        "/tms/1.0.0/tms_cache/0/0/1.png",
+        "/kml/tms_cache/1/0/1.png",
+        "/wmts/tms_cache/GLOBAL_MERCATOR/01/0/0.png",
+    ])
+    def test_cached_tile(self, app, cached_tile, url):
+        resp = app.get(url)
+        assert resp.content_type == "image/png"
+        assert resp.headers["X-Accel-Redirect"] == "/mapproxy-cache/" + TILE_PATH
+        assert resp.body == b""
+        assert "ETag" in resp.headers
+
+    def test_conditional_request(self, app, cached_tile):
+        resp = app.get("/tms/1.0.0/tms_cache/0/0/1.png")
+        resp = app.get("/tms/1.0.0/tms_cache/0/0/1.png",
+            headers={"If-None-Match": resp.headers["ETag"]}, status=304)
+        assert resp.body == b""
+
+    def test_created_tile(self, app, cache_dir):
+        with tmp_image((256, 256), format="png") as img:
+            expected_req = (
+                {"path": r"/tiles/01/000/000/000/000/000/001.png"},
+                {"body": img.read(), "headers": {"content-type": "image/png"}},
+            )
+            with mock_httpd(("localhost", 42423), [expected_req]):
+                resp = app.get("/tms/1.0.0/tms_cache/0/0/1.png")
+        # new tiles are sent by MapProxy
+        assert "X-Accel-Redirect" not in resp.headers
+        assert is_png(BytesIO(resp.body))
+        assert cache_dir.join(TILE_PATH).check()
@@ -0,0 +1,71 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from mapproxy.cache.admission import admission_stats, _limits
+from mapproxy.test.image import img_from_buf
+from mapproxy.test.system import SysTest
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def config_file():
+    return "tile_admission.yaml"
+
+
+@pytest.fixture
+def saturated():
+    limits = [_limits["error_cache"], _limits["blank_cache"]]
+    for limit in limits:
+        assert limit.acquire()
+    yield
+    for limit in limits:
+        limit.release()
+
+
+class TestTileAdmission(SysTest):
+
+    def test_admitted(self, app):
+        resp = app.get("/tms/1.0.0/error/EPSG3857/1/0/0.png")
+        assert resp.content_type == "image/png"
+        stats = admission_stats()
+        assert stats["error_cache"]["in_flight"] == 0
+        assert stats["error_cache"]["admitted"] >= 1
+        assert stats["global"]["max_concurrent"] == 10
+        assert stats["error_cache.pool"]["size"] == 2
+        assert "blank_cache.pool" not in stats
+
+    def test_overload_error(self, app, saturated):
+        shed = admission_stats()["error_cache"]["shed"]
+        resp = app.get("/tms/1.0.0/error/EPSG3857/1/0/0.png", status=503)
+        assert resp.headers["Retry-After"] == "20"
+        assert resp.headers["Cache-Control"] == "no-cache, no-store"
+        assert admission_stats()["error_cache"]["shed"] == shed + 1
+
+    def test_overload_blank(self, app, saturated):
+        resp = app.get("/tms/1.0.0/blank/EPSG3857/1/0/0.png")
+        assert resp.content_type == "image/png"
+        assert resp.headers["Cache-Control"] == "no-cache, no-store"
+        img = img_from_buf(resp.body)
+        assert img.getcolors() == [(256 * 256, (255, 255, 255))]
+
+    def test_overload_wms(self, app, saturated):
+        resp = app.get(
+            "/service?SERVICE=WMS&VERSION=1.1.1&REQUEST=GetMap&LAYERS=error"
+            "&SRS=EPSG:900913&BBOX=0,0,10000,10000&WIDTH=100&HEIGHT=100"
+            "&FORMAT=image/png&STYLES=",
+            status=503,
+        )
+        assert resp.headers["Retry-After"] == "20"
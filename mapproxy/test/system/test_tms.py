@@ -20,6 +20,7 @@ from io import BytesIO
 
 import pytest
 
+from mapproxy.cache.file import FileCache
 from mapproxy.compat.image import Image
 from mapproxy.test.image import is_jpeg, tmp_image
 from mapproxy.test.http import mock_httpd
@@ -144,6 +145,73 @@ class TestTMS(SysTest):
                 assert len(colors) >= 2
                 assert sorted(colors)[-1][1] == (0, 0, 0)
 
+    def _copy_cached_tile(self, cache_dir, x, y):
+        target = cache_dir.join(
+            "wms_cache_EPSG900913/01/000/000/%03d/000/000/%03d.jpeg" % (x, y))
+        target.dirpath().ensure(dir=True)
+        cache_dir.join("wms_cache_EPSG900913/01/000/000/000/000/000/001.jpeg").copy(target)
+
+    def _parse_multipart(self, resp):
+        assert resp.content_type == "multipart/mixed"
+        boundary = resp.headers["Content-Type"].split("boundary=")[1]
+        parts = resp.body.split(b"--" + boundary.encode("ascii"))
+        assert parts[0] == b""
+        assert parts[-1] == b"--\r\n"
+        result = []
+        for part in parts[1:-1]:
+            header, data = part[2:-2].split(b"\r\n\r\n", 1)
+            headers = dict(line.split(b": ", 1) for line in header.split(b"\r\n"))
+            assert int(headers[b"Content-Length"]) == len(data)
+            result.append((headers[b"Content-Location"].decode("ascii"), data))
+        return result
+
+    def test_get_tile_batch(self, app, cache_dir, fixture_cache_data, monkeypatch):
+        self._copy_cached_tile(cache_dir, 1, 1)
+        load_tiles = FileCache.load_tiles
+        calls = []
+
+        def counting_load_tiles(self, tiles, with_metadata=False):
+            calls.append([t.coord for t in tiles])
+            return load_tiles(self, tiles, with_metadata)
+
+        monkeypatch.setattr(FileCache, "load_tiles", counting_load_tiles)
+        resp = app.get("/tms/1.0.0/wms_cache/0/batch.jpeg?tiles=0,1,1,1,0,1")
+        # all tiles are loaded at once, duplicate tiles are removed
+        assert calls == [[(0, 1, 1), (1, 1, 1)]]
+        parts = self._parse_multipart(resp)
+        assert [url for url, _ in parts] == [
+            "http://localhost/tms/1.0.0/wms_cache/0/0/1.jpeg",
+            "http://localhost/tms/1.0.0/wms_cache/0/1/1.jpeg",
+        ]
+        for _, data in parts:
+            assert is_jpeg(BytesIO(data))
+
+    def test_get_tile_batch_range(self, app, cache_dir, fixture_cache_data):
+        self._copy_cached_tile(cache_dir, 1, 1)
+        resp = app.get("/tiles/wms_cache/1/batch.jpeg?range=0,1,1,1")
+        parts = self._parse_multipart(resp)
+        assert [url for url, _ in parts] == [
+            "http://localhost/tiles/wms_cache/1/0/1.jpeg",
+            "http://localhost/tiles/wms_cache/1/1/1.jpeg",
+        ]
+
+    @pytest.mark.parametrize("query,msg", [
+        ("", "missing tiles"),
+        ("tiles=0,0,1", "expected x,y pairs"),
+        ("tiles=0,a", "invalid tiles"),
+        ("range=0,0,100,100", "too many tiles"),
+    ])
+    def test_get_tile_batch_invalid(self, app, query, msg):
+        resp = app.get("/tms/1.0.0/wms_cache/0/batch.jpeg?" + query, status=404)
+        assert msg in resp.lxml.xpath("/TileMapServerError/Message/text()")[0]
+
+    def test_get_tile_batch_out_of_bounds(self, app):
+        resp = app.get("/tms/1.0.0/wms_cache/0/batch.jpeg?tiles=0,0,2,0", status=404)
+        assert (
+            "outside the bounding box"
+            in resp.lxml.xpath("/TileMapServerError/Message/text()")[0]
+        )
+
 
 class TestTileService(SysTest):
 
@@ -224,6 +292,19 @@ class TestTileService(SysTest):
         assert resp.status == "200 OK"
         self._check_tile_resp(resp)
 
+    def test_if_none_match_metadata_only(
+        self, app, cache_dir, base_config, fixture_cache_data, monkeypatch
+    ):
+        etag, max_age = self._update_timestamp(cache_dir, base_config)
+
+        def load_tiles(*args, **kw):
+            raise AssertionError("tile loaded")
+
+        monkeypatch.setattr(FileCache, "load_tiles", load_tiles)
+        resp = app.get("/tiles/wms_cache/1/0/1.jpeg", headers={"If-None-Match": etag})
+        assert resp.status == "304 Not Modified"
+        self._check_cache_control_headers(resp, etag, max_age)
+
     @pytest.mark.parametrize(
         "date,modified",
         [
@@ -20,6 +20,8 @@ import contextlib
 
 import pytest
 
+from mapproxy.compat.image import Image
+from mapproxy.image import TIFF_MODELTIEPOINTTAG
 from mapproxy.script.export import export_command
 from mapproxy.test.image import tmp_image
 from mapproxy.test.http import mock_httpd
@@ -108,6 +110,69 @@ class TestUtilExport(object):
         assert os.path.exists(os.path.join(self.dest, "1", "1", "0.png"))
         assert os.path.exists(os.path.join(self.dest, "1", "1", "1.png"))
 
+    def test_cog(self):
+        self.args += [
+            "--grid",
+            "GLOBAL_MERCATOR",
+            "--dest",
+            self.dest + ".tiff",
+            "--levels",
+            "1",
+            "--source",
+            "tms_cache",
+            "--fetch-missing-tiles",
+            "--type",
+            "cog",
+        ]
+        with tile_server([(0, 0, 1), (0, 1, 1), (1, 0, 1), (1, 1, 1)]):
+            with capture() as (out, err):
+                export_command(self.args)
+
+        img = Image.open(self.dest + ".tiff")
+        assert img.size == (512, 512)
+        assert img.info["compression"] == "tiff_adobe_deflate"
+        assert img.tag_v2[TIFF_MODELTIEPOINTTAG][3:5] == pytest.approx((-20037508.34, 20037508.34))
+        # internal overview
+        img.seek(1)
+        assert img.size == (256, 256)
+
+    def test_cog_multiple_levels(self):
+        self.args += [
+            "--grid",
+            "GLOBAL_MERCATOR",
+            "--dest",
+            self.dest,
+            "--levels",
+            "0,1",
+            "--source",
+            "tms_cache",
+            "--type",
+            "cog",
+        ]
+        with capture() as (out, err):
+            with pytest.raises(SystemExit):
+                export_command(self.args)
+        assert "single level" in err.getvalue()
+
+    def test_cog_max_pixels(self):
+        self.args += [
+            "--grid",
+            "GLOBAL_MERCATOR",
+            "--dest",
+            self.dest + ".tiff",
+            "--levels",
+            "10",
+            "--source",
+            "tms_cache",
+            "--type",
+            "cog",
+        ]
+        with capture() as (out, err):
+            with pytest.raises(SystemExit):
+                export_command(self.args)
+        assert "limited to 100000000 pixels" in err.getvalue()
+        assert not os.path.exists(self.dest + ".tiff")
+
     def test_force(self):
         self.args += [
             "--grid",
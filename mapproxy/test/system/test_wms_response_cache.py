@@ -0,0 +1,125 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from mapproxy.cache.response import MemoryResponseCache
+from mapproxy.request.wms import WMS111MapRequest
+from mapproxy.service.wms import LayerRenderer
+from mapproxy.test.image import img_from_buf
+from mapproxy.test.system import SysTest
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def config_file():
+    return "wms_response_cache.yaml"
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    calls = []
+    render = LayerRenderer.render
+
+    def counting_render(self, layer_merger):
+        calls.append(self.query.bbox)
+        return render(self, layer_merger)
+
+    monkeypatch.setattr(LayerRenderer, "render", counting_render)
+    return calls
+
+
+class TestWMSResponseCache(SysTest):
+
+    @pytest.fixture(autouse=True)
+    def empty_response_cache(self, app):
+        wms = app.app.handlers["service"].services["wms"]
+        wms.response_cache = MemoryResponseCache(max_size=1024 * 1024, ttl=60)
+
+    def setup(self):
+        self.common_map_req = WMS111MapRequest(
+            url="/service?",
+            param=dict(
+                service="WMS",
+                version="1.1.1",
+                bbox="-180,-80,180,80",
+                width="200",
+                height="100",
+                layers="debug",
+                srs="EPSG:4326",
+                format="image/png",
+                styles="",
+                request="GetMap",
+            ),
+        )
+
+    def test_cached_response(self, app, renders):
+        resp = app.get(self.common_map_req)
+        assert resp.content_type == "image/png"
+        assert img_from_buf(resp.body).size == (200, 100)
+        assert len(renders) == 1
+
+        resp2 = app.get(self.common_map_req)
+        assert resp2.content_type == "image/png"
+        assert resp2.body == resp.body
+        assert len(renders) == 1
+
+    def test_rounded_bbox(self, app, renders):
+        app.get(self.common_map_req)
+        # less than 1/100 pixel
+        self.common_map_req.params["bbox"] = "-180.001,-80,180,80.001"
+        app.get(self.common_map_req)
+        assert len(renders) == 1
+
+    @pytest.mark.parametrize("param,value", [
+        ("bbox", "-180,-80,180,79"),
+        ("format", "image/jpeg"),
+        ("transparent", "true"),
+        ("bgcolor", "0xff0000"),
+        ("layers", "debug,direct"),
+        ("time", "2020-01-01"),
+    ])
+    def test_different_params(self, app, renders, param, value):
+        app.get(self.common_map_req)
+        self.common_map_req.params[param] = value
+        app.get(self.common_map_req)
+        assert len(renders) == 2
+
+    def test_authorized_layers(self, app, renders):
+        self.common_map_req.params["layers"] = "debug,direct"
+
+        def auth(service, layers, **kw):
+            return {
+                "authorized": "partial",
+                "layers": {"debug": {"map": True}, "direct": {"map": False}},
+            }
+
+        app.get(self.common_map_req)
+        # implicitly removed layer results in different response
+        app.get(self.common_map_req, extra_environ={"mapproxy.authorize": auth}, status=403)
+        self.common_map_req.params["layers"] = "debug"
+        app.get(self.common_map_req, extra_environ={"mapproxy.authorize": auth})
+        assert len(renders) == 2
+
+    def test_limited_to_not_cached(self, app, renders):
+        def auth(service, layers, **kw):
+            return {
+                "authorized": "partial",
+                "limited_to": {"geometry": [-180, -80, 0, 80], "srs": "EPSG:4326"},
+                "layers": {"debug": {"map": True}},
+            }
+
+        for _ in range(2):
+            app.get(self.common_map_req, extra_environ={"mapproxy.authorize": auth})
+        assert len(renders) == 2
@@ -0,0 +1,76 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from mapproxy.image import TIFF_MODELTIEPOINTTAG
+from mapproxy.request.wms import WMS111MapRequest
+from mapproxy.test.image import img_from_buf
+from mapproxy.test.system import SysTest
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def config_file():
+    return "wms_strip_rendering.yaml"
+
+
+class TestWMSStripRendering(SysTest):
+
+    def setup(self):
+        self.common_map_req = WMS111MapRequest(
+            url="/service?",
+            param=dict(
+                service="WMS",
+                version="1.1.1",
+                bbox="-180,-80,180,80",
+                width="600",
+                height="300",
+                layers="debug",
+                srs="EPSG:4326",
+                format="image/png",
+                styles="",
+                request="GetMap",
+            ),
+        )
+
+    def test_get_map_png(self, app):
+        resp = app.get(self.common_map_req)
+        assert resp.content_type == "image/png"
+        img = img_from_buf(resp.body)
+        assert img.size == (600, 300)
+        assert img.mode == "RGB"
+        assert len(img.getcolors(256 * 256)) > 1
+        # one IDAT chunk for each strip
+        assert resp.body.count(b"IDAT") == 6
+        # later strips are not rendered when the headers are sent
+        assert resp.headers["Cache-Control"] == "no-cache, no-store"
+
+    def test_get_map_geotiff(self, app):
+        self.common_map_req.params["format"] = "image/GeoTIFF"
+        resp = app.get(self.common_map_req)
+        assert resp.content_type == "image/GeoTIFF"
+        assert resp.headers["Content-length"] == str(len(resp.body))
+        img = img_from_buf(resp.body)
+        assert img.size == (600, 300)
+        assert img.tag_v2[TIFF_MODELTIEPOINTTAG] == (0.0, 0.0, 0.0, -180.0, 80.0, 0.0)
+
+    def test_small_map(self, app):
+        self.common_map_req.params["width"] = "200"
+        self.common_map_req.params["height"] = "100"
+        resp = app.get(self.common_map_req)
+        assert resp.content_type == "image/png"
+        assert resp.body.count(b"IDAT") == 1
+        img = img_from_buf(resp.body)
+        assert img.size == (200, 100)
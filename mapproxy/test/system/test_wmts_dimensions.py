@@ -19,6 +19,7 @@ import functools
 
 import pytest
 
+from mapproxy.cache.dummy import DummyCache
 from mapproxy.test.image import create_tmp_image
 from mapproxy.test.http import MockServ
 from mapproxy.test.helper import validate_with_xsd
@@ -123,6 +124,26 @@ class TestWMTS(SysTest):
             )
         assert resp.content_type == "image/png"
 
+    def test_get_tile_dimension_if_modified_since(self, app, monkeypatch):
+        # cached tiles do not depend on the dimensions, conditional
+        # requests are not answered from the tile metadata
+        def load_tile_metadata(self, tile):
+            tile.timestamp = 1000000000
+            tile.size = 100
+
+        monkeypatch.setattr(DummyCache, "load_tile_metadata", load_tile_metadata)
+        serv = MockServ(42423, bbox_aware_query_comparator=True)
+        serv.expects(
+            DIMENSION_LAYER_BASE_REQ + "&Time=2012-11-15T00:00:00&elevation=1000"
+        ).returns(TEST_TILE)
+        with serv:
+            resp = app.get(
+                "/wmts/dimension_layer/GLOBAL_MERCATOR/2012-11-15T00:00:00/1000/01/0/0.png",
+                headers={"If-Modified-Since": "Sat, 01 Jan 2050 00:00:00 GMT"},
+            )
+        assert resp.status == "200 OK"
+        assert resp.content_type == "image/png"
+
     def test_get_tile_invalid_dimension(self, app):
         self.check_invalid_parameter(
             app,
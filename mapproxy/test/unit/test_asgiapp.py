@@ -0,0 +1,148 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+
+import pytest
+
+if sys.version_info < (3, 5):
+    pytest.skip("ASGI requires Python 3.5", allow_module_level=True)
+
+import asyncio
+
+from mapproxy.asgiapp import ASGIApp, wsgi_environ
+from mapproxy.response import Response
+
+
+def http_scope(path='/', query_string=b'', headers=None):
+    return {
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'root_path': '',
+        'query_string': query_string,
+        'headers': headers or [],
+        'server': ('example.org', 8080),
+        'client': ('10.0.0.1', 12345),
+    }
+
+
+def call(app, scope, messages):
+    sent = []
+    messages = list(messages)
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(app(scope, receive, send))
+    finally:
+        loop.close()
+    return sent
+
+
+def request(wsgi_app, scope=None):
+    sent = call(ASGIApp(wsgi_app, threads=2), scope or http_scope(),
+        [{'type': 'http.request', 'body': b''}])
+    assert sent[0]['type'] == 'http.response.start'
+    assert all(m['type'] == 'http.response.body' for m in sent[1:])
+    assert not sent[-1].get('more_body')
+    return sent[0], b''.join(m['body'] for m in sent[1:])
+
+
+class TestASGIApp(object):
+
+    def test_list_response(self):
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'image/png')])
+            return [b'foo', b'bar']
+        start, body = request(app)
+        assert start['status'] == 200
+        assert start['headers'] == [(b'content-type', b'image/png')]
+        assert body == b'foobar'
+
+    def test_lazy_start_response(self):
+        def app(environ, start_response):
+            start_response('404 Not Found', [])
+            yield b'not'
+            yield b' found'
+        start, body = request(app)
+        assert start['status'] == 404
+        assert body == b'not found'
+
+    @pytest.mark.parametrize('size', [0, 100, 1024 * 1024])
+    def test_file_response(self, size):
+        from io import BytesIO
+        data = b'x' * size
+        def app(environ, start_response):
+            return Response(BytesIO(data), mimetype='image/png')(environ, start_response)
+        start, body = request(app)
+        assert start['status'] == 200
+        assert (b'content-length', str(size).encode('ascii')) in start['headers']
+        assert body == data
+
+    def test_close(self):
+        closed = []
+        class Result(object):
+            def __iter__(self):
+                return iter([b'foo'])
+            def close(self):
+                closed.append(True)
+        def app(environ, start_response):
+            start_response('200 OK', [])
+            return Result()
+        start, body = request(app)
+        assert body == b'foo'
+        assert closed == [True]
+
+    def test_disconnect(self):
+        def app(environ, start_response):
+            raise AssertionError('should not be called')
+        sent = call(ASGIApp(app), http_scope(), [{'type': 'http.disconnect'}])
+        assert sent == []
+
+    def test_lifespan(self):
+        app = ASGIApp(None)
+        sent = call(app, {'type': 'lifespan'}, [
+            {'type': 'lifespan.startup'},
+            {'type': 'lifespan.shutdown'},
+        ])
+        assert sent == [
+            {'type': 'lifespan.startup.complete'},
+            {'type': 'lifespan.shutdown.complete'},
+        ]
+
+
+def test_wsgi_environ():
+    scope = http_scope(path='/tms/1.0.0/\xfc', query_string=b'a=b', headers=[
+        (b'host', b'example.org'),
+        (b'content-type', b'text/xml'),
+        (b'x-forwarded-for', b'1.1.1.1'),
+        (b'x-forwarded-for', b'2.2.2.2'),
+    ])
+    environ = wsgi_environ(scope, b'body')
+    assert environ['PATH_INFO'] == u'/tms/1.0.0/\xfc'.encode('utf-8').decode('latin-1')
+    assert environ['QUERY_STRING'] == 'a=b'
+    assert environ['SERVER_NAME'] == 'example.org'
+    assert environ['SERVER_PORT'] == '8080'
+    assert environ['REMOTE_ADDR'] == '10.0.0.1'
+    assert environ['HTTP_HOST'] == 'example.org'
+    assert environ['CONTENT_TYPE'] == 'text/xml'
+    assert environ['HTTP_X_FORWARDED_FOR'] == '1.1.1.1,2.2.2.2'
+    assert environ['wsgi.input'].read() == b'body'
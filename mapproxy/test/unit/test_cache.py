@@ -27,6 +27,12 @@ from collections import defaultdict
 
 import pytest
 
+from mapproxy.cache.admission import (
+    CreationLimit,
+    CreationPool,
+    TileCreationAdmission,
+    TileCreationOverload,
+)
 from mapproxy.cache.base import TileLocker
 from mapproxy.cache.file import FileCache
 from mapproxy.cache.tile import Tile, TileManager
@@ -48,7 +54,7 @@ from mapproxy.layer import (
     SRSConditional,
 )
 from mapproxy.request.wms import WMS111MapRequest
-from mapproxy.source import InvalidSourceQuery, SourceError
+from mapproxy.source import DeadlineExceeded, InvalidSourceQuery, SourceError
 from mapproxy.source.tile import TiledSource
 from mapproxy.source.wms import WMSSource
 from mapproxy.source.error import HTTPSourceErrorHandler
@@ -87,7 +93,7 @@ class MockTileClient(object):
     def __init__(self):
         self.requested_tiles = []
 
-    def get_tile(self, tile_coord, format=None):
+    def get_tile(self, tile_coord, format=None, deadline=None):
         self.requested_tiles.append(tile_coord)
         return ImageSource(create_debug_img((256, 256)))
 
@@ -179,6 +185,58 @@ class TestTileManagerStaleTiles(object):
         tile_mgr._expire_timestamp = time.time()
         assert tile_mgr.is_stale(Tile((0, 0, 1)))
 
+    def test_are_cached_are_stale(self, tile_mgr, file_cache):
+        create_cached_tile(Tile((0, 0, 1)), file_cache, timestamp=time.time()-3600)
+        create_cached_tile(Tile((1, 0, 1)), file_cache)
+        coords = [(0, 0, 1), (1, 0, 1), (0, 0, 2), None]
+        assert tile_mgr.are_cached(coords) == [True, True, False, True]
+        assert tile_mgr.are_stale(coords) == [False, False, False, False]
+
+        tile_mgr._expire_timestamp = time.time() - 60
+        assert tile_mgr.are_cached(coords) == [False, True, False, True]
+        assert tile_mgr.are_stale(coords) == [True, False, False, False]
+        assert tile_mgr.are_stale(coords) == [tile_mgr.is_stale(c) for c in coords[:3]] + [False]
+
+
+class TestTileManagerAdmission(object):
+
+    @pytest.fixture
+    def admission(self):
+        return TileCreationAdmission([CreationLimit('test', 1)])
+
+    @pytest.fixture
+    def tile_mgr(self, file_cache, tile_locker, admission):
+        grid = TileGrid(SRS(4326), bbox=[-180, -90, 180, 90])
+        source = TiledSource(grid, MockTileClient())
+        return TileManager(grid, file_cache, [source], 'png', locker=tile_locker,
+            image_opts=ImageOptions(format='image/png'), admission=admission)
+
+    def test_overload(self, tile_mgr, file_cache, admission):
+        create_cached_tile(Tile((0, 0, 1)), file_cache)
+        create_cached_tile(Tile((1, 0, 1)), file_cache, timestamp=time.time()-3600)
+        tile_mgr._expire_timestamp = time.time() - 60
+        assert admission.acquire()
+
+        # cached and stale tiles
+        tiles = tile_mgr.load_tile_coords([(0, 0, 1), (1, 0, 1)])
+        assert [t.source.as_buffer().read() for t in tiles] == [b'foo', b'foo']
+
+        with pytest.raises(TileCreationOverload):
+            tile_mgr.load_tile_coords([(0, 0, 1), (0, 0, 0)])
+
+        admission.serve_stale = False
+        with pytest.raises(TileCreationOverload):
+            tile_mgr.load_tile_coord((1, 0, 1))
+
+        admission.on_overload = 'blank'
+        tile = tile_mgr.load_tile_coord((1, 0, 1))
+        assert isinstance(tile.source, BlankImageSource)
+        assert not tile.cacheable
+        assert admission.limits[0].stats()['shed'] == 4
+
+        admission.release()
+        assert admission.limits[0].stats()['in_flight'] == 0
+
 
 class TestTileManagerRemoveTiles(object):
     @pytest.fixture
@@ -272,6 +330,12 @@ class TestTileManagerSource(object):
             [((-180.0, -90.0, 0.0, 90.0), (256, 256), SRS(4326)),
              ((0.0, -90.0, 180.0, 90.0), (256, 256), SRS(4326))]
 
+    def test_deadline(self, tile_mgr, mock_file_cache, mock_source):
+        with pytest.raises(DeadlineExceeded):
+            tile_mgr.load_tile_coord((0, 0, 1), deadline=time.time() - 1)
+        assert mock_source.requested == []
+        assert mock_file_cache.stored_tiles == set()
+
 class MockWMSClient(object):
     def __init__(self):
         self.requested = []
@@ -429,6 +493,74 @@ class TestTileManagerLocking(object):
 
 
 
+class TestTileManagerCreationPool(object):
+
+    @pytest.fixture
+    def admission(self):
+        return TileCreationAdmission([CreationLimit('test', 2)],
+            pool=CreationPool('test.pool', 2), timeout=0.5)
+
+    @pytest.fixture
+    def file_cache(self, tmpdir):
+        return RecordFileCache(tmpdir.strpath, 'png')
+
+    @pytest.fixture
+    def tile_mgr(self, file_cache, tile_locker, admission):
+        grid = TileGrid(SRS(4326), bbox=[-180, -90, 180, 90])
+        image_opts = ImageOptions(format='image/png')
+        return TileManager(grid, file_cache, [SlowMockSource()], 'png',
+            image_opts=image_opts, locker=tile_locker, admission=admission,
+        )
+
+    def test_create(self, tile_mgr, file_cache, admission):
+        tiles = tile_mgr.load_tile_coords([(0, 0, 1), (1, 0, 1)])
+        assert all(is_png(t.source.as_buffer()) for t in tiles)
+        assert file_cache.stored_tiles == set([(0, 0, 1), (1, 0, 1)])
+        assert admission.limits[0].stats()['in_flight'] == 0
+
+    def test_timeout(self, tile_mgr, file_cache, admission):
+        admission.timeout = 0.01
+        with pytest.raises(TileCreationOverload):
+            tile_mgr.load_tile_coord((0, 0, 1))
+        assert admission.pool.stats()['timeouts'] == 1
+
+        # tile is created in the background
+        for _ in range(50):
+            if admission.limits[0].stats()['in_flight'] == 0:
+                break
+            time.sleep(0.01)
+        assert file_cache.stored_tiles == set([(0, 0, 1)])
+        assert admission.limits[0].stats()['in_flight'] == 0
+
+    def test_source_error(self, tile_mgr, admission):
+        tile_mgr.sources = [ErrorSource()]
+        with pytest.raises(Exception) as excinfo:
+            tile_mgr.load_tile_coord((0, 0, 1))
+        assert excinfo.value.args[0] == 'source error'
+        assert admission.limits[0].stats()['in_flight'] == 0
+
+    def test_cancel_queued(self, admission):
+        started = threading.Event()
+        proceed = threading.Event()
+        def block():
+            started.set()
+            proceed.wait()
+
+        done = []
+        tasks = [admission.pool.submit(block, (), done=lambda: done.append(1)) for _ in range(2)]
+        assert started.wait(1)
+        # pool is busy, third task is queued and cancelled
+        task = admission.pool.submit(lambda: 1/0, (), done=lambda: done.append(2))
+        assert not admission.pool.wait(task, 0.01)
+        assert done == [2]
+
+        proceed.set()
+        for t in tasks:
+            assert t.wait(1)
+        assert task.result() is None
+        assert sorted(done) == [1, 1, 2]
+
+
 class TestTileManagerMultipleSources(object):
     @pytest.fixture
     def source_base(self):
@@ -669,6 +801,48 @@ class TestCacheMapLayer(object):
             set([(512, 257, 10), (513, 256, 10), (512, 256, 10), (513, 257, 10)])
         assert result.size == (50, 50)
 
+    @pytest.mark.parametrize("resampling,bbox,size,expected", [
+        ['bicubic', (-180, -90, 180, 90), (300, 150), 1],
+        ['bicubic', (-180, -90, 180, 90), (128, 64), 4],
+        ['bicubic', (-180, -90, 180, 90), (200, 100), 2],
+        ['nearest', (-180, -90, 180, 90), (128, 64), 1],
+        ['bilinear', (-20037508.34, -20037508.34, 20037508.34, 20037508.34), (64, 64), 2],
+    ])
+    def test_decode_scale(self, mock_file_cache, mock_wms_client, tile_locker,
+        resampling, bbox, size, expected):
+        grid = TileGrid(SRS(4326), bbox=[-180, -90, 180, 90])
+        image_opts = ImageOptions(resampling=resampling)
+        tile_mgr = TileManager(grid, mock_file_cache, [WMSSource(mock_wms_client)], 'png',
+            image_opts=image_opts, locker=tile_locker)
+        layer = CacheMapLayer(tile_mgr, image_opts=default_image_opts)
+        query = MapQuery(bbox, size, SRS(4326) if bbox[0] == -180 else SRS(900913), 'png')
+        # level 1 with 2x1 tiles of 256x256
+        assert layer._decode_scale(query, (-180, -90, 180, 90), (2, 1)) == expected
+
+    def test_max_tile_limit(self, mock_file_cache, mock_wms_client, tile_locker):
+        grid = TileGrid(SRS(4326), bbox=[-180, -90, 180, 90])
+        tile_mgr = TileManager(grid, mock_file_cache, [WMSSource(mock_wms_client)], 'png',
+            image_opts=ImageOptions(resampling='nearest', format='png'), locker=tile_locker)
+        layer = CacheMapLayer(tile_mgr, image_opts=default_image_opts, max_tile_limit=4)
+        with pytest.raises(MapBBOXError):
+            layer.get_map(MapQuery((-180, -90, 180, 90), (600, 300), SRS(4326), 'png'))
+        assert mock_file_cache.stored_tiles == set()
+
+    def test_max_tile_limit_res_factor(self, mock_file_cache, mock_wms_client, tile_locker):
+        grid = TileGrid(SRS(4326), bbox=[-180, -90, 180, 90])
+        tile_mgr = TileManager(grid, mock_file_cache, [WMSSource(mock_wms_client)], 'png',
+            image_opts=ImageOptions(resampling='nearest', format='png'), locker=tile_locker)
+        layer = CacheMapLayer(tile_mgr, image_opts=default_image_opts,
+            max_tile_limit=4, max_tile_limit_res_factor=2)
+        # level 2 needs 8 tiles, level 1 only two
+        result = layer.get_map(MapQuery((-180, -90, 180, 90), (600, 300), SRS(4326), 'png'))
+        assert mock_file_cache.stored_tiles == set([(0, 0, 1), (1, 0, 1)])
+        assert result.size == (600, 300)
+
+        # level 1 is more than 2 times coarser, level 2 needs 8 tiles
+        with pytest.raises(MapBBOXError):
+            layer.get_map(MapQuery((-180, -90, 180, 90), (1200, 600), SRS(4326), 'png'))
+
 class TestCacheMapLayerWithExtent(object):
     @pytest.fixture
     def source(self, mock_wms_client):
@@ -749,7 +923,7 @@ class MockHTTPClient(object):
     def __init__(self):
         self.requested = []
 
-    def open(self, url, data=None):
+    def open(self, url, data=None, deadline=None):
         self.requested.append(url)
         w = int(re.search(r'width=(\d+)', url, re.IGNORECASE).group(1))
         h = int(re.search(r'height=(\d+)', url, re.IGNORECASE).group(1))
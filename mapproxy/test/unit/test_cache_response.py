@@ -0,0 +1,98 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import time
+
+from mapproxy.cache.response import MemoryResponseCache, FileResponseCache
+
+
+class TestMemoryResponseCache(object):
+
+    def test_get_put(self):
+        cache = MemoryResponseCache(max_size=100, ttl=60)
+        assert cache.get('foo') is None
+        cache.put('foo', b'x' * 10, 'image/png')
+        resp = cache.get('foo')
+        assert resp.data == b'x' * 10
+        assert resp.content_type == 'image/png'
+        assert cache.size == 10
+
+        cache.put('foo', b'y' * 20, 'image/png')
+        assert cache.get('foo').data == b'y' * 20
+        assert cache.size == 20
+
+    def test_max_size(self):
+        cache = MemoryResponseCache(max_size=100, ttl=60)
+        cache.put('a', b'x' * 40, 'image/png')
+        cache.put('b', b'x' * 40, 'image/png')
+        # a is now more recently used than b
+        assert cache.get('a')
+        cache.put('c', b'x' * 40, 'image/png')
+        assert cache.get('b') is None
+        assert cache.get('a')
+        assert cache.get('c')
+        assert cache.size == 80
+
+        # larger than the cache
+        cache.put('d', b'x' * 101, 'image/png')
+        assert cache.get('d') is None
+        assert cache.size == 80
+
+    def test_ttl(self):
+        cache = MemoryResponseCache(max_size=100, ttl=60)
+        cache.put('a', b'x' * 40, 'image/png')
+        cache._responses['a'].timestamp -= 61
+        assert cache.get('a') is None
+        assert cache.size == 0
+
+
+class TestFileResponseCache(object):
+
+    def test_get_put(self, tmpdir):
+        cache = FileResponseCache(tmpdir.strpath, max_size=1000, ttl=60, namespace='abc')
+        assert cache.get('0123') is None
+        cache.put('0123', b'\x89PNG\n\x00data', 'image/png')
+        assert tmpdir.join('abc', '01', '0123').check()
+        resp = cache.get('0123')
+        assert resp.data == b'\x89PNG\n\x00data'
+        assert resp.content_type == 'image/png'
+
+        # other configuration
+        cache = FileResponseCache(tmpdir.strpath, max_size=1000, ttl=60, namespace='def')
+        assert cache.get('0123') is None
+
+    def test_ttl(self, tmpdir):
+        cache = FileResponseCache(tmpdir.strpath, max_size=1000, ttl=60)
+        cache.put('0123', b'data', 'image/png')
+        location = tmpdir.join('01', '0123').strpath
+        os.utime(location, (time.time() - 61, time.time() - 61))
+        assert cache.get('0123') is None
+
+        cache.cleanup()
+        assert not os.path.exists(location)
+
+    def test_cleanup(self, tmpdir):
+        cache = FileResponseCache(tmpdir.strpath, max_size=1000, ttl=0)
+        now = time.time()
+        for i in range(5):
+            key = '%04d' % i
+            cache.put(key, b'x' * 300, 'image/png')
+            os.utime(tmpdir.join(key[:2], key).strpath, (now - 10 + i, now - 10 + i))
+
+        cache.cleanup()
+        # oldest files are removed
+        assert [cache.get('%04d' % i) is not None for i in range(5)] == [
+            False, False, True, True, True]
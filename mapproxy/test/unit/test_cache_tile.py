@@ -78,6 +78,26 @@ class TileCacheTestBase(object):
     def test_is_cached_none(self):
         assert self.cache.is_cached(Tile(None))
 
+    def test_are_cached(self):
+        self.create_cached_tile(self.create_tile((1, 0, 4)))
+        self.create_cached_tile(self.create_tile((3, 2, 4)))
+        self.create_cached_tile(self.create_tile((0, 0, 1)))
+        tiles = [Tile(None), Tile((0, 0, 4)), Tile((1, 0, 4)), Tile((3, 2, 4)),
+            Tile((0, 0, 1)), Tile((1, 0, 1)), self.create_tile((5, 5, 4))]
+        assert self.cache.are_cached(tiles) == [True, False, True, True, True, False, True]
+        assert self.cache.are_cached([]) == []
+
+    def test_are_cached_metadata(self):
+        self.create_cached_tile(self.create_tile((1, 0, 4)))
+        tiles = [Tile((1, 0, 4)), Tile((0, 0, 4))]
+        assert self.cache.are_cached(tiles, with_metadata=True) == [True, False]
+        tile = Tile((1, 0, 4))
+        try:
+            self.cache.load_tile_metadata(tile)
+        except NotImplementedError:
+            pytest.skip("cache does not support metadata")
+        assert tiles[0].timestamp == tile.timestamp
+
     def test_load_tile_none(self):
         assert self.cache.load_tile(Tile(None))
 
@@ -217,6 +237,12 @@ class TestFileTileCache(TileCacheTestBase):
             '04', '000', '000', '005', '000', '000', '012.png' )
         assert os.path.exists(tile_location), tile_location
 
+    def test_are_cached_list_dir(self):
+        # list directories of all tiles
+        self.cache.list_dir_min_tiles = 1
+        self.test_are_cached()
+        self.test_are_cached_metadata()
+
     @pytest.mark.skipif(sys.platform == 'win32',
                         reason='link_single_color_tiles not supported on windows')
     def test_single_color_tile_store(self):
@@ -360,6 +386,32 @@ class TestMBTileCache(TileCacheTestBase):
         assert self.cache.store_tile(self.create_tile((0, 0, 1))) == True
 
 
+class TestMBTileCacheMetadata(object):
+    def setup(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = MBTilesLevelCache(self.cache_dir)
+
+    def teardown(self):
+        self.cache.cleanup()
+        shutil.rmtree(self.cache_dir)
+
+    def test_load_metadata(self):
+        self.cache.store_tile(Tile((0, 0, 1), ImageSource(BytesIO(b'foobar'))))
+        tile = Tile((0, 0, 1))
+        self.cache.load_tile_metadata(tile)
+        assert tile.timestamp == pytest.approx(time.time(), abs=10)
+        assert tile.size == 6
+        # metadata only, without the tile data
+        assert tile.source is None
+
+    def test_load_metadata_missing_tile(self):
+        self.cache.store_tile(Tile((0, 0, 1), ImageSource(BytesIO(b'foobar'))))
+        tile = Tile((1, 0, 1))
+        self.cache.load_tile_metadata(tile)
+        assert tile.timestamp is None
+        assert tile.source is None
+
+
 class TestQuadkeyFileTileCache(TileCacheTestBase):
     def setup(self):
         TileCacheTestBase.setup(self)
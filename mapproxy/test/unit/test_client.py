@@ -185,6 +185,23 @@ class TestHTTPClient(object):
         assert 0.1 <= duration1 < 0.5, duration1
         assert 0.5 <= duration2 < 0.9, duration2
 
+    def test_deadline(self):
+        test_req = ({'path': '/', 'req_assert_function': lambda x: time.sleep(0.9) or True},
+                    {'body': b'nothing'})
+
+        client = HTTPClient(timeout=5)
+        with mock_httpd(TESTSERVER_ADDRESS, [test_req]):
+            start = time.time()
+            with pytest.raises(HTTPClientError) as excinfo:
+                client.open(TESTSERVER_URL + '/', deadline=time.time() + 0.2)
+            assert 'timed out' in excinfo.value.args[0]
+            assert time.time() - start < 0.5
+
+        # no request after the deadline
+        with pytest.raises(HTTPClientError) as excinfo:
+            client.open(TESTSERVER_URL + '/', deadline=time.time() - 1)
+        assert 'deadline exceeded' in excinfo.value.args[0]
+
 
 # root certificates for google.com, if no ca-certificates.cert
 # file is found
@@ -30,7 +30,7 @@ class MockHTTPClient(object):
     def __init__(self):
         self.requested = []
 
-    def open(self, url, data=None):
+    def open(self, url, data=None, deadline=None):
         self.requested.append(url)
         result = BytesIO(b'{}')
         result.seek(0)
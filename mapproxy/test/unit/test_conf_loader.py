@@ -524,6 +524,58 @@ class TestWMSSourceConfiguration(object):
         except ImportError:
             raise SkipTest('no ssl support')
 
+    @pytest.mark.parametrize("seed,per_host,name,rate,burst", [
+        (False, False, 'osm (serve)', 5, 1),
+        (True, False, 'osm (seed)', 20, 10),
+        (True, True, 'localhost:8080 (seed)', 20, 10),
+    ])
+    def test_rate_limit(self, tmpdir, seed, per_host, name, rate, burst):
+        conf_dict = {
+            'globals': {
+                'cache': {'lock_dir': tmpdir.strpath},
+                'http': {'rate_limit': {
+                    'requests_per_second': 5,
+                    'seed_requests_per_second': 20,
+                    'seed_burst': 10,
+                    'per_host': per_host,
+                }},
+            },
+            'sources': {
+                'osm': {
+                    'type': 'wms',
+                    'req': {
+                        'url': 'http://localhost:8080/service?',
+                        'layers': 'base',
+                    },
+                },
+            },
+        }
+
+        conf = ProxyConfiguration(conf_dict, seed=seed)
+        source = conf.sources['osm'].source({'format': 'image/png'})
+        rate_limit = source.client.http_client.rate_limit
+        assert rate_limit.name == name
+        assert rate_limit.rate == rate
+        assert rate_limit.burst == burst
+        assert rate_limit.state_file.startswith(tmpdir.strpath)
+
+    def test_without_rate_limit(self):
+        conf_dict = {
+            'sources': {
+                'osm': {
+                    'type': 'wms',
+                    'http': {'rate_limit': {'seed_requests_per_second': 20}},
+                    'req': {
+                        'url': 'http://localhost:8080/service?',
+                        'layers': 'base',
+                    },
+                },
+            },
+        }
+        conf = ProxyConfiguration(conf_dict)
+        source = conf.sources['osm'].source({'format': 'image/png'})
+        assert source.client.http_client.rate_limit is None
+
 
 class TestBandMergeConfig(object):
 
@@ -934,6 +986,41 @@ class TestImageOptions(object):
 
         conf.globals.image_options.image_opts({}, 'image/jpeg')
 
+    @pytest.mark.parametrize("encoding_options", [
+        {'preset': 'foo'},
+        {'png_compress_level': 10},
+        {'png_compress_level': 'fast'},
+        {'png_compress_strategy': 'foo'},
+        {'jpeg_optimize': 'yes'},
+        {'jpeg_encoder': 'foo'},
+        {'webp_quality': 101},
+        {'webp_method': 7},
+        {'webp_lossless': 'yes'},
+        {'tiff_cog': 'yes'},
+        {'tiff_cog': True, 'tiff_compression': 'tiff_lzw'},
+        {'tiff_tile_size': 100},
+    ])
+    def test_encoder_options_errors(self, encoding_options):
+        conf_dict = {'globals': {'image': {'formats': {
+            'image/png': {'encoding_options': encoding_options}
+        }}}}
+        with pytest.raises(ConfigurationError):
+            ProxyConfiguration(conf_dict)
+
+    def test_encoder_options(self):
+        conf_dict = {'globals': {'image': {'formats': {
+            'image/png': {'encoding_options': {
+                'preset': 'speed',
+                'png_compress_level': 3,
+                'png_compress_strategy': 'filtered',
+                'jpeg_optimize': True,
+            }}
+        }}}}
+        conf = ProxyConfiguration(conf_dict)
+        image_opts = conf.globals.image_options.image_opts({}, 'image/png')
+        assert image_opts.encoding_options['preset'] == 'speed'
+        assert image_opts.encoding_options['png_compress_level'] == 3
+
 class TestCoverageValidation(object):
     def test_union(self):
         conf = {
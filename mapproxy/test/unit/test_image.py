@@ -21,7 +21,7 @@ from io import BytesIO
 
 import pytest
 
-from mapproxy.compat.image import Image, ImageDraw, PIL_VERSION
+from mapproxy.compat.image import Image, ImageDraw, PIL_VERSION, has_libimagequant_support
 from mapproxy.image import (
     BlankImageSource,
     GeoReference,
@@ -46,7 +46,9 @@ from mapproxy.test.image import (
     is_png,
     is_jpeg,
     is_tiff,
+    is_webp,
     create_tmp_image_file,
+    create_tmp_image_buf,
     check_format,
     create_debug_img,
     create_image,
@@ -133,6 +135,73 @@ class TestImageSource(object):
         assert qdf > q50
         assert q50 > lzw
 
+    def test_png_compress_level(self):
+        def encoded_size(encoding_options):
+            ir = ImageSource(create_debug_img((200, 200)), PNG_FORMAT)
+            buf = ir.as_buffer(ImageOptions(format="png", colors=0, encoding_options=encoding_options))
+            img = Image.open(buf)
+            assert img.size == (200, 200)
+            buf.seek(0)
+            return len(buf.read())
+
+        fast = encoded_size({'png_compress_level': 1})
+        best = encoded_size({'png_compress_level': 9})
+        none = encoded_size({'png_compress_level': 0})
+        assert none > fast > best
+
+        # explicit options override preset
+        assert encoded_size({'preset': 'speed', 'png_compress_level': 9}) == \
+            encoded_size({'png_compress_level': 9, 'png_compress_strategy': 'rle'})
+        assert encoded_size({'preset': 'size'}) <= encoded_size({})
+
+    def test_jpeg_optimize(self):
+        def encoded_size(encoding_options):
+            ir = ImageSource(create_debug_img((200, 200)), PNG_FORMAT)
+            buf = ir.as_buffer(ImageOptions(format="jpeg", encoding_options=encoding_options))
+            assert is_jpeg(buf)
+            return len(buf.read())
+
+        assert encoded_size({'jpeg_optimize': True}) < encoded_size({})
+        assert encoded_size({'preset': 'size'}) < encoded_size({'preset': 'speed'})
+
+    @pytest.mark.skipif(not has_libimagequant_support(), reason="Pillow without libimagequant")
+    def test_output_formats_png8_libimagequant(self):
+        img = Image.new("RGBA", (100, 100))
+        ir = ImageSource(img, image_opts=PNG_FORMAT)
+        img = Image.open(
+            ir.as_buffer(ImageOptions(colors=256, transparent=True, format="image/png",
+                encoding_options={'quantizer': 'libimagequant'}))
+        )
+        assert img.mode == "P"
+
+    def test_output_formats_webp(self):
+        img = Image.new("RGBA", (100, 100), (255, 0, 0, 100))
+        ir = ImageSource(img, image_opts=PNG_FORMAT)
+        buf = ir.as_buffer(ImageOptions(transparent=True, format="image/webp"))
+        assert is_webp(buf)
+        img = Image.open(buf)
+        assert img.mode == "RGBA"
+        assert img.getpixel((0, 0))[3] == 100
+
+        buf = ir.as_buffer(ImageOptions(transparent=False, format="image/webp"))
+        assert Image.open(buf).mode == "RGB"
+
+    def test_webp_encoding_options(self):
+        def encoded_size(encoding_options):
+            ir = ImageSource(create_debug_img((200, 200)), PNG_FORMAT)
+            buf = ir.as_buffer(ImageOptions(format="webp", transparent=True,
+                encoding_options=encoding_options))
+            assert is_webp(buf)
+            return len(buf.read())
+
+        assert encoded_size({'webp_quality': 90}) > encoded_size({'webp_quality': 50})
+
+        img = create_debug_img((200, 200))
+        ir = ImageSource(img, PNG_FORMAT)
+        buf = ir.as_buffer(ImageOptions(format="webp", transparent=True,
+            encoding_options={'webp_lossless': True}))
+        assert list(Image.open(buf).getdata()) == list(img.getdata())
+
     def test_output_formats_greyscale_png(self):
         img = Image.new("L", (100, 100))
         ir = ImageSource(img, image_opts=PNG_FORMAT)
@@ -339,6 +408,31 @@ class TestMergeAll(object):
         assert img.size == (100, 100)
         assert img.getcolors() == [(100 * 100, (200, 100, 30, 40))]
 
+    @pytest.mark.parametrize("format,mode", [
+        ("jpeg", "RGB"), ("png", "RGB"), ("png", "P"),
+    ])
+    def test_decode_scale(self, format, mode):
+        tiles = [
+            ImageSource(create_tmp_image_buf((256, 256), format=format, color=(255, 0, 0), mode=mode))
+            for _ in range(4)
+        ]
+        tiles[3] = None
+        m = TileMerger(tile_grid=(2, 2), tile_size=(256, 256), decode_scale=4)
+        img_opts = ImageOptions(mode='RGB', bgcolor=(0, 0, 255))
+        result = m.merge(tiles, img_opts)
+        img = result.as_image()
+        assert img.size == (128, 128)
+        colors = sorted(img.getcolors(), reverse=True)
+        assert colors[0][0] >= 3 * 64 * 64 - 256
+        assert colors[0][1][0] > 240
+        assert (64 * 64, (0, 0, 255)) in colors
+
+    def test_decode_scale_one(self):
+        tiles = [ImageSource(create_tmp_image_buf((256, 256), format='jpeg', color='white'))]
+        m = TileMerger(tile_grid=(1, 1), tile_size=(256, 256), decode_scale=2)
+        result = m.merge(tiles, ImageOptions())
+        assert result.as_image().size == (128, 128)
+
     def teardown(self):
         for tile_fname in self.cleanup_tiles:
             if tile_fname and os.path.isfile(tile_fname):
@@ -614,6 +708,21 @@ class TestGeoTIFF(object):
         assert_geotiff_tags(img2, expected_origin, expected_pixel_res, srs, projected)
 
 
+@pytest.mark.parametrize("compression", ['raw', None])
+def test_cog_geotiff_tags(compression):
+    img = ImageSource(create_debug_img((500, 1000)),
+        georef=GeoReference(bbox=(10000, 20000, 11000, 22000), srs=SRS(3857)))
+    encoding_options = {'tiff_cog': True}
+    if compression:
+        encoding_options['tiff_compression'] = compression
+    img_opts = ImageOptions(format='tiff', encoding_options=encoding_options)
+    img2 = ImageSource(img.as_buffer(img_opts)).as_image()
+
+    assert img2.size == (500, 1000)
+    assert img2.tag_v2[322] == 256 # TileWidth
+    assert_geotiff_tags(img2, (10000, 22000), (2.0, 2.0), 3857, True)
+
+
 class TestMesh(object):
 
     def test_mesh_utm(self):
@@ -842,6 +951,7 @@ class TestPeekImageFormat(object):
             ["tiff", "tiff"],
             ["gif", "gif"],
             ["jpeg", "jpeg"],
+            ["webp", "webp"],
             ["bmp", None],
         ],
     )
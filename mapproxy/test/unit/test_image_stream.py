@@ -0,0 +1,216 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from io import BytesIO
+
+import pytest
+
+from mapproxy.compat.image import Image, ImageChops
+from mapproxy.image import GeoReference, TIFF_MODELTIEPOINTTAG, TIFF_GEOKEYDIRECTORYTAG
+from mapproxy.image.opts import ImageOptions
+from mapproxy.image.tiff import CloudOptimizedGeoTIFF, cog_encoder
+from mapproxy.image.message import attribution_image
+from mapproxy.image.stream import (
+    strip_bboxes,
+    strip_encoder,
+    PNGStripEncoder,
+    StripAttribution,
+    TIFFStripEncoder,
+)
+from mapproxy.srs import SRS
+from mapproxy.test.image import create_debug_img
+
+
+def encode_strips(encoder, img, strip_height):
+    buf = BytesIO()
+    buf.write(encoder.header())
+    for top in range(0, img.size[1], strip_height):
+        strip = img.crop((0, top, img.size[0], min(top + strip_height, img.size[1])))
+        buf.write(encoder.encode(strip))
+    buf.write(encoder.finish())
+    buf.seek(0)
+    return buf
+
+
+class TestStripBBoxes(object):
+
+    def test_single_strip(self):
+        assert strip_bboxes((0, 0, 10, 20), (100, 200), 512) == [
+            ((0, 0, 10, 20), (100, 200)),
+        ]
+
+    def test_strips(self):
+        strips = strip_bboxes((-180, -90, 180, 90), (360, 180), 50)
+        assert [size for _, size in strips] == [(360, 50), (360, 50), (360, 50), (360, 30)]
+        assert strips[0][0] == (-180, 40, 180, 90)
+        assert strips[-1][0] == (-180, -90, 180, -60)
+        # strips are continuous
+        for (upper, _), (lower, _) in zip(strips[:-1], strips[1:]):
+            assert upper[1] == lower[3]
+
+
+class TestStripAttribution(object):
+
+    @pytest.mark.parametrize("min_height", [4, 64])
+    def test_strips(self, min_height):
+        # last strip with two rows
+        size = (200, 42)
+        attribution = StripAttribution("foo\nbar", size, min_height=min_height)
+        img = Image.new("RGBA", size)
+        for top in range(0, size[1], 10):
+            strip_size = (size[0], min(10, size[1] - top))
+            strip = attribution.strip(top, strip_size)
+            if strip is not None:
+                assert strip.size == strip_size
+                img.paste(strip.as_image(), (0, top))
+        expected = attribution_image("foo\nbar", size).as_image()
+        assert ImageChops.difference(img, expected).getbbox() is None
+
+    def test_no_overlap(self):
+        attribution = StripAttribution("foo", (200, 1000), min_height=64)
+        assert attribution.strip(0, (200, 100)) is None
+        assert attribution.strip(900, (200, 100)) is not None
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA"])
+@pytest.mark.parametrize("strip_height", [1, 17, 100, 200])
+def test_png_strip_encoder(mode, strip_height):
+    img = create_debug_img((300, 150)).convert(mode)
+    encoder = PNGStripEncoder(img.size, mode)
+    result = Image.open(encode_strips(encoder, img, strip_height))
+    assert result.format == 'PNG'
+    assert result.mode == mode
+    assert result.size == (300, 150)
+    assert ImageChops.difference(result, img).getbbox() is None
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA"])
+@pytest.mark.parametrize("strip_height", [1, 50, 100, 200])
+def test_tiff_strip_encoder(mode, strip_height):
+    img = create_debug_img((300, 150)).convert(mode)
+    georef = GeoReference(bbox=(-180, -90, 180, 90), srs=SRS(4326))
+    encoder = TIFFStripEncoder(img.size, mode, georef=georef)
+    buf = encode_strips(encoder, img, strip_height)
+    assert len(buf.getvalue()) == encoder.content_length()
+
+    result = Image.open(buf)
+    assert result.format == 'TIFF'
+    assert result.mode == mode
+    assert result.size == (300, 150)
+    assert ImageChops.difference(result, img).getbbox() is None
+    assert result.tag_v2[TIFF_MODELTIEPOINTTAG] == (0.0, 0.0, 0.0, -180.0, 90.0, 0.0)
+    assert result.tag_v2[TIFF_GEOKEYDIRECTORYTAG][-1] == 4326
+
+
+class TestStripEncoder(object):
+
+    def test_png(self):
+        encoder = strip_encoder((100, 100), ImageOptions(format='image/png', transparent=True))
+        assert isinstance(encoder, PNGStripEncoder)
+        assert encoder.mode == 'RGBA'
+
+    @pytest.mark.parametrize("opts", [
+        {'colors': 256},
+        {'mode': 'P'},
+        {'mode': 'L', 'colors': 0},
+    ])
+    def test_png_reduced_colors(self, opts):
+        assert strip_encoder((100, 100), ImageOptions(format='image/png', **opts)) is None
+
+    def test_png_preset(self):
+        encoder = strip_encoder((100, 100), ImageOptions(format='image/png',
+            encoding_options={'preset': 'speed'}))
+        assert isinstance(encoder, PNGStripEncoder)
+        assert encoder.mode == 'RGB'
+
+    def test_geotiff(self):
+        encoder = strip_encoder((100, 100), ImageOptions(format='image/GeoTIFF'))
+        assert isinstance(encoder, TIFFStripEncoder)
+
+    def test_compressed_tiff(self):
+        assert strip_encoder((100, 100), ImageOptions(format='image/tiff',
+            encoding_options={'tiff_compression': 'lzw'})) is None
+
+    def test_jpeg(self):
+        assert strip_encoder((100, 100), ImageOptions(format='image/jpeg')) is None
+
+
+class TestCloudOptimizedGeoTIFF(object):
+
+    @pytest.mark.parametrize("compression,tiff_compression", [
+        ("deflate", "tiff_adobe_deflate"),
+        ("raw", "raw"),
+    ])
+    def test_overviews(self, compression, tiff_compression):
+        img = create_debug_img((600, 300))
+        georef = GeoReference(bbox=(-180, -90, 180, 90), srs=SRS(4326))
+        cog = CloudOptimizedGeoTIFF(img, georef=georef, tile_size=128, compression=compression)
+        buf = BytesIO()
+        cog.write(buf)
+        assert len(buf.getvalue()) == cog.content_length()
+
+        buf.seek(0)
+        result = Image.open(buf)
+        assert result.info['compression'] == tiff_compression
+        sizes = []
+        for i in range(4):
+            result.seek(i)
+            sizes.append(result.size)
+            assert result.tag_v2[322] == 128
+        assert sizes == [(600, 300), (300, 150), (150, 75), (75, 38)]
+        with pytest.raises(EOFError):
+            result.seek(4)
+
+        result.seek(0)
+        assert result.mode == 'RGBA'
+        assert ImageChops.difference(result, img).getbbox() is None
+        assert result.tag_v2[TIFF_MODELTIEPOINTTAG] == (0.0, 0.0, 0.0, -180.0, 90.0, 0.0)
+
+    @pytest.mark.parametrize("srs,geokey", [
+        (4326, 4326),
+        (900913, 3857),
+        # not an EPSG code, does not fit into SHORT
+        (102100, 32767),
+    ])
+    def test_georef_srs(self, srs, geokey):
+        img = create_debug_img((100, 100))
+        georef = GeoReference(bbox=(0, 0, 1000, 1000), srs=SRS(srs))
+        buf = BytesIO()
+        CloudOptimizedGeoTIFF(img, georef=georef).write(buf)
+        result = Image.open(buf)
+        assert result.tag_v2[TIFF_GEOKEYDIRECTORYTAG][-1] == geokey
+
+    def test_ifds_before_tiles(self):
+        img = create_debug_img((1000, 1000))
+        cog = CloudOptimizedGeoTIFF(img, tile_size=256)
+        chunks = list(cog)
+        buf = BytesIO(b''.join(chunks))
+        result = Image.open(buf)
+        header_size = len(chunks[0])
+        for i in range(3):
+            result.seek(i)
+            offsets = result.tag_v2[324]
+            assert min(offsets) >= header_size
+
+    def test_cog_encoder(self):
+        img = create_debug_img((100, 100))
+        assert cog_encoder(img, ImageOptions(format='image/tiff')) is None
+        cog = cog_encoder(img, ImageOptions(format='image/tiff',
+            encoding_options={'tiff_cog': True, 'tiff_tile_size': 64}))
+        assert cog.tile_size == 64
+        assert cog.compression == 'deflate'
+        assert cog.mode == 'RGB'
+        assert strip_encoder((100, 100), ImageOptions(format='image/tiff',
+            encoding_options={'tiff_cog': True})) is None
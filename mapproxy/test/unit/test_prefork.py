@@ -0,0 +1,119 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+from mapproxy.util.prefork import create_listener, ThreadPoolWSGIServer, PreforkServer
+
+
+def app(environ, start_response):
+    start_response('200 OK', [('Content-type', 'text/plain')])
+    return [('pid=%d' % os.getpid()).encode('ascii')]
+
+
+def error_app(environ, start_response):
+    raise ValueError('failed')
+
+
+def get(port, status=b'200'):
+    s = socket.create_connection(('127.0.0.1', port), timeout=5)
+    try:
+        s.sendall(b'GET / HTTP/1.0\r\nHost: localhost\r\n\r\n')
+        data = b''
+        while True:
+            chunk = s.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        s.close()
+    header, body = data.split(b'\r\n\r\n', 1)
+    assert header.startswith(b'HTTP/1.0 ' + status)
+    return body
+
+
+class TestThreadPoolWSGIServer(object):
+
+    def test_max_requests(self):
+        sock = create_listener('127.0.0.1', 0)
+        port = sock.getsockname()[1]
+        server = ThreadPoolWSGIServer(sock, app, threads=2, max_requests=3)
+        t = threading.Thread(target=server.serve)
+        t.start()
+        try:
+            for _ in range(3):
+                assert get(port) == ('pid=%d' % os.getpid()).encode('ascii')
+            t.join(5)
+            assert not t.is_alive()
+            assert server.num_requests == 3
+        finally:
+            server.stop()
+            t.join(5)
+            sock.close()
+
+    def test_app_error(self):
+        sock = create_listener('127.0.0.1', 0)
+        port = sock.getsockname()[1]
+        server = ThreadPoolWSGIServer(sock, error_app, threads=1, max_requests=1)
+        t = threading.Thread(target=server.serve)
+        t.start()
+        try:
+            assert get(port, status=b'500') == b'internal error'
+        finally:
+            server.stop()
+            t.join(5)
+            sock.close()
+
+
+@pytest.mark.skipif(sys.platform == 'win32' or not hasattr(os, 'fork'),
+    reason='requires fork')
+class TestPreforkServer(object):
+
+    def test_workers(self):
+        sock = create_listener('127.0.0.1', 0)
+        port = sock.getsockname()[1]
+        sock.close()
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                server = PreforkServer('127.0.0.1', port, lambda: app,
+                    workers=2, threads=2, max_requests=2, reuseport=False)
+                server.serve_forever()
+            finally:
+                os._exit(0)
+
+        try:
+            pids = set()
+            for _ in range(20):
+                try:
+                    pids.add(get(port))
+                except socket.error:
+                    # not started yet, or worker is restarting
+                    time.sleep(0.1)
+            # workers are restarted after two requests
+            assert len(pids) > 2
+            assert ('pid=%d' % pid).encode('ascii') not in pids
+        finally:
+            os.kill(pid, signal.SIGTERM)
+            _, status = os.waitpid(pid, 0)
+        assert os.WIFEXITED(status)
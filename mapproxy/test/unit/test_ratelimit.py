@@ -0,0 +1,100 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import multiprocessing
+import sys
+import time
+
+import pytest
+
+from mapproxy.client.http import HTTPClient
+from mapproxy.client.ratelimit import RateLimit, rate_limit_stats
+from mapproxy.source import DeadlineExceeded
+
+
+def acquire_all(state_file, n, result):
+    limit = RateLimit('test', state_file, rate=50, burst=5)
+    for _ in range(n):
+        limit.acquire()
+        result.put(time.time())
+
+
+class TestRateLimit(object):
+
+    @pytest.fixture
+    def state_file(self, tmpdir):
+        return tmpdir.join('lock', 'ratelimit').strpath
+
+    def test_burst(self, state_file):
+        limit = RateLimit('test', state_file, rate=10, burst=3)
+        start = time.time()
+        for _ in range(3):
+            assert limit.acquire()
+        assert time.time() - start < 0.05
+        assert limit.acquire()
+        assert time.time() - start >= 0.09
+
+        stats = limit.stats()
+        assert stats['requests'] == 4
+        assert stats['delayed'] == 1
+        assert stats['waited'] == pytest.approx(0.1, abs=0.02)
+        assert rate_limit_stats()['test'] == stats
+
+    def test_refill(self, state_file):
+        limit = RateLimit('test', state_file, rate=100, burst=2)
+        limit.acquire()
+        limit.acquire()
+        time.sleep(0.03)
+        start = time.time()
+        limit.acquire()
+        limit.acquire()
+        assert time.time() - start < 0.01
+
+    def test_max_wait(self, state_file):
+        limit = RateLimit('test', state_file, rate=1)
+        assert limit.acquire(max_wait=0)
+        assert not limit.acquire(max_wait=0.5)
+        # no token was taken
+        assert limit.stats()['requests'] == 1
+
+    def test_shared_state(self, state_file):
+        RateLimit('a', state_file, rate=1, burst=2).acquire()
+        limit = RateLimit('b', state_file, rate=1, burst=2)
+        assert limit.acquire(max_wait=0)
+        assert not limit.acquire(max_wait=0)
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="test not supported for Windows")
+    @pytest.mark.skipif(sys.platform == "darwin" and sys.version_info >= (3, 8), reason="test not supported for MacOS with Python >=3.8")
+    def test_multiple_processes(self, state_file):
+        result = multiprocessing.Queue()
+        start = time.time()
+        procs = [multiprocessing.Process(target=acquire_all, args=(state_file, 5, result))
+            for _ in range(3)]
+        for p in procs:
+            p.start()
+        times = sorted(result.get(timeout=30) - start for _ in range(15))
+        for p in procs:
+            p.join()
+        # 5 requests in the first burst, 10 with 50 requests per second
+        assert times[-1] >= 10 / 50.0 - 0.01
+        assert RateLimit('test', state_file, rate=50).stats()['requests'] == 15
+
+    def test_http_client_deadline(self, state_file):
+        limit = RateLimit('test', state_file, rate=1)
+        limit.acquire()
+        client = HTTPClient(rate_limit=limit)
+        with pytest.raises(DeadlineExceeded) as excinfo:
+            client.open('http://localhost:42423/', deadline=time.time() + 0.2)
+        assert 'deadline exceeded' in excinfo.value.args[0]
@@ -706,6 +706,34 @@ class TestTileRequest(object):
         assert tms.layer == "osm"
         assert tms.dimensions == {}
 
+    def test_tms_request_w_layer_spec(self):
+        env = {"PATH_INFO": "/tms/1.0.0/osm/EPSG4326/5/2/3.png", "QUERY_STRING": ""}
+        tms = tile_request(Request(env))
+        assert tms.request_handler_name == "map"
+        assert tms.tile == (2, 3, 5)
+        assert tms.layer == "osm"
+        assert tms.dimensions == {"_layer_spec": "EPSG4326"}
+
+    @pytest.mark.parametrize("path,handler", [
+        ["/tms", "tms_root_resource"],
+        ["/tms/", "tms_root_resource"],
+        ["/tms/1.0.0", "tms_capabilities"],
+        ["/tms/1.0.0/osm", "tms_capabilities"],
+        ["/tms/1.0.0/osm/EPSG4326", "tms_capabilities"],
+        ["/tms/1.0.0/osm/5/2/3.png/1.0.0/osm", "tms_capabilities"],
+        ["/tms/1.0.0/osm/5/2/3.png/foo", "map"],
+    ])
+    def test_tms_request_handler(self, path, handler):
+        env = {"PATH_INFO": path, "QUERY_STRING": ""}
+        tms = tile_request(Request(env))
+        assert isinstance(tms, TMSRequest)
+        assert tms.request_handler_name == handler
+
+    def test_tms_invalid_request(self):
+        env = {"PATH_INFO": "/tms/1.0.0/osm/5/2/foo.png", "QUERY_STRING": ""}
+        with pytest.raises(RequestError):
+            tile_request(Request(env))
+
     def test_tile_request(self):
         env = {"PATH_INFO": "/tiles/1.0.0/osm/5/2/3.png", "QUERY_STRING": ""}
         req = Request(env)
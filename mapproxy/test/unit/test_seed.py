@@ -26,12 +26,18 @@ except ImportError:
 
 import pytest
 
-from mapproxy.seed.seeder import TileWalker, SeedTask, SeedProgress
+from mapproxy.seed.seeder import (
+    TileWalker, SeedTask, SeedProgress, TileWorker, TileWorkerPool, WorkerStats,
+    queue_class,
+)
+from mapproxy.seed.plan import SeedPlanner
+from mapproxy.seed.journal import SeedJournal
+from mapproxy.cache.base import TileCacheBase
 from mapproxy.cache.dummy import DummyLocker
 from mapproxy.cache.tile import TileManager
 from mapproxy.source.tile import TiledSource
 from mapproxy.grid import tile_grid_for_epsg
-from mapproxy.grid import TileGrid
+from mapproxy.grid import TileGrid, MetaGrid
 from mapproxy.srs import SRS
 from mapproxy.util.coverage import BBOXCoverage, GeomCoverage
 from mapproxy.seed.config import before_timestamp_from_options, SeedConfigurationError
@@ -41,7 +47,7 @@ from mapproxy.seed.config import (
     LevelsResolutionList,
     LevelsResolutionRange,
 )
-from mapproxy.seed.util import ProgressStore
+from mapproxy.seed.util import ProgressStore, ProgressLog
 from mapproxy.test.helper import TempFile
 
 
@@ -62,8 +68,11 @@ class MockSeedPool(object):
         for x, y, level in tiles:
             self.seeded_tiles[level].add((x, y))
 
+    def flush_pending(self):
+        pass
+
 
-class MockCache(object):
+class MockCache(TileCacheBase):
 
     def is_cached(self, tile):
         return False
@@ -105,6 +114,27 @@ class TestSeeder(object):
             [(0, 0), (1, 0), (2, 0), (3, 0), (0, 1), (1, 1), (2, 1), (3, 1)]
         )
 
+    @pytest.mark.parametrize("plan_max_meta_tiles", [0, 4096])
+    def test_seed_check_batches(self, monkeypatch, plan_max_meta_tiles):
+        checked = []
+        class CachedTiles(MockCache):
+            def are_cached(self, tiles, with_metadata=False):
+                checked.append(len(tiles))
+                return [t.coord[0] % 2 == 1 for t in tiles]
+        self.tile_mgr.cache = CachedTiles()
+        monkeypatch.setattr(TileWalker, "plan_max_meta_tiles", plan_max_meta_tiles)
+        monkeypatch.setattr(TileWalker, "check_batch_size", 5)
+
+        task = self.make_bbox_task([-180, -90, 180, 90], SRS(4326), [0, 1, 2])
+        seeder = TileWalker(task, self.seed_pool, handle_uncached=True)
+        seeder.walk()
+
+        assert self.seed_pool.seeded_tiles[2] == set([(0, 0), (2, 0), (0, 1), (2, 1)])
+        # 11 tiles, the 8 tiles of the last level in two batches
+        assert sum(checked) == 11
+        assert len(checked) <= 5
+        assert max(checked) > 1
+
     def test_seed_small_bbox(self):
         task = self.make_bbox_task([-45, 0, 180, 90], SRS(4326), [0, 1, 2])
         seeder = TileWalker(task, self.seed_pool, handle_uncached=True)
@@ -180,6 +210,53 @@ class TestSeeder(object):
         assert self.grid.grid_sizes[3] == (20, 10)
         assert len(self.seed_pool.seeded_tiles[3]) == 5 * 5 + 2
 
+    @pytest.mark.skipif(not load_wkt, reason="Shapely not installed")
+    @pytest.mark.skipif(not SeedPlanner.available(), reason="NumPy not installed")
+    @pytest.mark.parametrize("grid_conf", [
+        dict(),
+        dict(origin="ul"),
+        dict(res=[360 / 256, 360 / 720, 360 / 2000, 360 / 5000, 360 / 8000, 360 / 16000]),
+    ])
+    @pytest.mark.parametrize("meta_size", [None, [2, 2], [4, 3]])
+    @pytest.mark.parametrize("levels,skip_geoms", [
+        ([0, 1, 2, 3, 4, 5], 0),
+        ([0, 1, 2, 3, 4, 5], 2),
+        ([1, 4, 5], 0),
+        ([1, 4, 5], 2),
+    ])
+    def test_seed_planned(self, grid_conf, meta_size, levels, skip_geoms, monkeypatch):
+        geom = load_wkt(
+            "POLYGON((10 10, 10 50, -10 60, 10 80, 80 80, 80 10, 10 10),"
+            " (30 30, 60 30, 60 60, 30 60, 30 30))"
+        )
+        self.grid = TileGrid(SRS(4326), bbox=[-180, -90, 180, 90], **grid_conf)
+        self.tile_mgr = TileManager(
+            self.grid, MockCache(), [self.source], "png", locker=DummyLocker(),
+            meta_size=meta_size, bulk_meta_tiles=True,
+        )
+
+        seeded_tiles = []
+        for plan_max_meta_tiles in [0, 16, 4096]:
+            monkeypatch.setattr(TileWalker, "plan_max_meta_tiles", plan_max_meta_tiles)
+            seed_pool = MockSeedPool()
+            task = self.make_geom_task(geom, SRS(4326), levels)
+            seeder = TileWalker(task, seed_pool, handle_uncached=True,
+                skip_geoms_for_last_levels=skip_geoms)
+            assert bool(seeder.planner) == bool(plan_max_meta_tiles)
+            seeder.walk()
+            assert seeder.seed_progress.progress == pytest.approx(1.0)
+            seeded_tiles.append(seed_pool.seeded_tiles)
+
+        if skip_geoms and "res" in grid_conf:
+            # tiles in the unchecked levels are not limited to the bboxes of all
+            # parent tiles if the tiles of irregular grids overlap multiple parents
+            for level in levels:
+                assert seeded_tiles[0][level] <= seeded_tiles[1][level]
+                assert seeded_tiles[0][level] <= seeded_tiles[2][level]
+        else:
+            assert seeded_tiles[0] == seeded_tiles[1]
+            assert seeded_tiles[0] == seeded_tiles[2]
+
     def test_seed_full_bbox_continue(self):
         task = self.make_bbox_task([-180, -90, 180, 90], SRS(4326), [0, 1, 2])
         seed_progress = SeedProgress([(0, 1), (1, 2)])
@@ -287,6 +364,107 @@ class TestProgressStore(object):
             assert store.status == {}
 
 
+class TestSeedJournal(object):
+
+    def setup(self):
+        self.meta_grid = MetaGrid(TileGrid(SRS(4326), bbox=[-180, -90, 180, 90]), (2, 2))
+        self.bbox = (0, 0, 90, 90)
+
+    def journal(self, tmpdir, **kw):
+        return SeedJournal(tmpdir.join("journal").strpath, self.meta_grid, [0, 1, 2, 3, 4],
+            self.bbox, **kw)
+
+    def test_mark_done(self, tmpdir):
+        journal = self.journal(tmpdir)
+        assert journal.ranges[4] == (8, 4, 2, 2, (2, 2), 4096 + 4)
+        assert journal.done == 0
+        assert not journal.is_done((8, 4, 4))
+        journal.mark_done((9, 5, 4))
+        journal.mark_done((8, 4, 4))
+        journal.mark_done((10, 7, 4))
+        # outside of the bbox
+        journal.mark_done((4, 4, 4))
+        journal.mark_done((0, 0, 5))
+        assert journal.is_done((8, 4, 4))
+        assert journal.is_done((10, 6, 4))
+        assert not journal.is_done((10, 4, 4))
+        assert not journal.is_done((4, 4, 4))
+        assert journal.done == 2
+        journal.close()
+
+        journal = self.journal(tmpdir)
+        assert journal.done == 2
+        assert journal.is_done((8, 4, 4))
+        journal.close()
+
+        journal = self.journal(tmpdir, reset=True)
+        assert journal.done == 0
+        assert not journal.is_done((8, 4, 4))
+        journal.close()
+
+    def test_other_task(self, tmpdir):
+        journal = self.journal(tmpdir)
+        journal.mark_done((8, 4, 4))
+        journal.close()
+
+        self.bbox = (0, 0, 180, 90)
+        journal = self.journal(tmpdir)
+        assert journal.done == 0
+        journal.close()
+
+    @pytest.mark.skipif(not SeedPlanner.available(), reason="NumPy not installed")
+    def test_progress(self, tmpdir):
+        journal = self.journal(tmpdir, coverage=BBOXCoverage(self.bbox, SRS(4326)))
+        # meta tiles are limited by the grid size in level 0 and 1
+        assert journal.total == 1 + 1 + 1 + 1 + 4
+        journal.mark_done((8, 4, 4))
+        assert journal.progress() == pytest.approx(1 / 8)
+        journal.close()
+
+    def test_walker(self, tmpdir):
+        grid = TileGrid(SRS(4326), bbox=[-180, -90, 180, 90])
+        tile_mgr = TileManager(grid, MockCache(), [TiledSource(grid, None)], "png",
+            locker=DummyLocker())
+        task = SeedTask(dict(name="", cache_name="", grid_name=""), tile_mgr, [0, 1, 2],
+            refresh_timestamp=None, coverage=BBOXCoverage([-180, -90, 180, 90], SRS(4326)))
+        journal = SeedJournal(tmpdir.join("journal").strpath, MetaGrid(grid, (1, 1)),
+            task.levels, grid.bbox)
+        journal.mark_done((1, 0, 1))
+        journal.mark_done((2, 1, 2))
+
+        seed_pool = MockSeedPool()
+        TileWalker(task, seed_pool, handle_uncached=True, journal=journal).walk()
+        assert seed_pool.seeded_tiles[1] == set([(0, 0)])
+        assert len(seed_pool.seeded_tiles[2]) == 7
+        assert (2, 1) not in seed_pool.seeded_tiles[2]
+        journal.close()
+
+    def test_walker_continue(self, tmpdir):
+        grid = TileGrid(SRS(4326), bbox=[-180, -90, 180, 90])
+        tile_mgr = TileManager(grid, MockCache(), [TiledSource(grid, None)], "png",
+            locker=DummyLocker())
+        task = SeedTask(dict(name="", cache_name="", grid_name=""), tile_mgr, [0, 1, 2],
+            refresh_timestamp=None, coverage=BBOXCoverage([-180, -90, 180, 90], SRS(4326)))
+        journal = SeedJournal(tmpdir.join("journal").strpath, MetaGrid(grid, (1, 1)),
+            task.levels, grid.bbox)
+        # the stored progress is in the second subtile of level 1, but
+        # tiles of the first subtile are not marked (e.g. still queued
+        # when the seed was interrupted)
+        journal.mark_done((0, 0, 0))
+        journal.mark_done((0, 0, 1))
+        journal.mark_done((0, 0, 2))
+        seed_progress = SeedProgress(old_progress_identifier=[(1, 2)])
+
+        seed_pool = MockSeedPool()
+        TileWalker(task, seed_pool, handle_uncached=True, journal=journal,
+            seed_progress=seed_progress).walk()
+        assert 0 not in seed_pool.seeded_tiles
+        assert seed_pool.seeded_tiles[1] == set([(1, 0)])
+        assert seed_pool.seeded_tiles[2] == set([
+            (1, 0), (0, 1), (1, 1), (2, 0), (3, 0), (2, 1), (3, 1)])
+        journal.close()
+
+
 class TestRemovebreforeTimetamp(object):
 
     def test_from_time(self):
@@ -363,3 +541,112 @@ class TestSeedProgress(object):
                     assert not new.already_processed()
             with new.step_down(2, 4):
                 assert not new.already_processed()
+
+
+class MockOut(object):
+
+    def __init__(self):
+        self.data = ''
+
+    def write(self, data):
+        self.data += data
+
+    def flush(self):
+        pass
+
+
+class RecordingTileWorker(TileWorker):
+
+    def process_tiles(self, tiles):
+        self.processed = getattr(self, 'processed', []) + [tiles]
+
+
+class TestTileWorkerPool(object):
+
+    def setup(self):
+        grid = TileGrid(SRS(4326), bbox=[-180, -90, 180, 90])
+        tile_mgr = TileManager(grid, MockCache(), [TiledSource(grid, None)], "png",
+            locker=DummyLocker())
+        self.task = SeedTask(dict(name="", cache_name="", grid_name=""), tile_mgr, [0, 1],
+            refresh_timestamp=None, coverage=BBOXCoverage(grid.bbox, grid.srs))
+
+    def queued_chunks(self, pool):
+        chunks = []
+        while True:
+            chunk = pool.tiles_queue.get(timeout=1)
+            if chunk is None:
+                return chunks
+            chunks.append(chunk)
+
+    def test_fixed_chunk_size(self):
+        # no workers, chunks stay in the queue
+        pool = TileWorkerPool(self.task, RecordingTileWorker, size=0, chunk_size=3)
+        for x in range(7):
+            pool.process([(x, 0, 3)], SeedProgress())
+        pool.stop()
+        pool.tiles_queue.put(None)
+        chunks = self.queued_chunks(pool)
+        assert [len(c) for c in chunks] == [3, 3, 1]
+        assert chunks[2] == [[(6, 0, 3)]]
+        assert pool.chunks == 3
+        assert pool.meta_tiles == 7
+
+    def test_flush_pending(self):
+        pool = TileWorkerPool(self.task, RecordingTileWorker, size=0, chunk_size=3)
+        pool.process([(0, 0, 3)], SeedProgress())
+        pool.flush_pending()
+        assert pool.chunks == 0
+        pool.chunk_start -= pool.chunk_time + 0.1
+        pool.flush_pending()
+        assert pool.chunks == 1
+        assert pool.chunk == []
+
+    def test_force_stop(self):
+        pool = TileWorkerPool(self.task, RecordingTileWorker, size=0, chunk_size=3)
+        pool.process([(0, 0, 3)], SeedProgress())
+        pool.stop(force=True)
+        assert pool.chunk == []
+        # stop after forced stop does not flush
+        pool.stop()
+        assert pool.chunks == 0
+        assert pool.tiles_queue.empty()
+
+    def test_adaptive_chunk_size(self):
+        pool = TileWorkerPool(self.task, RecordingTileWorker, size=0)
+        assert pool.current_chunk_size() == 1
+        pool.stats.add(0.01, 1)
+        assert pool.current_chunk_size() == 20
+        pool.stats.add(0.00001, 999)
+        assert pool.current_chunk_size() == pool.max_chunk_size
+        pool.stats.add(1999.99, 1000)
+        assert pool.current_chunk_size() == 1
+
+    def test_dry_run(self):
+        pool = TileWorkerPool(self.task, RecordingTileWorker, size=0, dry_run=True)
+        pool.process([(0, 0, 1)], SeedProgress())
+        pool.stop()
+        assert pool.chunks == 0
+        assert pool.meta_tiles == 1
+
+    def test_worker(self):
+        stats = WorkerStats()
+        tiles_queue = queue_class(4)
+        worker = RecordingTileWorker(self.task, tiles_queue, None, stats=stats)
+        tiles_queue.put([[(0, 0, 1)], [(1, 0, 1)]])
+        tiles_queue.put([[(0, 0, 0)]])
+        tiles_queue.put(None)
+        worker.work_loop()
+        assert worker.processed == [[(0, 0, 1)], [(1, 0, 1)], [(0, 0, 0)]]
+        assert stats.meta_tiles == 3
+        assert stats.tile_time() is not None
+
+    def test_log_throughput(self):
+        out = MockOut()
+        logger = ProgressLog(out=out)
+        logger.log_throughput(100, 10, 2.0, 0.05)
+        assert ('100 meta tiles in 10 chunks, 0:00:02 (50.0 meta tiles/s),'
+            ' 50.0ms per meta tile') in out.data
+
+        out = MockOut()
+        ProgressLog(out=out, silent=True).log_throughput(100, 10, 2.0)
+        assert out.data == ''
@@ -0,0 +1,231 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import multiprocessing
+import os
+import sys
+import time
+
+import pytest
+
+from mapproxy.cache.dummy import DummyLocker
+from mapproxy.cache.tile import TileManager
+from mapproxy.grid import TileGrid
+from mapproxy.seed import distributed
+from mapproxy.seed.distributed import (
+    SQLiteWorkQueue,
+    RedisWorkQueue,
+    WorkRange,
+    distribute,
+    open_work_queue,
+    partition_task,
+    seed_worker,
+    task_key,
+)
+from mapproxy.seed.seeder import SeedTask, TileWalker
+from mapproxy.source.tile import TiledSource
+from mapproxy.srs import SRS
+from mapproxy.util.coverage import BBOXCoverage
+from mapproxy.test.unit.test_seed import MockCache, MockSeedPool
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+def seed_task(levels, bbox=(-180, -90, 180, 90), name='test'):
+    grid = TileGrid(SRS(4326), bbox=[-180, -90, 180, 90])
+    tile_mgr = TileManager(grid, MockCache(), [TiledSource(grid, None)], "png",
+        locker=DummyLocker())
+    return SeedTask(dict(name=name, cache_name="cache", grid_name="grid"), tile_mgr, levels,
+        refresh_timestamp=None, coverage=BBOXCoverage(bbox, SRS(4326)))
+
+
+def claim_all(queue_file, worker, result):
+    queue = SQLiteWorkQueue(queue_file)
+    while True:
+        work_range = queue.claim(worker, 60)
+        if work_range is None:
+            return
+        result.put(work_range.id)
+        queue.complete(work_range, worker)
+
+
+class TestPartition(object):
+
+    def test_ranges(self):
+        task = seed_task([0, 1, 2, 3, 4])
+        ranges = partition_task(task, block_size=4)
+        assert [r.level for r in ranges] == [0, 1, 2, 3, 3] + [4] * 8
+        assert all(r.task == task_key(task) for r in ranges)
+        assert ranges[1].bbox == pytest.approx((-180, -90, 180, 90))
+        assert ranges[3].bbox == pytest.approx((-180, -90, 0, 90))
+        # Hilbert order, neighbouring ranges share an edge
+        level_4 = [r.bbox for r in ranges if r.level == 4]
+        for a, b in zip(level_4, level_4[1:]):
+            assert a[0] == b[2] or a[2] == b[0] or a[1] == b[3] or a[3] == b[1]
+
+    def test_coverage(self):
+        task = seed_task([0, 1, 2, 3, 4], bbox=(0, 0, 40, 40))
+        ranges = partition_task(task, block_size=4)
+        assert [r.level for r in ranges] == [0, 1, 2, 3, 4]
+
+    @pytest.mark.parametrize("bbox", [(-180, -90, 180, 90), (5, -10, 40, 40)])
+    def test_walk_ranges(self, bbox):
+        task = seed_task([0, 1, 2, 3, 4, 5], bbox=bbox)
+        seed_pool = MockSeedPool()
+        TileWalker(task, seed_pool, handle_uncached=True).walk()
+
+        range_pool = MockSeedPool()
+        for r in partition_task(task, block_size=3):
+            range_task = SeedTask(task.md, task.tile_manager, [r.level], None, task.coverage)
+            TileWalker(range_task, range_pool, handle_uncached=True).walk(bbox=r.bbox)
+        assert range_pool.seeded_tiles == seed_pool.seeded_tiles
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="test not supported for Windows")
+@pytest.mark.skipif(sys.platform == "darwin" and sys.version_info >= (3, 8), reason="test not supported for MacOS with Python >=3.8")
+class TestSQLiteWorkQueue(object):
+
+    @pytest.fixture
+    def queue(self, tmpdir):
+        return SQLiteWorkQueue(tmpdir.join("queue.sqlite").strpath)
+
+    def ranges(self, n):
+        return [WorkRange('task', 1, (i, 0, i + 1, 1), order=n - i) for i in range(n)]
+
+    def test_claim_complete(self, queue):
+        assert queue.claim('a', 60) is None
+        queue.put(self.ranges(3))
+        assert queue.has_task('task')
+        assert not queue.has_task('other')
+
+        r = queue.claim('a', 60)
+        # ordered
+        assert r.bbox == (2, 0, 3, 1)
+        assert queue.stats() == {'pending': 2, 'leased': 1, 'done': 0}
+        queue.complete(r, 'a')
+        assert queue.stats() == {'pending': 2, 'leased': 0, 'done': 1}
+
+        r2 = queue.claim('b', 60)
+        assert r2.bbox == (1, 0, 2, 1)
+        queue.release(r2, 'b')
+        assert queue.claim('c', 60).id == r2.id
+
+    def test_lease_expired(self, queue):
+        queue.put(self.ranges(1))
+        r = queue.claim('a', 0.05)
+        assert queue.claim('b', 60) is None
+        assert queue.renew(r, 'a', 0.05)
+        time.sleep(0.1)
+        # reassigned to b
+        r2 = queue.claim('b', 60)
+        assert r2.id == r.id
+        assert not queue.renew(r, 'a', 60)
+        queue.release(r, 'a')
+        assert queue.stats() == {'pending': 0, 'leased': 1, 'done': 0}
+
+    def test_multiple_processes(self, tmpdir):
+        queue_file = tmpdir.join("queue.sqlite").strpath
+        queue = SQLiteWorkQueue(queue_file)
+        queue.put(self.ranges(200))
+
+        result = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=claim_all, args=(queue_file, 'w%d' % i, result))
+            for i in range(4)]
+        for p in procs:
+            p.start()
+        claimed = [result.get(timeout=30) for _ in range(200)]
+        for p in procs:
+            p.join()
+        assert len(set(claimed)) == 200
+        assert queue.stats() == {'pending': 0, 'leased': 0, 'done': 200}
+
+    def test_seed_worker(self, queue, monkeypatch):
+        tasks = [seed_task([0, 1, 2, 3]), seed_task([0, 1], name='other')]
+        assert distribute(tasks, queue, block_size=4) == 7
+        # already queued
+        assert distribute(tasks, queue, block_size=4) == 0
+
+        seeded = []
+        def seed_range(task, work_range, **kw):
+            if len(seeded) == 2:
+                seeded.append(None)
+                raise IOError('source failed')
+            seeded.append((task.md['name'], work_range.level))
+        monkeypatch.setattr(distributed, 'seed_range', seed_range)
+
+        with pytest.raises(IOError):
+            seed_worker(tasks, queue, worker='a')
+        assert queue.stats() == {'pending': 5, 'leased': 0, 'done': 2}
+
+        assert seed_worker(tasks, queue, worker='b') == 5
+        assert sorted(s for s in seeded if s) == [
+            ('other', 0), ('other', 1),
+            ('test', 0), ('test', 1), ('test', 2), ('test', 3), ('test', 3)]
+
+    def test_seed_worker_no_ranges(self, queue):
+        task = seed_task([0, 1])
+        task.coverage = False
+        assert not queue.is_distributed()
+        assert distribute([task], queue) == 0
+        assert queue.is_distributed()
+        # returns without waiting for ranges
+        assert seed_worker([task], queue, worker='a', poll_interval=60) == 0
+
+    def test_open_work_queue(self, tmpdir):
+        queue = open_work_queue('sqlite://' + tmpdir.join("queue.sqlite").strpath)
+        assert isinstance(queue, SQLiteWorkQueue)
+        assert os.path.exists(tmpdir.join("queue.sqlite").strpath)
+
+
+@pytest.mark.skipif(not redis or not os.environ.get('MAPPROXY_TEST_REDIS'),
+                    reason="redis package and server required")
+class TestRedisWorkQueue(object):
+
+    @pytest.fixture
+    def queue(self):
+        host, port = os.environ['MAPPROXY_TEST_REDIS'].split(':')
+        queue = RedisWorkQueue(host=host, port=int(port), prefix='mapproxy-test-%d' % os.getpid())
+        yield queue
+        for key in queue.r.keys(queue.prefix + ':*'):
+            queue.r.delete(key)
+
+    def test_claim_complete(self, queue):
+        assert queue.claim('a', 60) is None
+        queue.put([WorkRange('task', 1, (i, 0, i + 1, 1), order=3 - i) for i in range(3)])
+        assert queue.has_task('task')
+
+        r = queue.claim('a', 60)
+        assert r.bbox == (2, 0, 3, 1)
+        queue.complete(r, 'a')
+        r2 = queue.claim('b', 60)
+        queue.release(r2, 'b')
+        assert queue.claim('c', 60).id == r2.id
+        assert queue.stats() == {'pending': 1, 'leased': 1, 'done': 1}
+
+    def test_lease_expired(self, queue):
+        queue.put([WorkRange('task', 1, (0, 0, 1, 1))])
+        r = queue.claim('a', 0.05)
+        assert queue.claim('b', 60) is None
+        time.sleep(0.1)
+        assert queue.claim('b', 60).id == r.id
+        assert not queue.renew(r, 'a', 60)
+
+    def test_distributed(self, queue):
+        assert not queue.is_distributed()
+        queue.mark_distributed()
+        assert queue.is_distributed()
@@ -0,0 +1,110 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+
+from mapproxy.cache.dummy import DummyLocker
+from mapproxy.cache.tile import TileManager
+from mapproxy.grid import MetaGrid, TileGrid, tile_grid
+from mapproxy.seed.expire import ExpiredTiles, load_expired_tiles
+from mapproxy.seed.seeder import SeedTask, SeedProgress, walk_expired
+from mapproxy.source.tile import TiledSource
+from mapproxy.srs import SRS
+from mapproxy.util.coverage import BBOXCoverage
+from mapproxy.test.unit.test_seed import MockCache
+from mapproxy.test.unit.test_seed_priority import OrderedSeedPool
+
+
+def seed_task(grid, levels, expired_tiles, coverage=None, meta_size=(2, 2)):
+    tile_mgr = TileManager(grid, MockCache(), [TiledSource(grid, None)], "png",
+        meta_size=meta_size, locker=DummyLocker())
+    if coverage is None:
+        coverage = BBOXCoverage(grid.bbox, grid.srs)
+    return SeedTask(dict(name='test', cache_name="cache", grid_name="grid"), tile_mgr, levels,
+        refresh_timestamp=None, coverage=coverage, expired_tiles=expired_tiles)
+
+
+def test_load_expired_tiles(tmpdir):
+    tmpdir.join('a').write('3/5/3\n3/4/3\n')
+    tmpdir.join('b', 'c').write('3/5/3\n1/0/0\n', ensure=True)
+    os.utime(tmpdir.join('a').strpath, (1500000000, 1500000000))
+    os.utime(tmpdir.join('b', 'c').strpath, (1600000000, 1600000000))
+
+    expired = load_expired_tiles(tmpdir.strpath)
+    assert expired.tiles == set([(5, 3, 3), (4, 3, 3), (0, 0, 1)])
+    assert expired.timestamp == 1600000000
+
+    expired = load_expired_tiles(tmpdir.join('a').strpath)
+    assert len(expired) == 2
+    assert expired.timestamp == 1500000000
+
+
+class TestExpiredTiles(object):
+
+    def test_parents(self):
+        expired = ExpiredTiles([(5, 3, 3), (4, 2, 3), (5, 3, 3), (9, 0, 3), (0, 0, 0)])
+        assert len(expired) == 3
+        assert expired.levels == {
+            3: set([(5, 3, 3), (4, 2, 3)]),
+            2: set([(2, 1, 2)]),
+            1: set([(1, 0, 1)]),
+            0: set([(0, 0, 0)]),
+        }
+
+    def test_meta_tiles(self):
+        # expired tiles are in the nw grid
+        meta_grid = MetaGrid(tile_grid(3857), (2, 2))
+        expired = ExpiredTiles([(5, 3, 3)])
+        assert expired.meta_tiles(meta_grid, 1) == [(0, 0, 1)]
+        assert expired.meta_tiles(meta_grid, 2) == [(2, 2, 2)]
+        assert expired.meta_tiles(meta_grid, 3) == [(4, 4, 3)]
+        assert expired.meta_tiles(meta_grid, 4) == [(10, 8, 4)]
+        assert sorted(expired.meta_tiles(meta_grid, 5)) == [
+            (20, 16, 5), (20, 18, 5), (22, 16, 5), (22, 18, 5)]
+
+    def test_meta_tiles_lower_level(self):
+        meta_grid = MetaGrid(tile_grid(3857), (1, 1))
+        # upper left tile of level 1 and lower right tile of level 3
+        expired = ExpiredTiles([(0, 0, 1), (7, 7, 3)])
+        assert sorted(expired.meta_tiles(meta_grid, 2)) == [
+            (0, 2, 2), (0, 3, 2), (1, 2, 2), (1, 3, 2), (3, 0, 2)]
+
+    def test_meta_tiles_transformed(self):
+        meta_grid = MetaGrid(TileGrid(SRS(4326), bbox=[-180, -90, 180, 90]), (1, 1))
+        # north east tile of level 1
+        expired = ExpiredTiles([(1, 0, 1)])
+        assert expired.meta_tiles(meta_grid, 1) == [(1, 0, 1)]
+        assert sorted(expired.meta_tiles(meta_grid, 2)) == [(2, 1, 2), (3, 1, 2)]
+
+    def test_walk_expired(self):
+        grid = TileGrid(SRS(4326), bbox=[-180, -90, 180, 90])
+        expired = ExpiredTiles([(1, 0, 1)])
+        task = seed_task(grid, [1, 2, 3], expired, coverage=BBOXCoverage(
+            [0, 0, 80, 80], SRS(4326)), meta_size=(1, 1))
+        seed_pool = OrderedSeedPool()
+        walk_expired(task, seed_pool, handle_uncached=True)
+        assert seed_pool.seeded_tiles[:2] == [(1, 0, 1), (2, 1, 2)]
+        # level 3 along the Hilbert curve
+        assert seed_pool.seeded_tiles[2:] == [(5, 3, 3), (5, 2, 3), (4, 2, 3), (4, 3, 3)]
+
+    def test_walk_expired_continue(self):
+        grid = TileGrid(SRS(4326), bbox=[-180, -90, 180, 90])
+        expired = ExpiredTiles([(1, 0, 1)])
+        task = seed_task(grid, [1, 2, 3], expired, meta_size=(1, 1))
+        seed_progress = SeedProgress(old_progress_identifier=[(2, 3)])
+        seed_pool = OrderedSeedPool()
+        walk_expired(task, seed_pool, seed_progress=seed_progress, handle_uncached=True)
+        assert sorted(seed_pool.seeded_tiles) == [
+            (x, y, 3) for x in range(4, 8) for y in range(2, 4)]
@@ -0,0 +1,110 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from mapproxy.cache.dummy import DummyLocker
+from mapproxy.cache.tile import TileManager
+from mapproxy.grid import TileGrid
+from mapproxy.seed.distributed import partition_task
+from mapproxy.seed.priority import SeedPriority, load_heatmap
+from mapproxy.seed.seeder import SeedTask, SeedProgress, TileWalker, walk_prioritized
+from mapproxy.source.tile import TiledSource
+from mapproxy.srs import SRS
+from mapproxy.util.coverage import BBOXCoverage
+from mapproxy.test.unit.test_seed import MockCache
+
+
+class OrderedSeedPool(object):
+
+    def __init__(self):
+        self.seeded_tiles = []
+
+    def process(self, tiles, progress):
+        self.seeded_tiles.extend(tiles)
+
+    def flush_pending(self):
+        pass
+
+
+def seed_task(levels, priority=None):
+    grid = TileGrid(SRS(4326), bbox=[-180, -90, 180, 90])
+    tile_mgr = TileManager(grid, MockCache(), [TiledSource(grid, None)], "png",
+        locker=DummyLocker())
+    if priority is not None:
+        priority = SeedPriority(grid, **priority)
+    return SeedTask(dict(name='test', cache_name="cache", grid_name="grid"), tile_mgr, levels,
+        refresh_timestamp=None, coverage=BBOXCoverage([-180, -90, 180, 90], SRS(4326)),
+        priority=priority)
+
+
+def test_load_heatmap(tmpdir):
+    heatmap = tmpdir.join('heatmap.txt')
+    heatmap.write('# z/x/y hits\n3/4/2 10\n\n3/4/2 5\n4/1/1\n')
+    assert load_heatmap(heatmap.strpath) == {(4, 2, 3): 15, (1, 1, 4): 1}
+
+    heatmap.write('3 4 2\n')
+    with pytest.raises(ValueError):
+        load_heatmap(heatmap.strpath)
+
+
+class TestSeedPriority(object):
+
+    def test_regions(self):
+        task = seed_task([3], priority=dict(regions=[
+            (BBOXCoverage([0, 0, 10, 10], SRS(4326)), 5),
+            (BBOXCoverage([-180, -90, 0, 0], SRS(4326)), 1),
+        ]))
+        ranges = partition_task(task, block_size=1)
+        assert [r.order for r in ranges] == list(range(len(ranges)))
+        assert ranges[0].priority == (5, 0)
+        assert ranges[0].bbox == pytest.approx((0, 0, 45, 45))
+        assert [r.priority[0] for r in ranges[1:9]] == [1] * 8
+        assert all(r.priority == (0, 0) for r in ranges[9:])
+
+    def test_heatmap(self):
+        # one tile in level 5 and one tile in level 1
+        task = seed_task([2, 3], priority=dict(heatmap={(20, 10, 5): 100, (0, 0, 1): 3}))
+        ranges = partition_task(task, block_size=1)
+        # level 2 and 3 ranges that contain the level 5 tile, then all
+        # ranges within the level 1 tile
+        assert [(r.level, r.priority[1]) for r in ranges[:2]] == [(2, 100), (3, 100)]
+        assert ranges[1].bbox == pytest.approx((45, 0, 90, 45))
+        assert [r.priority[1] for r in ranges[2:2 + 4 + 16]] == [3] * 20
+        assert [r.level for r in ranges[2:2 + 4 + 16]] == [2] * 4 + [3] * 16
+        assert all(r.priority == (0, 0) for r in ranges[2 + 4 + 16:])
+
+    def test_walk_prioritized(self):
+        task = seed_task([0, 1, 2, 3], priority=dict(heatmap={(12, 5, 4): 10}))
+        seed_pool = OrderedSeedPool()
+        walk_prioritized(task, seed_pool, block_size=1, handle_uncached=True)
+
+        all_tiles = OrderedSeedPool()
+        TileWalker(seed_task([0, 1, 2, 3]), all_tiles, handle_uncached=True).walk()
+        assert sorted(seed_pool.seeded_tiles) == sorted(all_tiles.seeded_tiles)
+        # ranges with the heatmap tile first
+        assert seed_pool.seeded_tiles[:4] == [(0, 0, 0), (1, 0, 1), (3, 1, 2), (6, 2, 3)]
+
+    def test_walk_prioritized_continue(self):
+        task = seed_task([0, 1, 2, 3], priority=dict(heatmap={(12, 5, 4): 10}))
+        ranges = partition_task(task, block_size=1)
+        # continue with the third range
+        seed_progress = SeedProgress(old_progress_identifier=[(2, len(ranges))])
+        seed_pool = OrderedSeedPool()
+        walk_prioritized(task, seed_pool, seed_progress=seed_progress, block_size=1,
+            handle_uncached=True)
+        assert seed_pool.seeded_tiles[0] == (3, 1, 2)
+        assert (0, 0, 0) not in seed_pool.seeded_tiles
+        assert (1, 0, 1) not in seed_pool.seeded_tiles
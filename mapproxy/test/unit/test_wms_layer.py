@@ -15,9 +15,17 @@
 
 from __future__ import division
 
-from mapproxy.layer import MapQuery, InfoQuery
+import time
+
+import pytest
+
+from mapproxy.exception import RequestError
+from mapproxy.image import ImageSource
+from mapproxy.image.merge import LayerMerger
+from mapproxy.layer import MapLayer, MapQuery, InfoQuery
 from mapproxy.srs import SRS
-from mapproxy.service.wms import combined_layers
+from mapproxy.service.wms import combined_layers, LayerRenderer
+from mapproxy.test.image import create_debug_img
 from mapproxy.source.wms import WMSSource
 from mapproxy.client.wms import WMSClient
 from mapproxy.request.wms import create_request
@@ -104,6 +112,46 @@ class TestCombinedLayers(object):
         assert combined[2].client.request_template.params.layers == ["e", "f"]
 
 
+class SlowLayer(MapLayer):
+    def __init__(self, delay):
+        MapLayer.__init__(self)
+        self.delay = delay
+        self.requested = False
+
+    def get_map(self, query):
+        self.requested = True
+        time.sleep(self.delay)
+        return ImageSource(create_debug_img(query.size))
+
+
+class TestLayerRendererDeadline(object):
+
+    def render(self, layers, raise_source_errors):
+        q = MapQuery((0, 0, 10000, 10000), (100, 100), SRS(3857),
+            deadline=time.time() + 0.1)
+        renderer = LayerRenderer(layers, q, None,
+            raise_source_errors=raise_source_errors)
+        merger = LayerMerger()
+        renderer.render(merger)
+        return merger
+
+    def test_skip_pending_layers(self):
+        layers = [SlowLayer(0.2), SlowLayer(0)]
+        merger = self.render(layers, raise_source_errors=False)
+        assert layers[0].requested
+        assert not layers[1].requested
+        # rendered layer and error message
+        assert len(merger.layers) == 2
+        assert not merger.cacheable
+
+    def test_raise(self):
+        layers = [SlowLayer(0.2), SlowLayer(0)]
+        with pytest.raises(RequestError) as excinfo:
+            self.render(layers, raise_source_errors=True)
+        assert 'deadline exceeded' in excinfo.value.msg
+        assert not layers[1].requested
+
+
 class TestInfoQuery(object):
 
     def test_coord(self):
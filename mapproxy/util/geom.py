@@ -263,9 +263,24 @@ def flatten_to_polygons(geometry):
 
     return []
 
-def load_expire_tiles(expire_dir, grid=None):
-    if grid is None:
-        grid = tile_grid(3857, origin='nw')
+def expire_tile_files(expire_dir):
+    """
+    Return all expire tile files of `expire_dir`. Directories are
+    loaded recursive.
+    """
+    if not os.path.isdir(expire_dir):
+        return [expire_dir]
+    files = []
+    for root, dirs, names in os.walk(expire_dir):
+        for name in names:
+            files.append(os.path.join(root, name))
+    return files
+
+def read_expire_tiles(expire_dir):
+    """
+    Return a set with all ``(z, x, y)`` tiles of the expire tile files in
+    `expire_dir`. The rest of a file is skipped after an invalid line.
+    """
     tiles = set()
 
     def parse(filename):
@@ -279,16 +294,17 @@ def load_expire_tiles(expire_dir, grid=None):
             except:
                 log_config.warning('found error in %s, skipping rest of file', filename)
 
-    if os.path.isdir(expire_dir):
-        for root, dirs, files in os.walk(expire_dir):
-            for name in files:
-                filename = os.path.join(root, name)
-                parse(filename)
-    else:
-        parse(expire_dir)
+    for filename in expire_tile_files(expire_dir):
+        parse(filename)
+
+    return tiles
+
+def load_expire_tiles(expire_dir, grid=None):
+    if grid is None:
+        grid = tile_grid(3857, origin='nw')
 
     boxes = []
-    for tile in tiles:
+    for tile in read_expire_tiles(expire_dir):
         z, x, y = tile
         boxes.append(shapely.geometry.box(*grid.tile_bbox((x, y, z))))
 
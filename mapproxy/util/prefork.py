@@ -0,0 +1,406 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2020 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Pre-forking HTTP server for the WSGI application.
+
+The master process loads the application once and forks the worker
+processes. Each worker handles requests with a pool of threads.
+Workers are listening on their own ``SO_REUSEPORT`` socket (if supported
+by the OS), so that the kernel distributes the connections between all
+workers. Otherwise all workers accept connections from a single
+shared socket.
+
+The master reloads the application on ``SIGHUP`` and replaces all
+workers. Running workers finish their current requests before they
+exit. ``SIGTERM`` and ``SIGINT`` stop the server.
+"""
+
+import errno
+import fcntl
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from BaseHTTPServer import HTTPServer
+except ImportError:
+    from http.server import HTTPServer
+
+from mapproxy.util.ext.serving import WSGIRequestHandler, select_ip_version
+
+import logging
+log = logging.getLogger('mapproxy.server')
+
+
+def has_reuseport():
+    return hasattr(socket, 'SO_REUSEPORT')
+
+
+def create_listener(host, port, reuseport=False, backlog=128):
+    """
+    Return a listening TCP socket for `host` and `port`.
+    """
+    sock = socket.socket(select_ip_version(host, port), socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuseport:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def internal_error_app(app):
+    """
+    Wrap the WSGI `app` so that uncaught exceptions are logged and
+    answered with 500 Internal Server Error, if the response was not
+    started yet.
+    """
+    def error_app(environ, start_response):
+        try:
+            return app(environ, start_response)
+        except Exception:
+            log.exception('error in application for %s', environ.get('PATH_INFO'))
+            # re-raises the exception if the headers were already sent
+            start_response('500 Internal Server Error',
+                [('Content-type', 'text/plain')], sys.exc_info())
+            return [b'internal error']
+    return error_app
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """
+    Request handler without access log.
+    """
+    # do not block a thread with idle connections
+    timeout = 60
+
+    def log_request(self, code='-', size='-'):
+        pass
+
+    def log(self, type, message, *args):
+        if type == 'error':
+            log.error(message, *args)
+
+
+class ThreadPoolWSGIServer(HTTPServer, object):
+    """
+    WSGI server for an existing listener socket that handles the requests
+    with a fixed number of threads.
+
+    The server stops after `max_requests` requests, if set.
+    """
+    multithread = True
+    multiprocess = True
+
+    def __init__(self, sock, app, threads=8, max_requests=None,
+        handler=QuietRequestHandler):
+        HTTPServer.__init__(self, sock.getsockname()[:2], handler,
+            bind_and_activate=False)
+        self.socket.close()
+        self.socket = sock
+        self.app = internal_error_app(app)
+        # errors of the application are answered by internal_error_app,
+        # the remaining errors (e.g. after the response was started)
+        # are logged in _handle_request
+        self.passthrough_errors = True
+        self.shutdown_signal = False
+        self.max_requests = max_requests
+        self.num_requests = 0
+        self._lock = threading.Lock()
+        self._requests = queue.Queue(maxsize=threads * 2)
+        self._threads = []
+        self._stopping = False
+        for _ in range(threads):
+            t = threading.Thread(target=self._worker)
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+    def server_close(self):
+        # the listener belongs to the master process
+        pass
+
+    def process_request(self, request, client_address):
+        self._requests.put((request, client_address))
+
+    def _worker(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            self._handle_request(*item)
+
+    def _handle_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            log.exception('error on request from %s', client_address[0])
+        finally:
+            self.shutdown_request(request)
+
+        if self.max_requests:
+            with self._lock:
+                self.num_requests += 1
+                if self.num_requests == self.max_requests:
+                    self.stop()
+
+    def stop(self):
+        """
+        Stop accepting new connections. Can be called from any thread,
+        including signal handlers.
+        """
+        if self._stopping:
+            return
+        self._stopping = True
+        # shutdown blocks till serve_forever returns, call it from
+        # another thread
+        t = threading.Thread(target=self.shutdown)
+        t.daemon = True
+        t.start()
+
+    def serve(self):
+        """
+        Serve requests till `stop` is called. Waits for all pending
+        requests before it returns.
+        """
+        try:
+            self.serve_forever()
+        finally:
+            for _ in self._threads:
+                self._requests.put(None)
+            for t in self._threads:
+                t.join()
+
+
+class PreforkServer(object):
+    """
+    Pre-forking server.
+
+    :param make_app: function that returns the WSGI application, called
+        on start and on each reload
+    :param workers: number of worker processes
+    :param threads: number of threads for each worker
+    :param max_requests: restart workers after this number of requests
+    """
+    # time for the workers to finish their requests on stop
+    graceful_timeout = 30
+
+    def __init__(self, host, port, make_app, workers=2, threads=8,
+        max_requests=None, reuseport=None):
+        self.host = host
+        self.port = port
+        self.make_app = make_app
+        self.num_workers = workers
+        self.threads = threads
+        self.max_requests = max_requests
+        if reuseport is None:
+            reuseport = has_reuseport()
+        self.reuseport = reuseport
+        self.app = None
+        self.listeners = []
+        # pid -> worker slot
+        self.workers = {}
+        # old workers that finish their requests
+        self.retiring = set()
+        self._reload = False
+        self._stop = False
+        self._wakeup_fds = ()
+
+    def _create_listeners(self):
+        if self.reuseport:
+            self.listeners = [
+                create_listener(self.host, self.port, reuseport=True)
+                for _ in range(self.num_workers)
+            ]
+        else:
+            self.listeners = [create_listener(self.host, self.port)] * self.num_workers
+
+    def _spawn_worker(self, slot):
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = slot
+            return pid
+
+        # worker process
+        exit_code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            signal.set_wakeup_fd(-1)
+            for fd in self._wakeup_fds:
+                os.close(fd)
+            # only the master handles reload and CTRL+C
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            server = ThreadPoolWSGIServer(self.listeners[slot], self.app,
+                threads=self.threads, max_requests=self.max_requests)
+            signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+            server.serve()
+        except Exception:
+            log.exception('worker %d failed', os.getpid())
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def _wait(self, fd, timeout):
+        """
+        Wait till a signal was received or `timeout` seconds passed.
+        """
+        try:
+            select.select([fd], [], [], timeout)
+        except (select.error, OSError) as ex:
+            # Python 2 raises EINTR
+            if ex.args[0] != errno.EINTR:
+                raise
+        try:
+            while os.read(fd, 1024):
+                pass
+        except OSError as ex:
+            if ex.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    def _signal(self, signum, frame):
+        if signum == signal.SIGHUP:
+            self._reload = True
+        elif signum in (signal.SIGTERM, signal.SIGINT):
+            self._stop = True
+
+    def reload(self):
+        """
+        Reload the application and replace all workers.
+        """
+        try:
+            app = self.make_app()
+        except Exception as ex:
+            log.error('reload failed, keeping current configuration: %s', ex)
+            return
+        self.app = app
+        old_workers = self.workers
+        self.workers = {}
+        for slot in range(self.num_workers):
+            self._spawn_worker(slot)
+        for pid in old_workers:
+            self.retiring.add(pid)
+            self._kill(pid, signal.SIGTERM)
+        log.info('reloaded, started %d new workers', self.num_workers)
+
+    def _kill(self, pid, sig):
+        try:
+            os.kill(pid, sig)
+        except OSError as ex:
+            if ex.errno != errno.ESRCH:
+                raise
+
+    def _reap(self):
+        """
+        Collect exited workers and restart them.
+        """
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as ex:
+                if ex.errno == errno.ECHILD:
+                    return
+                raise
+            if not pid:
+                return
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                continue
+            slot = self.workers.pop(pid, None)
+            if slot is None:
+                continue
+            if os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0:
+                log.debug('worker %d exited, restarting', pid)
+            else:
+                log.warning('worker %d died (status %d), restarting', pid, status)
+                # avoid fork loops if workers fail on start
+                time.sleep(0.5)
+            if not self._stop:
+                self._spawn_worker(slot)
+
+    def stop(self):
+        """
+        Stop all workers. Workers are killed if they do not finish
+        within `graceful_timeout`.
+        """
+        pids = list(self.workers) + list(self.retiring)
+        for pid in pids:
+            self._kill(pid, signal.SIGTERM)
+        deadline = time.time() + self.graceful_timeout
+        while pids and time.time() < deadline:
+            for pid in pids[:]:
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except OSError as ex:
+                    if ex.errno != errno.ECHILD:
+                        raise
+                    done = pid
+                if done:
+                    pids.remove(pid)
+            time.sleep(0.1)
+        for pid in pids:
+            self._kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.workers = {}
+        self.retiring = set()
+        for sock in set(self.listeners):
+            sock.close()
+
+    def serve_forever(self):
+        self.app = self.make_app()
+        self._create_listeners()
+
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self._signal)
+        # signal handlers do not interrupt sleep (PEP 475), signals are
+        # written to this pipe to wake up the main loop, e.g. to restart
+        # workers on SIGCHLD
+        wakeup_r, wakeup_w = os.pipe()
+        for fd in (wakeup_r, wakeup_w):
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        signal.set_wakeup_fd(wakeup_w)
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        self._wakeup_fds = (wakeup_r, wakeup_w)
+
+        for slot in range(self.num_workers):
+            self._spawn_worker(slot)
+        log.info('listening on %s:%d with %d workers (%d threads each%s)',
+            self.host, self.port, self.num_workers, self.threads,
+            ', SO_REUSEPORT' if self.reuseport else '')
+
+        try:
+            while not self._stop:
+                if self._reload:
+                    self._reload = False
+                    self.reload()
+                self._reap()
+                self._wait(wakeup_r, 0.5)
+        finally:
+            signal.set_wakeup_fd(-1)
+            self.stop()
+            os.close(wakeup_r)
+            os.close(wakeup_w)
+            self._wakeup_fds = ()
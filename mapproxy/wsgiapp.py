@@ -33,6 +33,7 @@ except ImportError:
 from mapproxy.compat import iteritems
 from mapproxy.request import Request
 from mapproxy.response import Response
+from mapproxy.cache.admission import TileCreationOverload
 from mapproxy.config import local_base_config
 from mapproxy.config.loader import load_configuration, ConfigurationError
 
@@ -139,6 +140,12 @@ class MapProxyApp(object):
                 if handler_name in self.handlers:
                     try:
                         resp = self.handlers[handler_name].handle(req)
+                    except TileCreationOverload as ex:
+                        resp = Response('service unavailable: %s' % ex.args[0],
+                            mimetype='text/plain', status=503)
+                        resp.cache_headers(no_cache=True)
+                        if ex.retry_after:
+                            resp.headers['Retry-After'] = str(ex.retry_after)
                     except Exception:
                         if self.base_config.debug_mode:
                             raise